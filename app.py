@@ -1,16 +1,26 @@
-from flask import Flask, request, jsonify
-import psycopg2
+from flask import Flask, Response, request, jsonify
 import os
-import json
 from datetime import datetime
 import re
-import africastalking
 from dotenv import load_dotenv
+from services import metrics, pagination, profiler, query_audit, repository, tracing
+from services.db_pool import get_pool, pool_stats
+from services.job_cache import ListingPage, get_job_cache, notify_jobs_changed
+from services.log import begin_request, end_request, get_logger
+from services.payment_webhooks import APPLIED, DUPLICATE, ERROR, REJECTED, get_webhook_ingestor, parse_webhook
+from services.payments import queue_payment
+from services.profile_cache import get_profile_cache
+from services.session_store import get_session_store
+from services.sms_outbox import enqueue_sms, outbox_depth
+from services.unit_of_work import UnitOfWork
+from services.ussd_menu import AT_RESPONSE, JSON_RESPONSE, Branch, Hop, Menu, State, con, end
+from services.ussd_replay import split_text
 
 # Load environment variables from .env file
 load_dotenv()
 
 app = Flask(__name__)
+log = get_logger(__name__)
 
 # Application settings from .env
 DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
@@ -18,223 +28,61 @@ APP_ENV = os.getenv('APP_ENV', 'development')
 USSD_CODE = os.getenv('USSD_CODE', '*384*531#')
 COUNTRY_CODE = os.getenv('COUNTRY_CODE', 'ZM')
 APP_URL = os.getenv('APP_URL', 'http://localhost:5000')
-
-# Payment configuration
-PAYMENT_CONFIG = {
-    'mobile_money_providers': ['mtn', 'airtel', 'zamtel'],
-    'default_currency': 'ZMW',
-    'transaction_timeout': 300,  # 5 minutes
-    'max_retries': 3
-}
-
-# Initialize Africa's Talking
-def initialize_africas_talking():
-    try:
-        username = os.getenv('AT_USERNAME', 'sandbox')
-        api_key = os.getenv('AT_API_KEY', 'atsk_f74b6e4b9e0aa7ea82f7c0058d7315528f829f1993888ac1e696b031adb336daa6385c04')
-        
-        africastalking.initialize(username, api_key)
-        
-        global sms
-        sms = africastalking.SMS
-        
-        print("Africa's Talking initialized successfully with username:", username)
-        return True
-    except Exception as e:
-        print(f"Africa's Talking initialization failed: {e}")
-        return False
-
-# Initialize Africa's Talking when app starts
-initialize_africas_talking()
+# Rebuild /at-ussd menu positions from the cumulative text instead of ussd_sessions
+AT_TEXT_REPLAY = os.getenv('AT_TEXT_REPLAY', 'True').lower() == 'true'
+# When set, /metrics wants "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# /admin/* wants "Authorization: Bearer <ADMIN_TOKEN>" and is off without one
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+# Africa's Talking clients are built on first use, once per process
+# (services/clients.py), not when the app is imported.
+
+# Structured logging (services/log.py): tag and sample records per route
+@app.before_request
+def start_request_log():
+    begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.teardown_request
+def finish_request_log(exc):
+    end_request()
+
+# Metrics (services/metrics.py): latency and query counts per route, exported at /metrics
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def finish_request_metrics(response):
+    metrics.end_request(response.status_code)
+    return response
+
+# Tracing (services/tracing.py): a span per request and per query, and the slow-query log.
+# metrics.end_request() above finishes the request's span.
+@app.before_request
+def start_request_trace():
+    tracing.begin_request(f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}")
+
+# Profiling (services/profiler.py): stack samples of a share of USSD requests, switched on at /admin/profile
+@app.before_request
+def start_request_profile():
+    profiler.begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.teardown_request
+def finish_request_profile(exc):
+    profiler.end_request()
 
 # FIXED Render PostgreSQL Database Configuration
+# Connections come from the process-wide pool in services/db_pool.py;
+# conn.close() hands them back to the pool instead of disconnecting.
 def get_db_connection():
     try:
-        # Render provides DATABASE_URL environment variable
-        database_url = os.getenv('DATABASE_URL')
-        
-        print(f"🔍 DATABASE_URL exists: {bool(database_url)}")
-        print(f"🔍 APP_ENV: {APP_ENV}")
-        
-        if database_url:
-            # Debug: Show first part of URL (without credentials)
-            if '//' in database_url:
-                url_parts = database_url.split('//')
-                if len(url_parts) > 1:
-                    host_part = url_parts[1].split('@')[-1].split('/')[0]
-                    print(f"🔍 Connecting to database host: {host_part}")
-            
-            # For Render PostgreSQL - fix the URL format if needed
-            if database_url.startswith('postgres://'):
-                database_url = database_url.replace('postgres://', 'postgresql://', 1)
-                print("🔧 Fixed URL format from postgres:// to postgresql://")
-            
-            print("🔗 Connecting to Render PostgreSQL database...")
-            # Use the DATABASE_URL directly
-            conn = psycopg2.connect(database_url)
-            print("✅ Render PostgreSQL connection successful!")
-            
-        else:
-            # Fallback for local development
-            print("🔗 Using local development database configuration...")
-            conn = psycopg2.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                database=os.getenv('DB_NAME', 'jowa'),
-                user=os.getenv('DB_USER', 'postgres'),
-                password=os.getenv('DB_PASSWORD', 'postgres'),
-                port=os.getenv('DB_PORT', '5432')
-            )
-            print("✅ Local database connection successful!")
+        return get_pool().getconn()
         
-        return conn
-        
-    except Exception as e:
-        print(f"❌ Database connection error: {e}")
-        import traceback
-        print(f"🔍 Detailed error: {traceback.format_exc()}")
+    except Exception:
+        log.exception("database_connection_failed")
         return None
 
-# Initialize database tables - ENHANCED VERSION WITH PAYMENTS
-def initialize_database():
-    print("🔄 Starting database initialization...")
-    
-    conn = get_db_connection()
-    if not conn:
-        print("❌ Database initialization failed: Could not connect to database")
-        return False
-    
-    cur = conn.cursor()
-    
-    try:
-        print("📊 Creating database tables...")
-        
-        # Create users table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                phone_number VARCHAR(20) UNIQUE NOT NULL,
-                full_name VARCHAR(100),
-                skills TEXT,
-                location VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created users table")
-        
-        # Create employers table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS employers (
-                id SERIAL PRIMARY KEY,
-                phone_number VARCHAR(20) UNIQUE NOT NULL,
-                company_name VARCHAR(100),
-                business_type VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created employers table")
-        
-        # Create jobs table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS jobs (
-                id SERIAL PRIMARY KEY,
-                employer_id INTEGER REFERENCES employers(id),
-                title VARCHAR(100) NOT NULL,
-                description TEXT,
-                location VARCHAR(100),
-                payment_amount DECIMAL(10,2),
-                payment_type VARCHAR(20),
-                status VARCHAR(20) DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created jobs table")
-        
-        # Create applications table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS applications (
-                id SERIAL PRIMARY KEY,
-                job_id INTEGER REFERENCES jobs(id),
-                user_id INTEGER REFERENCES users(id),
-                status VARCHAR(20) DEFAULT 'pending',
-                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(job_id, user_id)
-            )
-        """)
-        print("✅ Created applications table")
-        
-        # Create USSD sessions table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS ussd_sessions (
-                session_id VARCHAR(100) PRIMARY KEY,
-                phone_number VARCHAR(20) NOT NULL,
-                menu_level VARCHAR(50),
-                data JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created ussd_sessions table")
-        
-        # =========================================================================
-        # PAYMENT TABLES - ADD THESE NEW TABLES
-        # =========================================================================
-        
-        # Create payments table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS payments (
-                id SERIAL PRIMARY KEY,
-                session_id VARCHAR(100),
-                phone_number VARCHAR(20) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                currency VARCHAR(10) DEFAULT 'ZMW',
-                payment_method VARCHAR(50),
-                provider VARCHAR(50),
-                transaction_id VARCHAR(100),
-                status VARCHAR(20) DEFAULT 'pending',
-                purpose VARCHAR(100),
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created payments table")
-        
-        # Create payment_sessions table for USSD payment flows
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS payment_sessions (
-                session_id VARCHAR(100) PRIMARY KEY,
-                phone_number VARCHAR(20) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                currency VARCHAR(10) DEFAULT 'ZMW',
-                payment_method VARCHAR(50),
-                provider VARCHAR(50),
-                purpose VARCHAR(100),
-                data JSONB,
-                status VARCHAR(20) DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created payment_sessions table")
-        
-        conn.commit()
-        print("🎉 Database tables initialized successfully!")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error initializing database: {e}")
-        import traceback
-        print(f"🔍 Full error: {traceback.format_exc()}")
-        conn.rollback()
-        return False
-    finally:
-        cur.close()
-        conn.close()
-
-# USSD Response Format
 def ussd_response(text, session_id, continue_session=True):
     response_type = "2" if continue_session else "1"
     return {
@@ -255,105 +103,34 @@ def validate_payment_amount(amount):
         return False
 
 # Update session function
+# conn is the hop's UnitOfWork: the new state is written once, together with
+# the hop's other writes, when the unit of work commits.
 def update_session(cur, conn, session_id, menu_level, data):
-    cur.execute("""
-        UPDATE ussd_sessions 
-        SET menu_level = %s, data = %s, updated_at = CURRENT_TIMESTAMP
-        WHERE session_id = %s
-    """, (menu_level, json.dumps(data), session_id))
-    conn.commit()
+    conn.set_session(session_id, menu_level, data)
 
-# SMS Notification Function
-def send_sms_notification(phone_number, message):
-    """
-    Send SMS notifications to users
-    """
-    try:
-        if 'sms' in globals() and sms is not None:
-            response = sms.send(message, [phone_number])
-            print(f"SMS sent to {phone_number}: {response}")
-            return True
-        else:
-            print(f"SMS simulation to {phone_number}: {message}")
-            return True
-    except Exception as e:
-        print(f"SMS sending failed: {e}")
-        return False
-# Payment configuration
-PAYMENT_CONFIG = {
-    'mobile_money_providers': ['mtn', 'airtel', 'zamtel'],
-    'default_currency': 'ZMW',
-    'transaction_timeout': 300,  # 5 minutes
-    'max_retries': 3
-}
 
-# Payment sessions table initialization (add to initialize_database function)
-def initialize_payment_tables():
-    """
-    Add payment-related tables to database initialization
-    Call this from your existing initialize_database() function
+# SMS Notification Function
+# SMS are written to sms_outbox on the hop's cursor and sent by sms_worker.py,
+# so they only go out if the hop commits and never hold up the USSD response.
+def send_sms_notification(cur, phone_number, message, digest_key=None):
     """
-    conn = get_db_connection()
-    if not conn:
-        return False
+    Queue an SMS notification in the current transaction
     
-    cur = conn.cursor()
-    
-    try:
-        # Create payments table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS payments (
-                id SERIAL PRIMARY KEY,
-                session_id VARCHAR(100),
-                phone_number VARCHAR(20) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                currency VARCHAR(10) DEFAULT 'ZMW',
-                payment_method VARCHAR(50),
-                provider VARCHAR(50),
-                transaction_id VARCHAR(100),
-                status VARCHAR(20) DEFAULT 'pending',
-                purpose VARCHAR(100),
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created payments table")
-        
-        # Create payment_sessions table for USSD payment flows
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS payment_sessions (
-                session_id VARCHAR(100) PRIMARY KEY,
-                phone_number VARCHAR(20) NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                currency VARCHAR(10) DEFAULT 'ZMW',
-                payment_method VARCHAR(50),
-                provider VARCHAR(50),
-                purpose VARCHAR(100),
-                data JSONB,
-                status VARCHAR(20) DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created payment_sessions table")
-        
-        conn.commit()
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error initializing payment tables: {e}")
-        conn.rollback()
-        return False
-    finally:
-        cur.close()
-        conn.close()
+    Notifications sharing a digest_key are merged into one digest SMS per
+    phone over SMS_DIGEST_WINDOW (services/sms_batcher.py).
+    """
+    enqueue_sms(cur, phone_number, message, digest_key)
 
 # Payment processing functions
-def initiate_payment(session_id, phone_number, amount, purpose, description=""):
+def initiate_payment(session_id, phone_number, amount, purpose, description="", cur=None):
     """
     Initiate a payment transaction
+    
+    Pass the hop's cursor to make the payment record part of its unit of work.
     """
+    if cur is not None:
+        return True, repository.create_payment(cur, session_id, phone_number, amount, purpose, description)
+    
     conn = get_db_connection()
     if not conn:
         return False, "Database connection failed"
@@ -362,57 +139,20 @@ def initiate_payment(session_id, phone_number, amount, purpose, description=""):
     
     try:
         # Create payment record
-        cur.execute("""
-            INSERT INTO payments (session_id, phone_number, amount, purpose, description, status)
-            VALUES (%s, %s, %s, %s, %s, 'initiated')
-            RETURNING id
-        """, (session_id, phone_number, amount, purpose, description))
-        
-        payment_id = cur.fetchone()[0]
+        payment_id = repository.create_payment(cur, session_id, phone_number, amount, purpose, description)
         conn.commit()
         
-        print(f"💰 Payment initiated: ID {payment_id}, Amount: {amount}, Purpose: {purpose}")
+        log.info("payment_initiated", payment_id=payment_id, amount=amount, purpose=purpose)
         return True, payment_id
         
     except Exception as e:
-        print(f"❌ Payment initiation failed: {e}")
+        log.exception("payment_initiation_failed")
         conn.rollback()
         return False, str(e)
     finally:
         cur.close()
         conn.close()
 
-def process_mobile_money_payment(phone_number, amount, provider, purpose="JOWA Service"):
-    """
-    Process mobile money payment (simulation - integrate with actual payment gateway)
-    """
-    try:
-        # Simulate payment processing
-        print(f"🔗 Processing {provider} mobile money payment...")
-        print(f"📱 Phone: {phone_number}, Amount: {amount}, Purpose: {purpose}")
-        
-        # Simulate API call to payment gateway
-        # In production, integrate with actual payment APIs like:
-        # - MTN Mobile Money API
-        # - Airtel Money API  
-        # - Zamtel Kwacha API
-        
-        # For now, simulate successful payment 80% of the time
-        import random
-        success = random.random() > 0.2
-        
-        if success:
-            transaction_id = f"TXN{random.randint(100000, 999999)}"
-            print(f"✅ Payment successful: {transaction_id}")
-            return True, transaction_id, "Payment completed successfully"
-        else:
-            print("❌ Payment failed: Simulated failure")
-            return False, None, "Payment failed. Please try again."
-            
-    except Exception as e:
-        print(f"❌ Payment processing error: {e}")
-        return False, None, str(e)
-
 def verify_payment(transaction_id):
     """
     Verify payment status
@@ -424,21 +164,9 @@ def verify_payment(transaction_id):
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            SELECT status, amount, phone_number, purpose 
-            FROM payments 
-            WHERE transaction_id = %s
-        """, (transaction_id,))
-        
-        result = cur.fetchone()
+        result = repository.payment_by_transaction(cur, transaction_id)
         if result:
-            status, amount, phone_number, purpose = result
-            return True, {
-                'status': status,
-                'amount': amount,
-                'phone_number': phone_number,
-                'purpose': purpose
-            }
+            return True, result._asdict()
         else:
             return False, "Transaction not found"
             
@@ -448,47 +176,15 @@ def verify_payment(transaction_id):
         cur.close()
         conn.close()
 
-def update_payment_status(transaction_id, status, provider=None):
-    """
-    Update payment status
-    """
-    conn = get_db_connection()
-    if not conn:
-        return False
-    
-    cur = conn.cursor()
-    
-    try:
-        if provider:
-            cur.execute("""
-                UPDATE payments 
-                SET status = %s, provider = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE transaction_id = %s
-            """, (status, provider, transaction_id))
-        else:
-            cur.execute("""
-                UPDATE payments 
-                SET status = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE transaction_id = %s
-            """, (status, transaction_id))
-        
-        conn.commit()
-        return True
-        
-    except Exception as e:
-        print(f"❌ Payment status update failed: {e}")
-        conn.rollback()
-        return False
-    finally:
-        cur.close()
-        conn.close()
-
 # USSD Payment Menu Functions
-def payment_menu_at(session_id, phone_number, amount, purpose):
+def payment_menu_screen(hop):
+    return con("Payment Services\n\n1. View Payment History\n2. Premium Job Posting (K10)\n3. Back to Main Menu\n\nReply with 1, 2, or 3")
+
+def payment_method_screen(amount, purpose):
     """
-    Africa's Talking formatted payment menu
+    Payment method selection menu
     """
-    return f"""CON Payment Required: K{amount}
+    return con(f"""Payment Required: K{amount}
 
 Purpose: {purpose}
 
@@ -498,9 +194,9 @@ Select payment method:
 3. Zamtel Kwacha
 4. Cancel Payment
 
-Reply with 1, 2, 3, or 4"""
+Reply with 1, 2, 3, or 4""")
 
-def handle_payment_selection_at(session_id, phone_number, text, amount, purpose, cur, conn):
+def handle_payment_selection(hop, text):
     """
     Handle payment method selection
     """
@@ -509,175 +205,95 @@ def handle_payment_selection_at(session_id, phone_number, text, amount, purpose,
         '2': 'airtel', 
         '3': 'zamtel'
     }
+    amount = hop.data['amount']
+    purpose = hop.data['purpose']
     
     if text in providers:
         provider = providers[text]
         
         # Initiate payment
-        success, payment_id = initiate_payment(session_id, phone_number, amount, purpose)
+        success, payment_id = initiate_payment(hop.session_id, hop.phone_number, amount, purpose, cur=hop.cur)
         
         if success:
             # Store payment session
-            cur.execute("""
-                INSERT INTO payment_sessions (session_id, phone_number, amount, provider, purpose, status)
-                VALUES (%s, %s, %s, %s, %s, 'pending')
-                ON CONFLICT (session_id) DO UPDATE SET
-                phone_number = EXCLUDED.phone_number,
-                amount = EXCLUDED.amount,
-                provider = EXCLUDED.provider,
-                purpose = EXCLUDED.purpose,
-                status = 'pending',
-                updated_at = CURRENT_TIMESTAMP
-            """, (session_id, phone_number, amount, provider, purpose))
-            conn.commit()
+            repository.save_payment_session(hop.cur, hop.session_id, hop.phone_number, amount, provider, purpose)
             
-            return f"CON Confirm {provider.upper()} Payment:\n\nAmount: K{amount}\nPhone: {phone_number}\nPurpose: {purpose}\n\n1. Confirm Payment\n2. Cancel\n\nReply 1 or 2"
+            hop.goto('payment_confirmation', {})
+            return con(f"Confirm {provider.upper()} Payment:\n\nAmount: K{amount}\nPhone: {hop.phone_number}\nPurpose: {purpose}\n\n1. Confirm Payment\n2. Cancel\n\nReply 1 or 2")
         else:
-            return "END Payment initiation failed. Please try again later."
+            return end("Payment initiation failed. Please try again later.")
     
     elif text == '4':
-        return "END Payment cancelled. Thank you for using JOWA."
+        return end("Payment cancelled. Thank you for using JOWA.")
     
     else:
-        return "CON Invalid option. Please select payment method:\n1. MTN Mobile Money\n2. Airtel Money\n3. Zamtel Kwacha\n4. Cancel"
+        return con("Invalid option. Please select payment method:\n1. MTN Mobile Money\n2. Airtel Money\n3. Zamtel Kwacha\n4. Cancel")
 
-def process_payment_confirmation_at(session_id, phone_number, text, cur, conn):
+def confirm_payment(hop, text):
     """
-    Process payment confirmation
+    Queue the confirmed payment; the provider's worker completes it
     """
-    if text == '1':
-        # Get payment details
-        cur.execute("""
-            SELECT amount, provider, purpose 
-            FROM payment_sessions 
-            WHERE session_id = %s AND status = 'pending'
-        """, (session_id,))
-        
-        result = cur.fetchone()
-        if not result:
-            return "END Payment session expired. Please start over."
-        
-        amount, provider, purpose = result
-        
-        # Process payment
-        success, transaction_id, message = process_mobile_money_payment(
-            phone_number, amount, provider, purpose
-        )
-        
-        if success:
-            # Update payment session
-            cur.execute("""
-                UPDATE payment_sessions 
-                SET status = 'completed', updated_at = CURRENT_TIMESTAMP
-                WHERE session_id = %s
-            """, (session_id,))
-            
-            # Update payments table
-            cur.execute("""
-                UPDATE payments 
-                SET status = 'completed', transaction_id = %s, provider = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE session_id = %s AND status = 'initiated'
-            """, (transaction_id, provider, session_id))
-            
-            conn.commit()
-            
-            # Send confirmation SMS
-            send_sms_notification(phone_number, 
-                f"Payment of K{amount} for {purpose} completed successfully. Transaction ID: {transaction_id}. Thank you for using JOWA!")
-            
-            return f"END Payment successful! 🎉\n\nAmount: K{amount}\nTransaction ID: {transaction_id}\n\nThank you for your payment!"
-        
-        else:
-            # Update payment session as failed
-            cur.execute("""
-                UPDATE payment_sessions 
-                SET status = 'failed', updated_at = CURRENT_TIMESTAMP
-                WHERE session_id = %s
-            """, (session_id,))
-            
-            cur.execute("""
-                UPDATE payments 
-                SET status = 'failed', updated_at = CURRENT_TIMESTAMP
-                WHERE session_id = %s AND status = 'initiated'
-            """, (session_id,))
-            
-            conn.commit()
-            
-            return f"END Payment failed. {message}\n\nPlease try again or contact support."
-    
-    elif text == '2':
-        # Cancel payment
-        cur.execute("""
-            UPDATE payment_sessions 
-            SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
-            WHERE session_id = %s
-        """, (session_id,))
-        
-        cur.execute("""
-            UPDATE payments 
-            SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
-            WHERE session_id = %s AND status = 'initiated'
-        """, (session_id,))
-        
-        conn.commit()
-        
-        return "END Payment cancelled. Thank you for using JOWA."
+    cur = hop.cur
+    session_id = hop.session_id
     
-    else:
-        return "CON Invalid option. Please reply:\n1. Confirm Payment\n2. Cancel"
+    # Get payment details
+    result = repository.pending_payment_session(cur, session_id)
+    if not result:
+        return end("Payment session expired. Please start over.")
+    
+    amount, provider, purpose = result
+    
+    # No provider call here: payment_worker.py submits it and an SMS reports the result
+    if not queue_payment(cur, session_id, provider):
+        return end("Payment session expired. Please start over.")
+    
+    return end(f"Payment pending ⏳\n\nAmount: K{amount}\nPurpose: {purpose}\n\nApprove the {provider.upper()} prompt on your phone. We will send you an SMS when the payment completes.")
+
+def cancel_payment(hop, text):
+    repository.cancel_payment(hop.cur, hop.session_id)
+    
+    return end("Payment cancelled. Thank you for using JOWA.")
+
+def invalid_confirmation(hop, text):
+    return con("Invalid option. Please reply:\n1. Confirm Payment\n2. Cancel")
 
 # Premium Job Posting with Payment
-def premium_job_posting_flow_at(session_id, phone_number, cur, conn):
+def premium_job_posting_flow(hop, text):
     """
     Premium job posting with payment requirement
     """
     premium_amount = 10.00  # K10 for premium job posting
     
     # Check if employer exists
-    cur.execute("SELECT company_name FROM employers WHERE phone_number = %s", (phone_number,))
-    employer = cur.fetchone()
-    
-    if not employer:
-        return "END Employer registration required. Please register first from main menu."
+    if lookup_profile(hop.cur, 'employer', hop.phone_number, hop.profiles) is None:
+        return end("Employer registration required. Please register first from main menu.")
     
     # Store premium job session
-    cur.execute("""
-        INSERT INTO payment_sessions (session_id, phone_number, amount, purpose, status)
-        VALUES (%s, %s, %s, 'Premium Job Posting', 'premium_job')
-        ON CONFLICT (session_id) DO UPDATE SET
-        phone_number = EXCLUDED.phone_number,
-        amount = EXCLUDED.amount,
-        purpose = EXCLUDED.purpose,
-        status = 'premium_job',
-        updated_at = CURRENT_TIMESTAMP
-    """, (session_id, phone_number, premium_amount))
-    conn.commit()
-    
-    return payment_menu_at(session_id, phone_number, premium_amount, "Premium Job Posting")
+    repository.save_premium_session(hop.cur, hop.session_id, hop.phone_number, premium_amount)
+    
+    hop.goto('payment_method', {'amount': premium_amount, 'purpose': "Premium Job Posting"})
+    return payment_method_screen(premium_amount, "Premium Job Posting")
 
 # Payment History and Management
-def payment_history_at(session_id, phone_number, cur, page=0):
+def payment_history(hop, data, move):
     """
     Show payment history
     """
-    offset = page * 5
-    cur.execute("""
-        SELECT purpose, amount, status, created_at, transaction_id
-        FROM payments 
-        WHERE phone_number = %s 
-        ORDER BY created_at DESC 
-        LIMIT 5 OFFSET %s
-    """, (phone_number, offset))
-    
-    payments = cur.fetchall()
+    page, bound = pagination.seek(data, move)
+    payments = repository.payments_page(hop.cur, hop.phone_number, bound)
     
     if not payments:
-        return "END No payment history found."
+        return end("No payment history found.")
     
-    response_text = "CON Your Payment History:\n\n"
+    hop.goto('payment_history', pagination.landed(
+        data, page,
+        pagination.row_key(payments[0].created_at, payments[0].id),
+        pagination.row_key(payments[-1].created_at, payments[-1].id)))
+    
+    response_text = "Your Payment History:\n\n"
     for i, payment in enumerate(payments, 1):
-        purpose, amount, status, created_at, transaction_id = payment
-        status_icon = "✅" if status == 'completed' else "⏳" if status == 'pending' else "❌"
+        purpose, amount, status, created_at, transaction_id, payment_id = payment
+        status_icon = "✅" if status == 'completed' else "⏳" if status in ('pending', 'queued', 'submitting', 'processing') else "❌"
         date_str = created_at.strftime('%d/%m/%y')
         
         response_text += f"{i}. {purpose}\n"
@@ -688,31 +304,29 @@ def payment_history_at(session_id, phone_number, cur, page=0):
     
     response_text += "6. Next Page\n7. Previous Page\n0. Main Menu"
     
-    return response_text
+    return con(response_text)
+
+def enter_payment_history(hop):
+    return payment_history(hop, {}, pagination.FIRST)
+
+def next_payment_history_page(hop, text):
+    return payment_history(hop, hop.data, pagination.NEXT)
+
+def previous_payment_history_page(hop, text):
+    return payment_history(hop, hop.data, pagination.PREVIOUS)
 
 # Admin Payment Functions (for support)
 def get_total_revenue(cur):
     """
-    Get total revenue (admin function)
+    Get total revenue (admin function), from the daily rollup
     """
-    cur.execute("""
-        SELECT COALESCE(SUM(amount), 0) as total_revenue
-        FROM payments 
-        WHERE status = 'completed'
-    """)
-    result = cur.fetchone()
-    return result[0] if result else 0
+    return repository.total_revenue(cur)
 
 def get_daily_transactions(cur):
     """
     Get daily transaction stats (admin function)
     """
-    cur.execute("""
-        SELECT COUNT(*) as count, COALESCE(SUM(amount), 0) as amount
-        FROM payments 
-        WHERE status = 'completed' AND DATE(created_at) = CURRENT_DATE
-    """)
-    return cur.fetchone()
+    return repository.daily_transactions(cur)
 
 # Payment Webhook Endpoint (for payment gateway callbacks)
 @app.route('/payment-webhook', methods=['POST'])
@@ -725,27 +339,26 @@ def payment_webhook():
         if not data:
             return jsonify({"error": "No data received"}), 400
         
-        # Extract payment details from webhook
-        transaction_id = data.get('transactionId')
-        status = data.get('status')
-        amount = data.get('amount')
-        phone_number = data.get('phoneNumber')
-        
-        print(f"🔔 Payment webhook received: {transaction_id}, {status}")
-        
-        # Update payment status
-        if transaction_id and status:
-            success = update_payment_status(transaction_id, status)
-            if success:
-                return jsonify({"status": "success"}), 200
-            else:
-                return jsonify({"status": "update_failed"}), 500
-        else:
+        event = parse_webhook(data, request.headers)
+        if event is None:
             return jsonify({"error": "Missing transaction data"}), 400
+        
+        outcome = get_webhook_ingestor().submit(event)
+        if outcome in (APPLIED, DUPLICATE):
+            return jsonify({"status": "success", "outcome": outcome}), 200
+        if outcome == REJECTED:
+            # Out of order (e.g. 'pending' after 'completed'); a retry won't change that
+            log.warning("payment_webhook_rejected", transaction_id=event.transaction_id, status=event.status)
+            return jsonify({"status": "ignored", "outcome": outcome}), 200
+        if outcome == ERROR:
+            return jsonify({"status": "update_failed"}), 500
+        # Not known (yet): the provider retries later
+        return jsonify({"status": "unknown_transaction"}), 404
             
     except Exception as e:
-        print(f"❌ Payment webhook error: {e}")
+        log.exception("payment_webhook_failed")
         return jsonify({"error": str(e)}), 500
+
 # Main USSD Handler
 @app.route('/ussd', methods=['POST'])
 def ussd_handler():
@@ -764,7 +377,7 @@ def ussd_handler():
         if not validate_phone_number(phone_number):
             return jsonify(ussd_response("Invalid phone number format. Use +260 format.", session_id, False))
         
-        print(f"USSD Request: {session_id}, {phone_number}, {text}")
+        log.debug("ussd_request", session_id=session_id, phone_number=phone_number, text=text)
         
         # Initialize session if first request
         if text == '':
@@ -774,8 +387,8 @@ def ussd_handler():
         response = process_input(session_id, phone_number, text)
         return jsonify(response)
         
-    except Exception as e:
-        print(f"Error in ussd_handler: {str(e)}")
+    except Exception:
+        log.exception("ussd_handler_failed", session_id=session_id)
         return jsonify(ussd_response("Sorry, an error occurred. Please try again.", session_id, False))
 
 # Africa's Talking USSD Callback Endpoint
@@ -790,7 +403,7 @@ def africas_talking_ussd():
         phone_number = request.values.get("phoneNumber") 
         text = request.values.get("text", "")
         
-        print(f"📞 Africa's Talking USSD: {session_id}, {phone_number}, '{text}'")
+        log.debug("at_ussd_request", session_id=session_id, phone_number=phone_number, text=text)
         
         if not session_id or not phone_number:
             return "END Invalid request. Missing sessionId or phoneNumber."
@@ -798,843 +411,353 @@ def africas_talking_ussd():
         # Process using simple function
         response = process_africas_talking_ussd(session_id, phone_number, text)
         
-        print(f"✅ Response: {response}")
+        log.debug("at_ussd_response", session_id=session_id, response=response)
         return response
         
-    except Exception as e:
-        print(f"❌ Africa's Talking USSD error: {e}")
+    except Exception:
+        log.exception("at_ussd_failed")
         return "END Sorry, service temporarily unavailable. Please try again later."
 
 def process_africas_talking_ussd(session_id, phone_number, text):
     """
     Process USSD input and return Africa's Talking formatted response
     """
+    # Africa's Talking sends the whole input history; handlers act on the latest choice
+    history = split_text(text)
+    choice = history.pop() if history else ''
+    return run_ussd_hop(session_id, phone_number, choice, AT_RESPONSE, history=history)
+
+def process_input(session_id, phone_number, text):
+    """
+    Process /ussd input and return the JSON ussd_response
+    """
+    return run_ussd_hop(session_id, phone_number, text, JSON_RESPONSE)
+
+def run_ussd_hop(session_id, phone_number, choice, adapter, history=None):
+    """
+    Run one hop through USSD_MENU and render the resulting screen with adapter.
+    
+    history is the earlier input of an Africa's Talking session. It is None
+    for /ussd, whose sessions are created by welcome_menu and must exist.
+    """
+    db = None
     conn = None
     cur = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            return "END Service temporarily unavailable. Please try again."
+        db = get_db_connection()
+        if not db:
+            return adapter.render(end("Service temporarily unavailable. Please try again later."), session_id)
         
+        # Everything this hop writes is committed once, at the end
+        store = get_session_store()
+        conn = UnitOfWork(db, session_id, phone_number, store)
         cur = conn.cursor()
         
-        # Get or create session
-        cur.execute("SELECT menu_level, data FROM ussd_sessions WHERE session_id = %s", (session_id,))
-        session_data = cur.fetchone()
+        # Replay the history when it only went through navigation menus
+        menu_level = None
+        profiles = {}
+        if history is not None and AT_TEXT_REPLAY:
+            menu_level = USSD_MENU.replay(history, lambda role: is_registered(cur, role, phone_number, profiles))
+        replayed = menu_level is not None
         
-        if not session_data:
-            # New session - this shouldn't happen but handle it
-            cur.execute("""
-                INSERT INTO ussd_sessions (session_id, phone_number, menu_level, data) 
-                VALUES (%s, %s, 'main_menu', '{}')
-            """, (session_id, phone_number))
-            conn.commit()
-            menu_level = 'main_menu'
+        if replayed:
             data = {}
+        elif history is not None and not history and choice == '':
+            # An empty text is always the first hop of a new dial
+            menu_level, data = 'main_menu', {}
+            update_session(cur, conn, session_id, menu_level, data)
         else:
-            menu_level, data_json = session_data
-            data = json.loads(data_json) if data_json else {}
-        
-        print(f"🔍 USSD Processing: menu_level={menu_level}, text='{text}', phone={phone_number}")
-        
-        # Process based on current menu level
-        response_text = "CON Welcome to JOWA - Find Work in Zambia\n\n1. Looking for Work\n2. Post a Job\n3. Payment History\n4. About Jowa\n5. Contact Support\n\nReply with 1, 2, 3, 4, or 5"
-        
-        if menu_level == 'main_menu':
-            if text == '1':
-                # Job seeker path
-                try:
-                    cur.execute("SELECT full_name FROM users WHERE phone_number = %s", (phone_number,))
-                    user = cur.fetchone()
-                    
-                    if user and user[0]:
-                        update_session(cur, conn, session_id, 'job_seeker_dashboard', {})
-                        response_text = job_seeker_dashboard_at(session_id, phone_number, cur)
-                    else:
-                        update_session(cur, conn, session_id, 'job_seeker_registration', {'step': 1})
-                        response_text = "CON Welcome! Let's set up your profile.\n\nEnter your full name:"
-                except Exception as e:
-                    print(f"Error in job seeker path: {e}")
-                    response_text = "END Service error. Please try again later."
-                    
-            elif text == '2':
-                # Employer path
-                try:
-                    cur.execute("SELECT company_name FROM employers WHERE phone_number = %s", (phone_number,))
-                    employer = cur.fetchone()
-                    
-                    if employer and employer[0]:
-                        update_session(cur, conn, session_id, 'employer_dashboard', {})
-                        response_text = employer_dashboard_at(session_id, phone_number, cur)
-                    else:
-                        update_session(cur, conn, session_id, 'employer_registration', {'step': 1})
-                        response_text = "CON Welcome Employer! Let's register your business.\n\nEnter your company name:"
-                except Exception as e:
-                    print(f"Error in employer path: {e}")
-                    response_text = "END Service error. Please try again later."
-                    
-            elif text == '3':
-                update_session(cur, conn, session_id, 'payment_menu', {})
-                response_text = "CON Payment Services\n\n1. View Payment History\n2. Premium Job Posting (K10)\n3. Back to Main Menu\n\nReply with 1, 2, or 3"
-            elif text == '4':
-                response_text = "END About JOWA\n\nConnecting job seekers with employers across Zambia. No internet needed!\n\nFind daily work opportunities\nPost jobs for free\nSimple USSD interface\n\nFor support: +260570528201"
-            elif text == '5':
-                response_text = "END Contact Support:\n\nCall: +260570528201\nEmail: support@jowa.co.zm\n\nOur team is here to help you with any issues.\n\nThank you for using Jowa!"
-        
-        elif menu_level == 'job_seeker_registration':
-            response_text = handle_job_seeker_registration_at(session_id, phone_number, text, cur, conn, data)
-        
-        elif menu_level == 'employer_registration':
-            response_text = handle_employer_registration_at(session_id, phone_number, text, cur, conn, data)
-        
-        elif menu_level == 'job_seeker_dashboard':
-            response_text = handle_job_seeker_dashboard_at(session_id, phone_number, text, cur, conn, data)
-        
-        elif menu_level == 'employer_dashboard':
-            response_text = handle_employer_dashboard_at(session_id, phone_number, text, cur, conn, data)
-        elif menu_level == 'payment_menu':
-            if text == '1':
-                update_session(cur, conn, session_id, 'payment_history', {'page': 0})
-                response_text = payment_history_at(session_id, phone_number, cur, 0)
-            elif text == '2':
-                response_text = premium_job_posting_flow_at(session_id, phone_number, cur, conn)
+            session_data = store.get(session_id, cur)
+            
+            if session_data:
+                menu_level, data = session_data
+            elif history is None:
+                return adapter.render(end("Session expired. Please dial again."), session_id)
             else:
-                response_text = "CON Invalid option. Please try again."
+                menu_level, data = 'main_menu', {}
+                update_session(cur, conn, session_id, menu_level, data)
         
-        elif menu_level == 'payment_method':
-            response_text = handle_payment_selection_at(session_id, phone_number, text, data['amount'], data['purpose'], cur, conn)
+        metrics.tag_request(menu_level)
+        hop = Hop(USSD_MENU, session_id, phone_number, cur, conn, menu_level, data, profiles)
+        screen = USSD_MENU.dispatch(menu_level, choice, hop)
         
-        elif menu_level == 'payment_confirmation':
-            response_text = process_payment_confirmation_at(session_id, phone_number, text, cur, conn)
+        # The next hop can replay its way back to a plain menu - no need to store it
+        pending = conn.pending_session
+        if replayed and pending and USSD_MENU.is_replayable(pending[1], pending[2]):
+            conn.discard_session()
         
-        elif menu_level == 'payment_history':
-            if text == '6':
-                page = data.get('page', 0) + 1
-                data['page'] = page
-                update_session(cur, conn, session_id, 'payment_history', data)
-                response_text = payment_history_at(session_id, phone_number, cur, page)
-            elif text == '7':
-                page = max(0, data.get('page', 0) - 1)
-                data['page'] = page
-                update_session(cur, conn, session_id, 'payment_history', data)
-                response_text = payment_history_at(session_id, phone_number, cur, page)
-            elif text == '0':
-                update_session(cur, conn, session_id, 'main_menu', {})
-                response_text = "CON Welcome to JOWA - Find Work in Zambia\n\n1. Looking for Work\n2. Post a Job\n3. Payment History\n4. About Jowa\n5. Contact Support\n\nReply with 1, 2, 3, 4, or 5"
-            else:
-                response_text = "CON Invalid option. Please try again."
+        conn.commit()
         
-        print(f"✅ USSD Response: {response_text[:100]}...")
-        return response_text
+        log.info("ussd_hop", session_id=session_id, menu_level=menu_level, choice=choice,
+                 replayed=replayed, end=screen.end)
+        return adapter.render(screen, session_id)
         
-    except Exception as e:
-        print(f"❌ Africa's Talking processing error: {e}")
-        import traceback
-        print(f"🔍 Full error: {traceback.format_exc()}")
-        return "END Sorry, service temporarily unavailable. Please try again later."
+    except Exception:
+        log.exception("ussd_hop_failed", session_id=session_id)
+        if conn:
+            conn.rollback()
+        return adapter.render(end("Sorry, service temporarily unavailable. Please try again later."), session_id)
     finally:
         if cur:
             cur.close()
-        if conn:
-            conn.close()
+        if db:
+            db.close()
+
+def lookup_profile(cur, role, phone_number, profiles=None):
+    """
+    (id, name) of this phone's seeker or employer profile, None if there
+    is no such profile. profiles is the hop's memo (role -> profile): the
+    Branch that picks a dashboard and the dashboard itself both need it.
+    Behind the memo, complete profiles come from the worker's profile
+    cache (services/profile_cache.py).
+    """
+    if profiles is not None and role in profiles:
+        return profiles[role]
+    cache = get_profile_cache()
+    profile = cache.get(phone_number, role)
+    if profile is None:
+        generation = cache.generation
+        if role == 'seeker':
+            profile = repository.user_profile(cur, phone_number)
+        else:
+            profile = repository.employer_profile(cur, phone_number)
+        if profile is not None and profile.name:
+            cache.put(phone_number, role, profile, generation)
+    if profiles is not None:
+        profiles[role] = profile
+    return profile
+
+def profile_name(cur, role, phone_number, profiles=None):
+    """
+    The seeker's full_name or the employer's company_name for this phone,
+    None if there is no such profile
+    """
+    profile = lookup_profile(cur, role, phone_number, profiles)
+    return profile.name if profile else None
+
+def profile_saved(hop, role, profile):
+    """
+    After a registration or profile write: the rest of this hop sees the
+    new profile, and cached copies are dropped once the write commits
+    """
+    hop.profiles[role] = profile
+    hop.conn.after_commit(get_profile_cache().invalidate, hop.phone_number)
+
+def is_registered(cur, role, phone_number, profiles=None):
+    """
+    Whether this phone has completed seeker or employer registration
+    """
+    return bool(profile_name(cur, role, phone_number, profiles))
+
+def welcome_menu(session_id, phone_number):
+    metrics.tag_request('main_menu')
+    # Initialize session
+    db = get_db_connection()
+    if db:
+        conn = UnitOfWork(db, session_id, phone_number, get_session_store())
+        cur = conn.cursor()
+        
+        try:
+            # Check if user exists (a cached seeker profile is one)
+            if (get_profile_cache().get(phone_number, 'seeker') is None
+                    and not repository.user_exists(cur, phone_number)):
+                repository.create_user(cur, phone_number)
+            
+            # Initialize session
+            update_session(cur, conn, session_id, 'main_menu', {})
+            
+            conn.commit()
+        except Exception:
+            log.exception("welcome_menu_failed")
+            conn.rollback()
+        finally:
+            cur.close()
+            db.close()
+    
+    return jsonify(JSON_RESPONSE.render(main_menu_screen(None), session_id))
+
+# Menu screens and handlers
+# Handlers take (hop, text) and return a Screen; USSD_MENU below wires them up
+# and the response adapters render them for /at-ussd and /ussd alike.
+def main_menu_screen(hop, text=None):
+    return con("Welcome to JOWA - Find Work in Zambia\n\n1. Looking for Work\n2. Post a Job\n3. Payment History\n4. About Jowa\n5. Contact Support\n\nReply with 1, 2, 3, 4, or 5")
+
+def about_screen(hop, text):
+    return end("About JOWA\n\nConnecting job seekers with employers across Zambia. No internet needed!\n\nFind daily work opportunities\nPost jobs for free\nSimple USSD interface\n\nFor support: +260570528201")
 
+def support_screen(hop, text):
+    return end("Contact Support:\n\nCall: +260570528201\nEmail: support@jowa.co.zm\n\nOur team is here to help you with any issues.\n\nThank you for using Jowa!")
 
-# Africa's Talking formatted menu functions
-def job_seeker_dashboard_at(session_id, phone_number, cur):
-    cur.execute("SELECT full_name FROM users WHERE phone_number = %s", (phone_number,))
-    user = cur.fetchone()
-    name = user[0] if user else "User"
+def job_seeker_dashboard(hop):
+    name = profile_name(hop.cur, 'seeker', hop.phone_number, hop.profiles) or "User"
     
-    return f"CON Welcome {name}!\n\n1. Browse Available Jobs\n2. My Applications\n3. Update Profile\n4. Back to Main Menu\n\nReply with 1, 2, 3, or 4"
+    return con(f"Welcome {name}!\n\n1. Browse Available Jobs\n2. My Applications\n3. Update Profile\n4. Back to Main Menu\n\nReply with 1, 2, 3, or 4")
 
-def employer_dashboard_at(session_id, phone_number, cur):
-    cur.execute("SELECT company_name FROM employers WHERE phone_number = %s", (phone_number,))
-    employer = cur.fetchone()
-    company_name = employer[0] if employer else "Employer"
+def employer_dashboard(hop):
+    company_name = profile_name(hop.cur, 'employer', hop.phone_number, hop.profiles) or "Employer"
     
-    return f"CON Welcome {company_name}!\n\n1. Post New Job\n2. View My Jobs\n3. View Applications\n4. Back to Main Menu\n\nReply with 1, 2, 3, or 4"
+    return con(f"Welcome {company_name}!\n\n1. Post New Job\n2. View My Jobs\n3. View Applications\n4. Back to Main Menu\n\nReply with 1, 2, 3, or 4")
 
-def handle_job_seeker_registration_at(session_id, phone_number, text, cur, conn, data):
+def start_job_seeker_registration(hop):
+    hop.goto('job_seeker_registration', {'step': 1})
+    return con("Welcome! Let's set up your profile.\n\nEnter your full name:")
+
+def update_profile(hop, text):
+    hop.goto('job_seeker_registration', {'step': 1})
+    return con("Update your profile:\n\nEnter your full name:")
+
+def handle_job_seeker_registration(hop, text):
+    data = hop.data
     step = data.get('step', 1)
     
     if step == 1:
         if len(text.strip()) < 2:
-            return "CON Please enter a valid full name:"
+            return con("Please enter a valid full name:")
         
         data['full_name'] = text.strip()
         data['step'] = 2
-        update_session(cur, conn, session_id, 'job_seeker_registration', data)
-        return "CON Enter your skills (e.g., Construction, Farming, Cleaning):"
+        hop.goto('job_seeker_registration', data)
+        return con("Enter your skills (e.g., Construction, Farming, Cleaning):")
     
     elif step == 2:
         if len(text.strip()) < 2:
-            return "CON Please enter your skills:"
+            return con("Please enter your skills:")
         
         data['skills'] = text.strip()
         data['step'] = 3
-        update_session(cur, conn, session_id, 'job_seeker_registration', data)
-        return "CON Enter your location/town:"
+        hop.goto('job_seeker_registration', data)
+        return con("Enter your location/town:")
     
     elif step == 3:
         if len(text.strip()) < 2:
-            return "CON Please enter your location:"
+            return con("Please enter your location:")
         
         data['location'] = text.strip()
         
         # Save to database
-        cur.execute("""
-            INSERT INTO users (phone_number, full_name, skills, location) 
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (phone_number) DO UPDATE SET
-            full_name = EXCLUDED.full_name,
-            skills = EXCLUDED.skills,
-            location = EXCLUDED.location
-        """, (phone_number, data['full_name'], data['skills'], data['location']))
-        
-        conn.commit()
+        user_id = repository.save_seeker(hop.cur, hop.phone_number, data['full_name'], data['skills'],
+                                         data['location'])
+        profile_saved(hop, 'seeker', repository.ProfileRow(user_id, data['full_name']))
         
-        update_session(cur, conn, session_id, 'job_seeker_dashboard', {})
-        return job_seeker_dashboard_at(session_id, phone_number, cur)
+        return hop.enter('job_seeker_dashboard')
     
-    return "CON Registration failed. Please try again."
+    return con("Registration failed. Please try again.")
 
-def handle_employer_registration_at(session_id, phone_number, text, cur, conn, data):
+def start_employer_registration(hop):
+    hop.goto('employer_registration', {'step': 1})
+    return con("Welcome Employer! Let's register your business.\n\nEnter your company name:")
+
+def handle_employer_registration(hop, text):
+    data = hop.data
     step = data.get('step', 1)
     
     if step == 1:
         if len(text.strip()) < 2:
-            return "CON Please enter a valid company name:"
+            return con("Please enter a valid company name:")
         
         data['company_name'] = text.strip()
         data['step'] = 2
-        update_session(cur, conn, session_id, 'employer_registration', data)
-        return "CON Enter your business type (e.g., Construction, Retail, Farming):"
+        hop.goto('employer_registration', data)
+        return con("Enter your business type (e.g., Construction, Retail, Farming):")
     
     elif step == 2:
         if len(text.strip()) < 2:
-            return "CON Please enter your business type:"
+            return con("Please enter your business type:")
         
         data['business_type'] = text.strip()
         
         # Save to database
-        cur.execute("""
-            INSERT INTO employers (phone_number, company_name, business_type) 
-            VALUES (%s, %s, %s)
-            ON CONFLICT (phone_number) DO UPDATE SET
-            company_name = EXCLUDED.company_name,
-            business_type = EXCLUDED.business_type
-        """, (phone_number, data['company_name'], data['business_type']))
-        
-        conn.commit()
+        employer_id = repository.save_employer(hop.cur, hop.phone_number, data['company_name'],
+                                               data['business_type'])
+        profile_saved(hop, 'employer', repository.ProfileRow(employer_id, data['company_name']))
         
-        update_session(cur, conn, session_id, 'employer_dashboard', {})
-        return employer_dashboard_at(session_id, phone_number, cur)
+        return hop.enter('employer_dashboard')
     
-    return "CON Registration failed. Please try again."
+    return con("Registration failed. Please try again.")
 
-def handle_job_seeker_dashboard_at(session_id, phone_number, text, cur, conn, data):
-    if text == '1':
-        update_session(cur, conn, session_id, 'browse_jobs', {'page': 0})
-        return browse_jobs_at(session_id, phone_number, cur, 0)
-    
-    elif text == '2':
-        update_session(cur, conn, session_id, 'view_applications', {'page': 0})
-        return show_my_applications_at(session_id, phone_number, cur, 0)
-    
-    elif text == '3':
-        update_session(cur, conn, session_id, 'job_seeker_registration', {'step': 1})
-        return "CON Update your profile:\n\nEnter your full name:"
-    
-    elif text == '4':
-        update_session(cur, conn, session_id, 'main_menu', {})
-        return "CON Welcome to JOWA - Find Work in Zambia\n\n1. Looking for Work\n2. Post a Job\n3. About Jowa\n4. Contact Support\n\nReply with 1, 2, 3, or 4"
-    
-    else:
-        return "CON Invalid option. Please try again."
-
-def handle_employer_dashboard_at(session_id, phone_number, text, cur, conn, data):
-    if text == '1':
-        update_session(cur, conn, session_id, 'post_job', {'step': 1})
-        return "CON Let's post a new job!\n\nEnter job title:"
-    
-    elif text == '2':
-        return show_employer_jobs_at(session_id, phone_number, cur)
-    
-    elif text == '3':
-        return show_job_applications_at(session_id, phone_number, cur)
-    
-    elif text == '4':
-        update_session(cur, conn, session_id, 'main_menu', {})
-        return "CON Welcome to JOWA - Find Work in Zambia\n\n1. Looking for Work\n2. Post a Job\n3. About Jowa\n4. Contact Support\n\nReply with 1, 2, 3, or 4"
-    
-    else:
-        return "CON Invalid option. Please try again."
-
-def browse_jobs_at(session_id, phone_number, cur, page):
-    offset = page * 3
-    cur.execute("""
-        SELECT j.id, j.title, j.location, j.payment_amount, j.payment_type, e.company_name
-        FROM jobs j
-        JOIN employers e ON j.employer_id = e.id
-        WHERE j.status = 'active'
-        ORDER BY j.created_at DESC
-        LIMIT 3 OFFSET %s
-    """, (offset,))
-    
-    jobs = cur.fetchall()
+def load_jobs_page(cur, bound):
+    """
+    Read and render one page of active jobs as a ListingPage
+    """
+    jobs = repository.jobs_page(cur, bound)
     
     if not jobs:
-        return "END No jobs available at the moment. Check back later!"
+        return ListingPage(None, None, None, ())
     
-    response_text = "CON Available Jobs:\n\n"
+    response_text = "Available Jobs:\n\n"
     for i, job in enumerate(jobs, 1):
-        job_id, title, location, amount, payment_type, company = job
-        response_text += f"{i}. {title}\n"
-        response_text += f"   Location: {location} - {company}\n"
-        response_text += f"   Payment: K{amount}/{payment_type}\n\n"
+        response_text += f"{i}. {job.title}\n"
+        response_text += f"   Location: {job.location} - {job.company_name}\n"
+        response_text += f"   Payment: K{job.payment_amount}/{job.payment_type}\n\n"
     
     response_text += "4. Next Page\n5. Back to Menu\n0. Main Menu"
     
-    return response_text
-
-def handle_browse_jobs_at(session_id, phone_number, text, cur, conn, data):
-    page = data.get('page', 0)
-    
-    if text.isdigit():
-        choice = int(text)
-        if 1 <= choice <= 3:
-            offset = page * 3
-            cur.execute("""
-                SELECT j.id, j.title FROM jobs j
-                WHERE j.status = 'active'
-                ORDER BY j.created_at DESC
-                LIMIT 3 OFFSET %s
-            """, (offset,))
-            
-            jobs = cur.fetchall()
-            if choice <= len(jobs):
-                job_id, job_title = jobs[choice-1]
-                
-                cur.execute("SELECT id FROM users WHERE phone_number = %s", (phone_number,))
-                user_result = cur.fetchone()
-                if not user_result:
-                    return "END User not found. Please register first."
-                
-                user_id = user_result[0]
-                
-                cur.execute("""
-                    SELECT id FROM applications 
-                    WHERE job_id = %s AND user_id = %s
-                """, (job_id, user_id))
-                
-                if not cur.fetchone():
-                    cur.execute("""
-                        INSERT INTO applications (job_id, user_id, status)
-                        VALUES (%s, %s, 'pending')
-                    """, (job_id, user_id))
-                    conn.commit()
-                    
-                    # Send SMS notification to employer
-                    send_sms_notification(phone_number, f"New application received for job: {job_title}. Applicant: {phone_number}")
-                
-                return f"END Application submitted for: {job_title}\n\nEmployer will contact you soon!"
-        
-        elif choice == 4:
-            page += 1
-            data['page'] = page
-            update_session(cur, conn, session_id, 'browse_jobs', data)
-            return browse_jobs_at(session_id, phone_number, cur, page)
-        
-        elif choice == 5:
-            update_session(cur, conn, session_id, 'job_seeker_dashboard', {})
-            return job_seeker_dashboard_at(session_id, phone_number, cur)
-        
-        elif choice == 0:
-            update_session(cur, conn, session_id, 'main_menu', {})
-            return "CON Welcome to JOWA - Find Work in Zambia\n\n1. Looking for Work\n2. Post a Job\n3. About Jowa\n4. Contact Support\n\nReply with 1, 2, 3, or 4"
-    
-    return "CON Invalid option. Please try again."
+    return ListingPage(
+        response_text,
+        pagination.row_key(jobs[0].created_at, jobs[0].id),
+        pagination.row_key(jobs[-1].created_at, jobs[-1].id),
+        tuple((job.id, job.title) for job in jobs))
 
-def show_my_applications_at(session_id, phone_number, cur, page):
-    offset = page * 5
-    cur.execute("""
-        SELECT j.title, e.company_name, a.status, a.applied_at
-        FROM applications a
-        JOIN jobs j ON a.job_id = j.id
-        JOIN employers e ON j.employer_id = e.id
-        JOIN users u ON a.user_id = u.id
-        WHERE u.phone_number = %s
-        ORDER BY a.applied_at DESC
-        LIMIT 5 OFFSET %s
-    """, (phone_number, offset))
+def browse_jobs(hop, data, move):
+    page, bound = pagination.seek(data, move)
     
-    applications = cur.fetchall()
+    # Pages are shared by every seeker; a hit doesn't touch the jobs tables
+    cache = get_job_cache()
+    listing = cache.get(bound)
+    if listing is None:
+        generation = cache.generation
+        listing = load_jobs_page(hop.cur, bound)
+        cache.put(bound, listing, generation)
     
-    if not applications:
-        return "END You haven't applied to any jobs yet.\n\nBrowse jobs to get started!"
+    if not listing.jobs:
+        return end("No jobs available at the moment. Check back later!")
     
-    response_text = "CON Your Applications:\n\n"
-    for i, app in enumerate(applications, 1):
-        title, company, status, applied_at = app
-        status_text = "Approved" if status == 'approved' else "Pending" if status == 'pending' else "Rejected"
-        response_text += f"{i}. {title}\n"
-        response_text += f"   Company: {company}\n"
-        response_text += f"   Status: {status_text}\n"
-        response_text += f"   Date: {applied_at.strftime('%d/%m/%Y')}\n\n"
-    
-    response_text += "6. Next Page\n7. Previous Page\n0. Main Menu"
+    page_data = pagination.landed(data, page, listing.first_key, listing.last_key)
+    # What "1"-"3" point at on this screen, so applying needn't re-run the listing
+    page_data['jobs'] = [list(job) for job in listing.jobs]
+    hop.goto('browse_jobs', page_data)
     
-    return response_text
+    return con(listing.text)
 
-def handle_view_applications_at(session_id, phone_number, text, cur, conn, data):
-    page = data.get('page', 0)
-    
-    if text == '6':
-        page += 1
-        data['page'] = page
-        update_session(cur, conn, session_id, 'view_applications', data)
-        return show_my_applications_at(session_id, phone_number, cur, page)
-    
-    elif text == '7':
-        if page > 0:
-            page -= 1
-        data['page'] = page
-        update_session(cur, conn, session_id, 'view_applications', data)
-        return show_my_applications_at(session_id, phone_number, cur, page)
-    
-    elif text == '0':
-        update_session(cur, conn, session_id, 'main_menu', {})
-        return "CON Welcome to JOWA - Find Work in Zambia\n\n1. Looking for Work\n2. Post a Job\n3. About Jowa\n4. Contact Support\n\nReply with 1, 2, 3, or 4"
-    
-    else:
-        return "CON Invalid option. Please try again."
+def enter_browse_jobs(hop):
+    return browse_jobs(hop, {}, pagination.FIRST)
 
-def handle_post_job_at(session_id, phone_number, text, cur, conn, data):
-    step = data.get('step', 1)
-    
-    if step == 1:
-        data['title'] = text
-        data['step'] = 2
-        update_session(cur, conn, session_id, 'post_job', data)
-        return "CON Enter job description:"
-    
-    elif step == 2:
-        data['description'] = text
-        data['step'] = 3
-        update_session(cur, conn, session_id, 'post_job', data)
-        return "CON Enter job location:"
-    
-    elif step == 3:
-        data['location'] = text
-        data['step'] = 4
-        update_session(cur, conn, session_id, 'post_job', data)
-        return "CON Enter payment amount (e.g., 50):"
-    
-    elif step == 4:
-        if not validate_payment_amount(text):
-            return "CON Please enter a valid payment amount (e.g., 50):"
-        
-        data['payment_amount'] = text
-        data['step'] = 5
-        update_session(cur, conn, session_id, 'post_job', data)
-        return "CON Enter payment type:\n1. Hourly\n2. Daily\n3. Project\n\nReply 1, 2, or 3"
-    
-    elif step == 5:
-        payment_types = {'1': 'hourly', '2': 'daily', '3': 'project'}
-        payment_type = payment_types.get(text)
-        
-        if not payment_type:
-            return "CON Invalid choice. Enter payment type:\n1. Hourly\n2. Daily\n3. Project"
-        
-        data['payment_type'] = payment_type
-        
-        cur.execute("SELECT id FROM employers WHERE phone_number = %s", (phone_number,))
-        employer_result = cur.fetchone()
-        if not employer_result:
-            return "END Employer not found. Please register first."
-        
-        employer_id = employer_result[0]
-        
-        cur.execute("""
-            INSERT INTO jobs (employer_id, title, description, location, payment_amount, payment_type)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (employer_id, data['title'], data['description'], data['location'], 
-              data['payment_amount'], data['payment_type']))
-        
-        conn.commit()
-        
-        update_session(cur, conn, session_id, 'employer_dashboard', {})
-        return "END Job posted successfully!\n\nJob seekers can now apply for your position."
-    
-    return "CON Job posting failed. Please try again."
+def next_jobs_page(hop, text):
+    return browse_jobs(hop, hop.data, pagination.NEXT)
 
-def show_employer_jobs_at(session_id, phone_number, cur):
-    cur.execute("""
-        SELECT j.title, j.status, COUNT(a.id) as applications
-        FROM jobs j
-        LEFT JOIN applications a ON j.id = a.job_id
-        WHERE j.employer_id = (SELECT id FROM employers WHERE phone_number = %s)
-        GROUP BY j.id, j.title, j.status
-        ORDER BY j.created_at DESC
-        LIMIT 5
-    """, (phone_number,))
-    
-    jobs = cur.fetchall()
+def apply_for_job(hop, text):
+    jobs = hop.data.get('jobs') or []
+    choice = int(text)
+    if choice > len(jobs):
+        return con("Invalid option. Please try again.")
     
-    if not jobs:
-        return "END You haven't posted any jobs yet.\n\nPost a job to find workers!"
+    # The job the user saw behind this number, even if newer jobs were posted since
+    job_id, job_title = jobs[choice-1]
     
-    response_text = "END Your Jobs:\n\n"
-    for job in jobs:
-        title, status, applications = job
-        status_text = "Active" if status == 'active' else "Inactive"
-        response_text += f"Title: {title}\n"
-        response_text += f"Status: {status_text}\n"
-        response_text += f"Applications: {applications}\n\n"
+    application = repository.apply(hop.cur, job_id, hop.phone_number)
+    if application and application.employer_phone:
+        # Employers get one digest for a burst of applications
+        send_sms_notification(hop.cur, application.employer_phone,
+            f"New application received for job: {job_title}. Applicant: {hop.phone_number}",
+            digest_key='applications')
     
-    return response_text
+    return end(f"Application submitted for: {job_title}\n\nEmployer will contact you soon!")
 
-def show_job_applications_at(session_id, phone_number, cur):
-    cur.execute("""
-        SELECT u.full_name, j.title, a.applied_at, u.phone_number
-        FROM applications a
-        JOIN jobs j ON a.job_id = j.id
-        JOIN users u ON a.user_id = u.id
-        WHERE j.employer_id = (SELECT id FROM employers WHERE phone_number = %s)
-        ORDER BY a.applied_at DESC
-        LIMIT 5
-    """, (phone_number,))
-    
-    applications = cur.fetchall()
+def show_my_applications(hop, data, move):
+    page, bound = pagination.seek(data, move)
+    applications = repository.applications_page(hop.cur, hop.phone_number, bound)
     
     if not applications:
-        return "END No applications received yet.\n\nCheck back later!"
-    
-    response_text = "END Recent Applications:\n\n"
-    for app in applications:
-        name, title, applied_at, applicant_phone = app
-        response_text += f"Job: {title}\n"
-        response_text += f"Applicant: {name}\n"
-        response_text += f"Phone: {applicant_phone}\n"
-        response_text += f"Date: {applied_at.strftime('%d/%m/%Y')}\n\n"
-    
-    response_text += "Contact applicants via their phone numbers above."
-    return response_text
-
-def welcome_menu(session_id, phone_number):
-    welcome_text = """Welcome to JOWA - Find Work in Zambia
-
-1. Looking for Work
-2. Post a Job
-3. About Jowa
-4. Contact Support
-
-Reply with 1, 2, 3, or 4"""
-    
-    # Initialize session
-    conn = get_db_connection()
-    if conn:
-        cur = conn.cursor()
-        
-        try:
-            # Check if user exists
-            cur.execute("SELECT phone_number FROM users WHERE phone_number = %s", (phone_number,))
-            user_exists = cur.fetchone()
-            
-            if not user_exists:
-                cur.execute("INSERT INTO users (phone_number) VALUES (%s) ON CONFLICT DO NOTHING", (phone_number,))
-            
-            # Initialize session
-            cur.execute("""
-                INSERT INTO ussd_sessions (session_id, phone_number, menu_level, data) 
-                VALUES (%s, %s, 'main_menu', '{}')
-                ON CONFLICT (session_id) DO UPDATE SET 
-                menu_level = 'main_menu', updated_at = CURRENT_TIMESTAMP
-            """, (session_id, phone_number))
-            
-            conn.commit()
-        except Exception as e:
-            print(f"Error in welcome_menu: {e}")
-        finally:
-            cur.close()
-            conn.close()
-    
-    return jsonify(ussd_response(welcome_text, session_id))
-
-def process_input(session_id, phone_number, text):
-    conn = get_db_connection()
-    if not conn:
-        return ussd_response("Service temporarily unavailable. Please try again later.", session_id, False)
-    
-    cur = conn.cursor()
-    
-    try:
-        # Get current session state
-        cur.execute("SELECT menu_level, data FROM ussd_sessions WHERE session_id = %s", (session_id,))
-        session_data = cur.fetchone()
-        
-        if not session_data:
-            return ussd_response("Session expired. Please dial again.", session_id, False)
-        
-        menu_level, data_json = session_data
-        data = json.loads(data_json) if data_json else {}
-        
-        # Route based on current menu level
-        if menu_level == 'main_menu':
-            response = handle_main_menu(session_id, phone_number, text, cur, conn)
-        elif menu_level == 'job_seeker_registration':
-            response = handle_job_seeker_registration(session_id, phone_number, text, cur, conn, data)
-        elif menu_level == 'employer_registration':
-            response = handle_employer_registration(session_id, phone_number, text, cur, conn, data)
-        elif menu_level == 'job_seeker_dashboard':
-            response = handle_job_seeker_dashboard(session_id, phone_number, text, cur, conn, data)
-        elif menu_level == 'employer_dashboard':
-            response = handle_employer_dashboard(session_id, phone_number, text, cur, conn, data)
-        elif menu_level == 'post_job':
-            response = handle_post_job(session_id, phone_number, text, cur, conn, data)
-        elif menu_level == 'browse_jobs':
-            response = handle_browse_jobs(session_id, phone_number, text, cur, conn, data)
-        elif menu_level == 'view_applications':
-            response = handle_view_applications(session_id, phone_number, text, cur, conn, data)
-        else:
-            response = ussd_response("Invalid option. Please dial again.", session_id, False)
-        
-        return response
-        
-    except Exception as e:
-        print(f"Error in process_input: {e}")
-        return ussd_response("Sorry, an error occurred. Please try again.", session_id, False)
-    finally:
-        cur.close()
-        conn.close()
-
-def handle_main_menu(session_id, phone_number, text, cur, conn):
-    if text == '1':
-        # Job Seeker path
-        cur.execute("SELECT full_name FROM users WHERE phone_number = %s", (phone_number,))
-        user = cur.fetchone()
-        
-        if user and user[0]:  # User is registered
-            update_session(cur, conn, session_id, 'job_seeker_dashboard', {})
-            return job_seeker_dashboard(session_id, phone_number, cur)
-        else:
-            update_session(cur, conn, session_id, 'job_seeker_registration', {'step': 1})
-            return ussd_response("Welcome! Let's set up your profile.\n\nEnter your full name:", session_id)
-    
-    elif text == '2':
-        # Employer path
-        cur.execute("SELECT company_name FROM employers WHERE phone_number = %s", (phone_number,))
-        employer = cur.fetchone()
-        
-        if employer and employer[0]:  # Employer is registered
-            update_session(cur, conn, session_id, 'employer_dashboard', {})
-            return employer_dashboard(session_id, phone_number, cur)
-        else:
-            update_session(cur, conn, session_id, 'employer_registration', {'step': 1})
-            return ussd_response("Welcome Employer! Let's register your business.\n\nEnter your company name:", session_id)
-    
-    elif text == '3':
-        about_text = """About JOWA\n\nConnecting job seekers with employers across Zambia. No internet needed!\n\nFind daily work opportunities\nPost jobs for free\nSimple USSD interface\nTrusted by Zambians\n\nFor support: +260960000000"""
-        return ussd_response(about_text, session_id, False)
-    
-    elif text == '4':
-        support_text = """Contact Support:\n\nCall: +260960000000\nEmail: support@jowa.co.zm\n\nOur team is here to help you with any issues using Jowa.\n\nThank you for using Jowa!"""
-        return ussd_response(support_text, session_id, False)
-    
-    else:
-        return ussd_response("Invalid option. Please reply with 1, 2, 3, or 4", session_id)
-
-def handle_job_seeker_registration(session_id, phone_number, text, cur, conn, data):
-    step = data.get('step', 1)
-    
-    if step == 1:
-        # Save name and ask for skills
-        if len(text.strip()) < 2:
-            return ussd_response("Please enter a valid full name:", session_id)
-        
-        data['full_name'] = text.strip()
-        data['step'] = 2
-        update_session(cur, conn, session_id, 'job_seeker_registration', data)
-        return ussd_response("Enter your skills (e.g., Construction, Farming, Cleaning):", session_id)
-    
-    elif step == 2:
-        # Save skills and ask for location
-        if len(text.strip()) < 2:
-            return ussd_response("Please enter your skills:", session_id)
-        
-        data['skills'] = text.strip()
-        data['step'] = 3
-        update_session(cur, conn, session_id, 'job_seeker_registration', data)
-        return ussd_response("Enter your location/town:", session_id)
-    
-    elif step == 3:
-        # Save location and complete registration
-        if len(text.strip()) < 2:
-            return ussd_response("Please enter your location:", session_id)
-        
-        data['location'] = text.strip()
-        
-        # Save to database
-        cur.execute("""
-            INSERT INTO users (phone_number, full_name, skills, location) 
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (phone_number) DO UPDATE SET
-            full_name = EXCLUDED.full_name,
-            skills = EXCLUDED.skills,
-            location = EXCLUDED.location
-        """, (phone_number, data['full_name'], data['skills'], data['location']))
-        
-        conn.commit()
-        
-        update_session(cur, conn, session_id, 'job_seeker_dashboard', {})
-        return job_seeker_dashboard(session_id, phone_number, cur)
-    
-    return ussd_response("Registration failed. Please try again.", session_id)
-
-def job_seeker_dashboard(session_id, phone_number, cur):
-    # Get user info
-    cur.execute("SELECT full_name FROM users WHERE phone_number = %s", (phone_number,))
-    user = cur.fetchone()
-    
-    name = user[0] if user else "User"
-    
-    dashboard_text = f"""Welcome {name}!
-
-1. Browse Available Jobs
-2. My Applications
-3. Update Profile
-4. Back to Main Menu
-
-Reply with 1, 2, 3, or 4"""
-    
-    return ussd_response(dashboard_text, session_id)
-
-def handle_job_seeker_dashboard(session_id, phone_number, text, cur, conn, data):
-    if text == '1':
-        update_session(cur, conn, session_id, 'browse_jobs', {'page': 0})
-        return browse_jobs(session_id, phone_number, cur, 0)
-    
-    elif text == '2':
-        update_session(cur, conn, session_id, 'view_applications', {'page': 0})
-        return show_my_applications(session_id, phone_number, cur, 0)
-    
-    elif text == '3':
-        update_session(cur, conn, session_id, 'job_seeker_registration', {'step': 1})
-        return ussd_response("Update your profile:\n\nEnter your full name:", session_id)
-    
-    elif text == '4':
-        update_session(cur, conn, session_id, 'main_menu', {})
-        return handle_main_menu(session_id, phone_number, '', cur, conn)
-    
-    else:
-        return ussd_response("Invalid option. Please try again.", session_id)
-
-def browse_jobs(session_id, phone_number, cur, page):
-    offset = page * 3
-    cur.execute("""
-        SELECT j.id, j.title, j.location, j.payment_amount, j.payment_type, e.company_name
-        FROM jobs j
-        JOIN employers e ON j.employer_id = e.id
-        WHERE j.status = 'active'
-        ORDER BY j.created_at DESC
-        LIMIT 3 OFFSET %s
-    """, (offset,))
-    
-    jobs = cur.fetchall()
+        return end("You haven't applied to any jobs yet.\n\nBrowse jobs to get started!")
     
-    if not jobs:
-        return ussd_response("No jobs available at the moment. Check back later!", session_id, False)
-    
-    response_text = "Available Jobs:\n\n"
-    for i, job in enumerate(jobs, 1):
-        job_id, title, location, amount, payment_type, company = job
-        response_text += f"{i}. {title}\n"
-        response_text += f"   Location: {location} - {company}\n"
-        response_text += f"   Payment: K{amount}/{payment_type}\n\n"
-    
-    response_text += "4. Next Page\n5. Back to Menu\n0. Main Menu"
-    
-    return ussd_response(response_text, session_id)
-
-def handle_browse_jobs(session_id, phone_number, text, cur, conn, data):
-    page = data.get('page', 0)
-    
-    if text.isdigit():
-        choice = int(text)
-        if 1 <= choice <= 3:
-            offset = page * 3
-            cur.execute("""
-                SELECT j.id, j.title FROM jobs j
-                WHERE j.status = 'active'
-                ORDER BY j.created_at DESC
-                LIMIT 3 OFFSET %s
-            """, (offset,))
-            
-            jobs = cur.fetchall()
-            if choice <= len(jobs):
-                job_id, job_title = jobs[choice-1]
-                
-                cur.execute("SELECT id FROM users WHERE phone_number = %s", (phone_number,))
-                user_result = cur.fetchone()
-                if not user_result:
-                    return ussd_response("User not found. Please register first.", session_id, False)
-                
-                user_id = user_result[0]
-                
-                cur.execute("""
-                    SELECT id FROM applications 
-                    WHERE job_id = %s AND user_id = %s
-                """, (job_id, user_id))
-                
-                if not cur.fetchone():
-                    cur.execute("""
-                        INSERT INTO applications (job_id, user_id, status)
-                        VALUES (%s, %s, 'pending')
-                    """, (job_id, user_id))
-                    conn.commit()
-                    
-                    # Send SMS notification to employer
-                    send_sms_notification(phone_number, f"New application received for job: {job_title}. Applicant: {phone_number}")
-                
-                return ussd_response(f"Application submitted for: {job_title}\n\nEmployer will contact you soon!", session_id, False)
-        
-        elif choice == 4:
-            page += 1
-            data['page'] = page
-            update_session(cur, conn, session_id, 'browse_jobs', data)
-            return browse_jobs(session_id, phone_number, cur, page)
-        
-        elif choice == 5:
-            update_session(cur, conn, session_id, 'job_seeker_dashboard', {})
-            return job_seeker_dashboard(session_id, phone_number, cur)
-        
-        elif choice == 0:
-            update_session(cur, conn, session_id, 'main_menu', {})
-            return handle_main_menu(session_id, phone_number, '', cur, conn)
-    
-    return ussd_response("Invalid option. Please try again.", session_id)
-
-def show_my_applications(session_id, phone_number, cur, page):
-    offset = page * 5
-    cur.execute("""
-        SELECT j.title, e.company_name, a.status, a.applied_at
-        FROM applications a
-        JOIN jobs j ON a.job_id = j.id
-        JOIN employers e ON j.employer_id = e.id
-        JOIN users u ON a.user_id = u.id
-        WHERE u.phone_number = %s
-        ORDER BY a.applied_at DESC
-        LIMIT 5 OFFSET %s
-    """, (phone_number, offset))
-    
-    applications = cur.fetchall()
-    
-    if not applications:
-        return ussd_response("You haven't applied to any jobs yet.\n\nBrowse jobs to get started!", session_id, False)
+    hop.goto('view_applications', pagination.landed(
+        data, page,
+        pagination.row_key(applications[0].applied_at, applications[0].id),
+        pagination.row_key(applications[-1].applied_at, applications[-1].id)))
     
     response_text = "Your Applications:\n\n"
     for i, app in enumerate(applications, 1):
-        title, company, status, applied_at = app
+        title, company, status, applied_at, application_id = app
         status_text = "Approved" if status == 'approved' else "Pending" if status == 'pending' else "Rejected"
         response_text += f"{i}. {title}\n"
         response_text += f"   Company: {company}\n"
@@ -1643,177 +766,80 @@ def show_my_applications(session_id, phone_number, cur, page):
     
     response_text += "6. Next Page\n7. Previous Page\n0. Main Menu"
     
-    return ussd_response(response_text, session_id)
-
-def handle_view_applications(session_id, phone_number, text, cur, conn, data):
-    page = data.get('page', 0)
-    
-    if text == '6':
-        page += 1
-        data['page'] = page
-        update_session(cur, conn, session_id, 'view_applications', data)
-        return show_my_applications(session_id, phone_number, cur, page)
-    
-    elif text == '7':
-        if page > 0:
-            page -= 1
-        data['page'] = page
-        update_session(cur, conn, session_id, 'view_applications', data)
-        return show_my_applications(session_id, phone_number, cur, page)
-    
-    elif text == '0':
-        update_session(cur, conn, session_id, 'main_menu', {})
-        return handle_main_menu(session_id, phone_number, '', cur, conn)
-    
-    else:
-        return ussd_response("Invalid option. Please try again.", session_id)
-
-def handle_employer_registration(session_id, phone_number, text, cur, conn, data):
-    step = data.get('step', 1)
-    
-    if step == 1:
-        # Save company name and ask for business type
-        if len(text.strip()) < 2:
-            return ussd_response("Please enter a valid company name:", session_id)
-        
-        data['company_name'] = text.strip()
-        data['step'] = 2
-        update_session(cur, conn, session_id, 'employer_registration', data)
-        return ussd_response("Enter your business type (e.g., Construction, Retail, Farming):", session_id)
-    
-    elif step == 2:
-        # Save business type and complete registration
-        if len(text.strip()) < 2:
-            return ussd_response("Please enter your business type:", session_id)
-        
-        data['business_type'] = text.strip()
-        
-        # Save to database
-        cur.execute("""
-            INSERT INTO employers (phone_number, company_name, business_type) 
-            VALUES (%s, %s, %s)
-            ON CONFLICT (phone_number) DO UPDATE SET
-            company_name = EXCLUDED.company_name,
-            business_type = EXCLUDED.business_type
-        """, (phone_number, data['company_name'], data['business_type']))
-        
-        conn.commit()
-        
-        update_session(cur, conn, session_id, 'employer_dashboard', {})
-        return employer_dashboard(session_id, phone_number, cur)
-    
-    return ussd_response("Registration failed. Please try again.", session_id)
+    return con(response_text)
 
-def employer_dashboard(session_id, phone_number, cur):
-    # Get employer info
-    cur.execute("SELECT company_name FROM employers WHERE phone_number = %s", (phone_number,))
-    employer = cur.fetchone()
-    
-    company_name = employer[0] if employer else "Employer"
-    
-    dashboard_text = f"""Welcome {company_name}!
+def enter_view_applications(hop):
+    return show_my_applications(hop, {}, pagination.FIRST)
 
-1. Post New Job
-2. View My Jobs
-3. View Applications
-4. Back to Main Menu
+def next_applications_page(hop, text):
+    return show_my_applications(hop, hop.data, pagination.NEXT)
 
-Reply with 1, 2, 3, or 4"""
-    
-    return ussd_response(dashboard_text, session_id)
+def previous_applications_page(hop, text):
+    return show_my_applications(hop, hop.data, pagination.PREVIOUS)
 
-def handle_employer_dashboard(session_id, phone_number, text, cur, conn, data):
-    if text == '1':
-        update_session(cur, conn, session_id, 'post_job', {'step': 1})
-        return ussd_response("Let's post a new job!\n\nEnter job title:", session_id)
-    
-    elif text == '2':
-        return show_employer_jobs(session_id, phone_number, cur)
-    
-    elif text == '3':
-        return show_job_applications(session_id, phone_number, cur)
-    
-    elif text == '4':
-        update_session(cur, conn, session_id, 'main_menu', {})
-        return handle_main_menu(session_id, phone_number, '', cur, conn)
-    
-    else:
-        return ussd_response("Invalid option. Please try again.", session_id)
+def start_post_job(hop):
+    hop.goto('post_job', {'step': 1})
+    return con("Let's post a new job!\n\nEnter job title:")
 
-def handle_post_job(session_id, phone_number, text, cur, conn, data):
+def handle_post_job(hop, text):
+    data = hop.data
     step = data.get('step', 1)
     
     if step == 1:
         data['title'] = text
         data['step'] = 2
-        update_session(cur, conn, session_id, 'post_job', data)
-        return ussd_response("Enter job description:", session_id)
+        hop.goto('post_job', data)
+        return con("Enter job description:")
     
     elif step == 2:
         data['description'] = text
         data['step'] = 3
-        update_session(cur, conn, session_id, 'post_job', data)
-        return ussd_response("Enter job location:", session_id)
+        hop.goto('post_job', data)
+        return con("Enter job location:")
     
     elif step == 3:
         data['location'] = text
         data['step'] = 4
-        update_session(cur, conn, session_id, 'post_job', data)
-        return ussd_response("Enter payment amount (e.g., 50):", session_id)
+        hop.goto('post_job', data)
+        return con("Enter payment amount (e.g., 50):")
     
     elif step == 4:
         if not validate_payment_amount(text):
-            return ussd_response("Please enter a valid payment amount (e.g., 50):", session_id)
+            return con("Please enter a valid payment amount (e.g., 50):")
         
         data['payment_amount'] = text
         data['step'] = 5
-        update_session(cur, conn, session_id, 'post_job', data)
-        return ussd_response("Enter payment type:\n1. Hourly\n2. Daily\n3. Project\n\nReply 1, 2, or 3", session_id)
+        hop.goto('post_job', data)
+        return con("Enter payment type:\n1. Hourly\n2. Daily\n3. Project\n\nReply 1, 2, or 3")
     
     elif step == 5:
         payment_types = {'1': 'hourly', '2': 'daily', '3': 'project'}
         payment_type = payment_types.get(text)
         
         if not payment_type:
-            return ussd_response("Invalid choice. Enter payment type:\n1. Hourly\n2. Daily\n3. Project", session_id)
+            return con("Invalid choice. Enter payment type:\n1. Hourly\n2. Daily\n3. Project")
         
         data['payment_type'] = payment_type
         
-        cur.execute("SELECT id FROM employers WHERE phone_number = %s", (phone_number,))
-        employer_result = cur.fetchone()
-        if not employer_result:
-            return ussd_response("Employer not found. Please register first.", session_id, False)
-        
-        employer_id = employer_result[0]
+        employer = lookup_profile(hop.cur, 'employer', hop.phone_number, hop.profiles)
+        if employer is None:
+            return end("Employer not found. Please register first.")
         
-        cur.execute("""
-            INSERT INTO jobs (employer_id, title, description, location, payment_amount, payment_type)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (employer_id, data['title'], data['description'], data['location'], 
-              data['payment_amount'], data['payment_type']))
+        repository.insert_job(hop.cur, employer.id, data['title'], data['description'], data['location'],
+                              data['payment_amount'], data['payment_type'])
+        # Every worker drops its cached listing pages once this commits
+        notify_jobs_changed(hop.cur)
         
-        conn.commit()
-        
-        update_session(cur, conn, session_id, 'employer_dashboard', {})
-        return ussd_response("Job posted successfully!\n\nJob seekers can now apply for your position.", session_id, False)
+        hop.goto('employer_dashboard', {})
+        return end("Job posted successfully!\n\nJob seekers can now apply for your position.")
     
-    return ussd_response("Job posting failed. Please try again.", session_id)
+    return con("Job posting failed. Please try again.")
 
-def show_employer_jobs(session_id, phone_number, cur):
-    cur.execute("""
-        SELECT j.title, j.status, COUNT(a.id) as applications
-        FROM jobs j
-        LEFT JOIN applications a ON j.id = a.job_id
-        WHERE j.employer_id = (SELECT id FROM employers WHERE phone_number = %s)
-        GROUP BY j.id, j.title, j.status
-        ORDER BY j.created_at DESC
-        LIMIT 5
-    """, (phone_number,))
-    
-    jobs = cur.fetchall()
+def show_employer_jobs(hop, text):
+    jobs = repository.employer_jobs(hop.cur, hop.phone_number)
     
     if not jobs:
-        return ussd_response("You haven't posted any jobs yet.\n\nPost a job to find workers!", session_id, False)
+        return end("You haven't posted any jobs yet.\n\nPost a job to find workers!")
     
     response_text = "Your Jobs:\n\n"
     for job in jobs:
@@ -1823,23 +849,13 @@ def show_employer_jobs(session_id, phone_number, cur):
         response_text += f"Status: {status_text}\n"
         response_text += f"Applications: {applications}\n\n"
     
-    return ussd_response(response_text, session_id, False)
+    return end(response_text)
 
-def show_job_applications(session_id, phone_number, cur):
-    cur.execute("""
-        SELECT u.full_name, j.title, a.applied_at, u.phone_number
-        FROM applications a
-        JOIN jobs j ON a.job_id = j.id
-        JOIN users u ON a.user_id = u.id
-        WHERE j.employer_id = (SELECT id FROM employers WHERE phone_number = %s)
-        ORDER BY a.applied_at DESC
-        LIMIT 5
-    """, (phone_number,))
-    
-    applications = cur.fetchall()
+def show_job_applications(hop, text):
+    applications = repository.employer_applications(hop.cur, hop.phone_number)
     
     if not applications:
-        return ussd_response("No applications received yet.\n\nCheck back later!", session_id, False)
+        return end("No applications received yet.\n\nCheck back later!")
     
     response_text = "Recent Applications:\n\n"
     for app in applications:
@@ -1850,7 +866,117 @@ def show_job_applications(session_id, phone_number, cur):
         response_text += f"Date: {applied_at.strftime('%d/%m/%Y')}\n\n"
     
     response_text += "Contact applicants via their phone numbers above."
-    return ussd_response(response_text, session_id, False)
+    return end(response_text)
+
+# USSD menu graph - compiled once at import into a (menu_level, input) dispatch table.
+# A string option navigates to that state, Branch picks a state by registration,
+# and a function handles the input itself.
+USSD_MENU = Menu({
+    'main_menu': State(
+        screen=main_menu_screen,
+        options={
+            '1': Branch('seeker', 'job_seeker_dashboard', 'job_seeker_registration'),
+            '2': Branch('employer', 'employer_dashboard', 'employer_registration'),
+            '3': 'payment_menu',
+            '4': about_screen,
+            '5': support_screen,
+        },
+        otherwise=main_menu_screen,
+        replayable=True,
+    ),
+    'job_seeker_registration': State(enter=start_job_seeker_registration, otherwise=handle_job_seeker_registration),
+    'employer_registration': State(enter=start_employer_registration, otherwise=handle_employer_registration),
+    'job_seeker_dashboard': State(
+        screen=job_seeker_dashboard,
+        options={
+            '1': 'browse_jobs',
+            '2': 'view_applications',
+            '3': update_profile,
+            '4': 'main_menu',
+        },
+        replayable=True,
+    ),
+    'employer_dashboard': State(
+        screen=employer_dashboard,
+        options={
+            '1': 'post_job',
+            '2': show_employer_jobs,
+            '3': show_job_applications,
+            '4': 'main_menu',
+        },
+        replayable=True,
+    ),
+    'browse_jobs': State(
+        enter=enter_browse_jobs,
+        options={
+            '1': apply_for_job,
+            '2': apply_for_job,
+            '3': apply_for_job,
+            '4': next_jobs_page,
+            '5': 'job_seeker_dashboard',
+            '0': 'main_menu',
+        },
+    ),
+    'view_applications': State(
+        enter=enter_view_applications,
+        options={
+            '6': next_applications_page,
+            '7': previous_applications_page,
+            '0': 'main_menu',
+        },
+    ),
+    'post_job': State(enter=start_post_job, otherwise=handle_post_job),
+    'payment_menu': State(
+        screen=payment_menu_screen,
+        options={
+            '1': 'payment_history',
+            '2': premium_job_posting_flow,
+            '3': 'main_menu',
+        },
+        replayable=True,
+    ),
+    'payment_history': State(
+        enter=enter_payment_history,
+        options={
+            '6': next_payment_history_page,
+            '7': previous_payment_history_page,
+            '0': 'main_menu',
+        },
+    ),
+    'payment_method': State(otherwise=handle_payment_selection),
+    'payment_confirmation': State(
+        options={
+            '1': confirm_payment,
+            '2': cancel_payment,
+        },
+        otherwise=invalid_confirmation,
+    ),
+}, is_registered=is_registered)
+
+# Most queries one request may run (services/query_audit.py), with the database
+# session store, which adds a session read and write to a stored hop. A USSD hop
+# is held to its menu_level's budget, other requests to their route's.
+HOP_QUERY_BUDGETS = {
+    'main_menu': 3,
+    'job_seeker_registration': 4,
+    'employer_registration': 4,
+    'job_seeker_dashboard': 3,
+    'employer_dashboard': 2,
+    'browse_jobs': 4,
+    'view_applications': 4,
+    'post_job': 6,
+    'payment_menu': 4,
+    'payment_history': 3,
+    'payment_method': 4,
+    'payment_confirmation': 4,
+}
+ROUTE_QUERY_BUDGETS = {
+    '/payment-webhook': 0,
+    '/payment-status/<transaction_id>': 1,
+    '/health': 0,
+    '/metrics': 1,
+}
+query_audit.set_budgets(HOP_QUERY_BUDGETS, ROUTE_QUERY_BUDGETS)
 
 
 # Payment Status Check Endpoint
@@ -1897,6 +1023,7 @@ def health_check():
             return jsonify({
                 "status": "healthy",
                 "database": "connected",
+                "pool": pool_stats(),
                 "timestamp": datetime.now().isoformat(),
                 "environment": APP_ENV
             }), 200
@@ -1904,6 +1031,7 @@ def health_check():
             return jsonify({
                 "status": "unhealthy",
                 "database": "disconnected",
+                "pool": pool_stats(),
                 "timestamp": datetime.now().isoformat(),
                 "environment": APP_ENV
             }), 503
@@ -1915,6 +1043,66 @@ def health_check():
             "environment": APP_ENV
         }), 500
 
+# Metrics endpoint (Prometheus text format), covering every gunicorn worker
+SMS_OUTBOX_PENDING = metrics.gauge('jowa_sms_outbox_pending', "SMS waiting in the outbox", local=True)
+SMS_OUTBOX_DUE = metrics.gauge('jowa_sms_outbox_due', "Outbox SMS due for sending now", local=True)
+SMS_OUTBOX_OVERDUE = metrics.gauge('jowa_sms_outbox_overdue_seconds',
+                                   "How long the most overdue outbox SMS has waited", local=True)
+
+def record_sms_outbox_depth():
+    conn = get_db_connection()
+    if not conn:
+        return
+    cur = conn.cursor()
+    try:
+        pending, due, overdue = outbox_depth(cur)
+        conn.commit()
+        SMS_OUTBOX_PENDING.set(pending)
+        SMS_OUTBOX_DUE.set(due)
+        SMS_OUTBOX_OVERDUE.set(overdue)
+    except Exception as e:
+        conn.rollback()
+        log.warning("sms_outbox_depth_failed", error=str(e))
+    finally:
+        cur.close()
+        conn.close()
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"error": "unauthorized"}), 401
+    
+    record_sms_outbox_depth()
+    return Response(metrics.render(metrics.collect()), mimetype='text/plain; version=0.0.4')
+
+# Profiler control: POST starts a window, DELETE ends it, GET returns collapsed stacks
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "not found"}), 404
+    if request.headers.get('Authorization') != f"Bearer {ADMIN_TOKEN}":
+        return jsonify({"error": "unauthorized"}), 401
+    
+    if request.method == 'POST':
+        params = request.get_json(silent=True) or request.values
+        try:
+            control = profiler.start(params.get('percent', 10), params.get('seconds', 60))
+        except (TypeError, ValueError):
+            return jsonify({"error": "percent and seconds must be numbers"}), 400
+        return jsonify(control), 202
+    
+    if request.method == 'DELETE':
+        control = profiler.stop()
+        if control is None:
+            return jsonify({"error": "no profile running"}), 404
+        return jsonify(control), 200
+    
+    profiler.flush()
+    profile_id, counts = profiler.collect(request.args.get('id'))
+    if profile_id is None:
+        return jsonify({"error": "no profile yet"}), 404
+    return Response(profiler.render(counts), mimetype='text/plain', headers={'X-Profile-Id': profile_id})
+
 # Home route
 @app.route('/')
 def home():
@@ -1926,28 +1114,10 @@ def home():
     })
 
 if __name__ == '__main__':
-    # Initialize database tables - but don't crash if it fails
-    print("🚀 Starting JOWA USSD Application...")
-    
-    # Try to initialize database, but continue even if it fails
-    try:
-        db_success = initialize_database()
-        if db_success:
-            print("✅ Database setup completed successfully")
-        else:
-            print("⚠️ Database setup had issues, but continuing...")
-    except Exception as e:
-        print(f"⚠️ Database initialization error: {e}")
-        print("🔄 Continuing with application startup...")
-    
+    # The schema is migrated at deploy time: python migrate.py
     # Run the application
     port = int(os.getenv('PORT', 5000))
-   
-    
-    print(f"🌐 Starting server on 0.0.0.0:{port}")
-    print(f"🔧 Debug mode: {DEBUG}")
-    print(f"🏭 Environment: {APP_ENV}")
-    print(f"📞 USSD Code: {USSD_CODE}")
+    log.info("server_starting", host='0.0.0.0', port=port, debug=DEBUG, environment=APP_ENV, ussd_code=USSD_CODE)
     
     app.run(host='0.0.0.0', port=port, debug=DEBUG, use_reloader=False)
     # For Render deployment
@@ -0,0 +1,33 @@
+# backfill_payment_rollup.py
+"""
+Rebuilds payment_daily_rollup from the payments table (see
+services/payment_rollup.py). Safe to run while the app is serving:
+completions wait for the rebuild to commit.
+
+    python backfill_payment_rollup.py
+"""
+import sys
+
+from services.db_pool import connect_from_env
+from services.payment_rollup import rebuild_rollup
+
+
+def main():
+    conn = connect_from_env()
+    cur = conn.cursor()
+    try:
+        rows = rebuild_rollup(cur)
+        conn.commit()
+        print(f"✅ payment_daily_rollup rebuilt: {rows} day/provider/purpose rows")
+        return 0
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Rollup backfill failed: {e}")
+        return 1
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
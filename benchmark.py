@@ -0,0 +1,178 @@
+# benchmark.py
+"""
+Micro-benchmarks of the USSD hot path against an in-memory fake database
+(services/microbench.py, tests/stand_in_database.py).
+
+    python benchmark.py                  # run and compare with benchmarks/baseline.json
+    python benchmark.py --save           # record a new baseline
+    python benchmark.py --queries-only   # only check query counts (any machine)
+
+Exits 1 when a case sends more queries per call than its baseline, or is
+more than --tolerance slower. Record the baseline on the machine that
+runs the comparison; query counts are the same everywhere.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Per-hop log lines would bury the report
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from services import loadtest, microbench, pagination  # noqa: E402
+from tests.stand_in_database import StandInDatabase  # noqa: E402
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+SEEKER = '+260971000001'
+EMPLOYER = '+260961000001'
+
+
+def load_module(package, name):
+    # models/*.py.py and utilis/*.py.py can't be imported by name
+    spec = importlib.util.spec_from_file_location(f"{package}_{name}",
+                                                  os.path.join(ROOT, package, f"{name}.py.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_formatters():
+    return load_module('utilis', 'formatters')
+
+
+def bench_database():
+    """A seeded stand-in installed as this process's pool, session store and (bypassed) job cache"""
+    from services.db_pool import ConnectionPool, set_pool
+    from services.job_cache import JobListingCache, set_job_cache
+    from services.session_store import DatabaseSessionStore, set_session_store
+
+    db = StandInDatabase()
+    cur = db.connect().cursor()
+    people = [{'phone_number': SEEKER, 'role': 'seeker'}]
+    people += [{'phone_number': f"+26096100{n:04d}", 'role': 'employer'} for n in range(1, 7)]
+    loadtest.seed(cur, people)
+
+    for job in db.jobs[:5]:
+        cur.execute("""
+            INSERT INTO applications (job_id, user_id, status)
+            SELECT %s, id, 'pending' FROM users WHERE phone_number = %s
+            ON CONFLICT (job_id, user_id) DO NOTHING
+        """, (job[0], SEEKER))
+    for n in range(5):
+        cur.execute("""
+            INSERT INTO payments (session_id, phone_number, amount, purpose, description, status)
+            VALUES (%s, %s, %s, %s, %s, 'initiated')
+            RETURNING id
+        """, (f"bench-pay-{n}", SEEKER, 10, 'Premium Job Posting', ''))
+
+    set_pool(ConnectionPool(connect=db.connect, max_size=2))
+    set_session_store(DatabaseSessionStore())
+    set_job_cache(JobListingCache())
+    return db
+
+
+def as_dicts(rows):
+    """What models/job.py.py's get_active_jobs built per row before its JobListing rows"""
+    return [
+        {
+            'id': row[0],
+            'title': row[1],
+            'location': row[2],
+            'payment_amount': row[3],
+            'payment_type': row[4],
+            'company_name': row[5],
+            'employer_phone': row[6]
+        }
+        for row in rows
+    ]
+
+
+def cases(db):
+    import app as jowa
+    from services.session_store import DatabaseSessionStore
+    from services.unit_of_work import UnitOfWork
+    from services.ussd_menu import Hop
+
+    def hop(phone_number, menu_level):
+        conn = UnitOfWork(db.connect(), 'bench-hop', phone_number, DatabaseSessionStore())
+        return Hop(jowa.USSD_MENU, 'bench-hop', phone_number, conn.cursor(), conn, menu_level, {})
+
+    def at_ussd(session_id, text, before=()):
+        def setup():
+            for earlier in before:
+                jowa.process_africas_talking_ussd(session_id, SEEKER, earlier)
+            return lambda: jowa.process_africas_talking_ussd(session_id, SEEKER, text)
+        return setup
+
+    formatters = load_formatters()
+    job_model = load_module('models', 'job')
+    application_model = load_module('models', 'application')
+    employer_model = load_module('models', 'employer')
+    now = datetime(2026, 1, 5, 9, 30)
+    jobs = [job_model.JobListing(n, f"Job {n}", 'Lusaka', 50 + n, 'daily', 'BuildRight Ltd', EMPLOYER)
+            for n in range(3)]
+    applications = [application_model.UserApplication(n, f"Job {n}", 'BuildRight Ltd', 'pending',
+                                                       now - timedelta(days=n)) for n in range(5)]
+    applicants = [application_model.JobApplicant(n, f"Job {n}", 'Mary Banda', SEEKER, 'pending',
+                                                 now - timedelta(days=n)) for n in range(5)]
+    employer_jobs = [employer_model.EmployerJob(n, f"Job {n}", 'active', n) for n in range(5)]
+    # A listing/export page as the cursor returns it, turned into rows the old way and the new
+    fetched = [(n, f"Job {n}", 'Lusaka', 50 + n, 'daily', 'BuildRight Ltd', EMPLOYER) for n in range(100)]
+
+    return [
+        microbench.Case('at_ussd.dial', at_ussd('bench-dial', '')),
+        microbench.Case('at_ussd.seeker_dashboard', at_ussd('bench-dash', '1')),
+        microbench.Case('at_ussd.browse_jobs', at_ussd('bench-browse', '1*1')),
+        microbench.Case('at_ussd.apply', at_ussd('bench-apply', '1*1*2', before=['1*1'])),
+        microbench.Case('at_ussd.view_applications', at_ussd('bench-apps', '1*2')),
+        microbench.Case('at_ussd.payment_history', at_ussd('bench-history', '3*1')),
+        microbench.Case('browse_jobs', lambda: lambda: jowa.browse_jobs(hop(SEEKER, 'browse_jobs'), {},
+                                                                        pagination.FIRST)),
+        microbench.Case('show_my_applications', lambda: lambda: jowa.show_my_applications(
+            hop(SEEKER, 'view_applications'), {}, pagination.FIRST)),
+        microbench.Case('payment_history', lambda: lambda: jowa.payment_history(
+            hop(SEEKER, 'payment_history'), {}, pagination.FIRST)),
+        microbench.Case('formatters.format_job_listing', lambda: lambda: formatters.format_job_listing(jobs)),
+        microbench.Case('formatters.format_application_list',
+                        lambda: lambda: formatters.format_application_list(applications)),
+        microbench.Case('formatters.format_employer_jobs',
+                        lambda: lambda: formatters.format_employer_jobs(employer_jobs)),
+        microbench.Case('formatters.format_job_applications',
+                        lambda: lambda: formatters.format_job_applications(applicants)),
+        microbench.Case('rows.dicts', lambda: lambda: as_dicts(fetched)),
+        microbench.Case('rows.namedtuples', lambda: lambda: list(map(job_model.JobListing._make, fetched))),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JOWA micro-benchmarks")
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--filter', default='', help="only cases whose name contains this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=microbench.DEFAULT_TOLERANCE)
+    parser.add_argument('--queries-only', action='store_true', help="don't compare timings")
+    args = parser.parse_args(argv)
+
+    db = bench_database()
+    selected = [case for case in cases(db) if args.filter in case.name]
+    results = microbench.run(selected, lambda: db.statements, repeat=args.repeat)
+    baseline = microbench.load_baseline(args.baseline)
+    print(microbench.format_results(results, baseline))
+
+    if args.save:
+        microbench.save_baseline(args.baseline, results)
+        print(f"\nBaseline written to {os.path.relpath(args.baseline)}")
+        return 0
+
+    findings = microbench.compare(results, baseline, tolerance=args.tolerance, timings=not args.queries_only)
+    if findings:
+        print('\n' + microbench.format_findings(findings))
+    return 1 if any(finding.kind != 'new' for finding in findings) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
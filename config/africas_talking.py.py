@@ -1,9 +1,13 @@
-import africastalking
 import os
 from dotenv import load_dotenv
 
+from services.clients import get_client
+from services.log import get_logger
+
 load_dotenv()
 
+log = get_logger(__name__)
+
 class AfricaTalkingConfig:
     def __init__(self):
         self.username = os.getenv('AT_USERNAME', 'sandbox')
@@ -12,14 +16,15 @@ class AfricaTalkingConfig:
 
     def initialize(self):
         try:
-            africastalking.initialize(self.username, self.api_key)
-            self.sms = africastalking.SMS
-            self.ussd = africastalking.USSD
+            # Shared with the app and workers; built once per process
+            sdk = get_client('africastalking')
+            self.sms = get_client('sms')
+            self.ussd = getattr(sdk, 'USSD', None)
             self.initialized = True
-            print("Africa's Talking initialized successfully")
+            log.info("africastalking_config_initialized", username=self.username)
             return True
         except Exception as e:
-            print(f"Africa's Talking initialization failed: {e}")
+            log.error("africastalking_config_init_failed", error=str(e))
             return False
 
     def get_sms_service(self):
@@ -0,0 +1,51 @@
+# Keeps the repository root importable for the tests under tests/
+import os
+
+import pytest
+
+from services import query_audit
+from services.job_cache import JobListingCache, set_job_cache
+from services.profile_cache import ProfileCache, set_profile_cache
+
+# As the test run was started, before importing the app loads .env: only
+# a database named here is used by the tests that need a real PostgreSQL
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+
+@pytest.fixture
+def postgres_url():
+    """DATABASE_URL of a migrated PostgreSQL the tests may write to (and roll back); skips without one"""
+    if not DATABASE_URL:
+        pytest.skip("needs DATABASE_URL")
+    return DATABASE_URL
+
+
+@pytest.fixture(autouse=True)
+def job_cache():
+    """A fresh, bypassed job listing cache with no LISTEN thread"""
+    cache = JobListingCache()
+    set_job_cache(cache)
+    yield cache
+    set_job_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def profile_cache():
+    """A fresh profile cache, so no test sees profiles another one looked up"""
+    cache = ProfileCache()
+    set_profile_cache(cache)
+    yield cache
+    set_profile_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def query_budget():
+    """Fail any test whose requests repeat a query or run over their query budget"""
+    mode = query_audit.get_mode()
+    query_audit.set_mode('strict')
+    query_audit.clear_violations()
+    yield
+    found = query_audit.violations()
+    query_audit.clear_violations()
+    query_audit.set_mode(mode)
+    assert not found, '\n'.join(query_audit.format_finding(finding) for finding in found)
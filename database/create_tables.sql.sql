@@ -1,59 +0,0 @@
--- JOWA Database Schema
-CREATE TABLE IF NOT EXISTS users (
-    id SERIAL PRIMARY KEY,
-    phone_number VARCHAR(20) UNIQUE NOT NULL,
-    full_name VARCHAR(100),
-    skills TEXT,
-    location VARCHAR(100),
-    experience_level VARCHAR(50),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS employers (
-    id SERIAL PRIMARY KEY,
-    phone_number VARCHAR(20) UNIQUE NOT NULL,
-    company_name VARCHAR(100),
-    business_type VARCHAR(100),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS jobs (
-    id SERIAL PRIMARY KEY,
-    employer_id INTEGER REFERENCES employers(id),
-    title VARCHAR(200) NOT NULL,
-    description TEXT,
-    category VARCHAR(100),
-    location VARCHAR(100),
-    payment_amount DECIMAL(10,2),
-    payment_type VARCHAR(50),
-    status VARCHAR(20) DEFAULT 'active',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
-CREATE TABLE IF NOT EXISTS applications (
-    id SERIAL PRIMARY KEY,
-    job_id INTEGER REFERENCES jobs(id),
-    user_id INTEGER REFERENCES users(id),
-    status VARCHAR(20) DEFAULT 'pending',
-    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(job_id, user_id)
-);
-
-CREATE TABLE IF NOT EXISTS ussd_sessions (
-    session_id VARCHAR(100) PRIMARY KEY,
-    phone_number VARCHAR(20) NOT NULL,
-    menu_level VARCHAR(50),
-    data JSONB,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-
--- Indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone_number);
-CREATE INDEX IF NOT EXISTS idx_employers_phone ON employers(phone_number);
-CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
-CREATE INDEX IF NOT EXISTS idx_jobs_employer ON jobs(employer_id);
-CREATE INDEX IF NOT EXISTS idx_applications_user ON applications(user_id);
-CREATE INDEX IF NOT EXISTS idx_applications_job ON applications(job_id);
-CREATE INDEX IF NOT EXISTS idx_ussd_sessions_phone ON ussd_sessions(phone_number);
-CREATE INDEX IF NOT EXISTS idx_ussd_sessions_updated ON ussd_sessions(updated_at);
\ No newline at end of file
@@ -0,0 +1,35 @@
+# gunicorn.conf.py - picked up automatically by `gunicorn app:app`
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# More than one thread makes these gthread workers: several requests in flight per
+# worker, so /payment-webhook callbacks arriving together share a batch
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Each worker sizes its pool as DB_MAX_CONNECTIONS // WEB_CONCURRENCY
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))
+
+# Workers publish their metrics here so /metrics can add them up
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='jowa-metrics-'))
+# /admin/profile reaches one worker; they all read its control file and write their samples here
+os.environ.setdefault('PROFILE_DIR', tempfile.mkdtemp(prefix='jowa-profiles-'))
+
+
+def on_starting(server):
+    # Counts left over from a previous run would never go away
+    from services.metrics import clear_dir
+    clear_dir()
+
+
+def post_fork(server, worker):
+    # Never share the master's database sockets with a worker
+    from services.db_pool import reset_pool
+    reset_pool()
+
+
+def child_exit(server, worker):
+    # Its request counts stay in the totals; its gauges no longer describe anything
+    from services.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -145,7 +145,9 @@ def init_postgresql_database():
             "CREATE INDEX IF NOT EXISTS idx_applications_user ON applications(user_id);",
             "CREATE INDEX IF NOT EXISTS idx_applications_job ON applications(job_id);",
             "CREATE INDEX IF NOT EXISTS idx_ussd_sessions_phone ON ussd_sessions(phone_number);",
-            "CREATE INDEX IF NOT EXISTS idx_ussd_sessions_updated ON ussd_sessions(updated_at);"
+            "CREATE INDEX IF NOT EXISTS idx_ussd_sessions_updated ON ussd_sessions(updated_at);",
+            "CREATE INDEX IF NOT EXISTS idx_jobs_active_created ON jobs(created_at DESC, id DESC) WHERE status = 'active';",
+            "CREATE INDEX IF NOT EXISTS idx_applications_user_applied ON applications(user_id, applied_at DESC, id DESC);"
         ]
         
         print("Creating indexes...")
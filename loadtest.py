@@ -0,0 +1,103 @@
+# loadtest.py
+"""
+Generates USSD session scripts and replays them through the app
+(see services/loadtest.py).
+
+    python loadtest.py generate --sessions 2000 --seed 7 > sessions.jsonl
+    python loadtest.py run sessions.jsonl --concurrency 20
+    python loadtest.py run sessions.jsonl --database-url postgresql://localhost/jowa_load
+
+Without --database-url the app talks to the in-memory stand-in
+(tests/stand_in_database.py); with it, to a real (migrated, disposable)
+PostgreSQL database, which is seeded with the users, employers and jobs
+the scripts expect.
+"""
+import argparse
+import json
+import os
+import sys
+
+# Per-hop log lines would bury the report
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from services import loadtest  # noqa: E402
+
+
+def generate(args):
+    sessions = loadtest.generate_sessions(args.sessions, seed=args.seed, mix=loadtest.parse_mix(args.mix),
+                                          endpoints=args.endpoints.split(','))
+    if args.out:
+        loadtest.write_sessions(args.out, sessions)
+    else:
+        for session in sessions:
+            sys.stdout.write(json.dumps(session) + '\n')
+    return 0
+
+
+def run(args):
+    sessions = loadtest.read_sessions(args.sessions)
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+        from services.db_pool import connect_from_env
+        conn = connect_from_env()
+    else:
+        from services.db_pool import ConnectionPool, get_pool_config, set_pool
+        from services.job_cache import JobListingCache, set_job_cache
+        from tests.stand_in_database import StandInDatabase
+        db = StandInDatabase(latency=args.db_latency)
+        config = get_pool_config()
+        set_pool(ConnectionPool(connect=db.connect, max_size=args.pool_size or config['max_size'],
+                                prepared_statements=config['prepared_statements']))
+        # No LISTEN connection to keep the listing cache honest, so don't cache
+        set_job_cache(JobListingCache())
+        conn = db.connect()
+
+    cur = conn.cursor()
+    try:
+        loadtest.seed(cur, sessions)
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    import app
+
+    results, elapsed = loadtest.replay(app.app, sessions, concurrency=args.concurrency)
+    summary = loadtest.summarize(results, sessions, elapsed)
+    print(loadtest.format_report(summary))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    return 1 if args.max_error_rate is not None and summary['overall']['error_rate'] > args.max_error_rate else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JOWA USSD load test")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help="write session scripts as JSONL")
+    gen.add_argument('--sessions', type=int, default=1000)
+    gen.add_argument('--seed', type=int, default=0)
+    gen.add_argument('--mix', help="flow weights, e.g. browse_apply=3,payment=1 (default: a typical day)")
+    gen.add_argument('--endpoints', default=','.join(loadtest.ENDPOINTS))
+    gen.add_argument('--out', help="file to write (default: stdout)")
+    gen.set_defaults(handler=generate)
+
+    replay = commands.add_parser('run', help="replay session scripts and report latency")
+    replay.add_argument('sessions', help="JSONL file from 'generate'")
+    replay.add_argument('--concurrency', type=int, default=10)
+    replay.add_argument('--database-url', help="PostgreSQL to run against (default: in-memory stand-in)")
+    replay.add_argument('--db-latency', type=float, default=0.0, help="stand-in seconds per query")
+    replay.add_argument('--pool-size', type=int, help="stand-in pool size (default: DB_POOL_MAX)")
+    replay.add_argument('--json', help="also write the report here")
+    replay.add_argument('--max-error-rate', type=float, help="exit 1 above this share of failed hops")
+    replay.set_defaults(handler=run)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
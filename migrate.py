@@ -0,0 +1,51 @@
+# migrate.py
+"""
+Brings the database schema up to date (see services/migrations.py).
+Run at deploy time, before the new code starts serving.
+
+    python migrate.py                 # apply all pending migrations
+    python migrate.py --to 1          # apply up to version 1
+    python migrate.py status          # list applied / pending migrations
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+from services.db_pool import connect_from_env
+from services.migrations import MigrationError, migrate, status
+
+load_dotenv()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JOWA schema migrations")
+    parser.add_argument('command', nargs='?', choices=['up', 'status'], default='up')
+    parser.add_argument('--to', type=int, dest='target', help="stop after this version")
+    args = parser.parse_args(argv)
+
+    conn = connect_from_env()
+    try:
+        if args.command == 'status':
+            for migration, state in status(conn):
+                print(f"{migration.version:04d}  {state:8}  {migration.name}")
+            return 0
+
+        applied = migrate(conn, target=args.target)
+        if applied:
+            print(f"✅ Applied {len(applied)} migration(s)")
+        else:
+            print("✅ Schema is up to date")
+        return 0
+    except MigrationError as e:
+        print(f"❌ {e}")
+        return 1
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
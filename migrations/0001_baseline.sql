@@ -0,0 +1,145 @@
+-- 0001_baseline.sql
+-- The schema app.py used to create at startup, as of the move to
+-- migrations. Everything is IF NOT EXISTS so databases created by the
+-- old startup code adopt it unchanged.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    phone_number VARCHAR(20) UNIQUE NOT NULL,
+    full_name VARCHAR(100),
+    skills TEXT,
+    location VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS employers (
+    id SERIAL PRIMARY KEY,
+    phone_number VARCHAR(20) UNIQUE NOT NULL,
+    company_name VARCHAR(100),
+    business_type VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    employer_id INTEGER REFERENCES employers(id),
+    title VARCHAR(100) NOT NULL,
+    description TEXT,
+    location VARCHAR(100),
+    payment_amount DECIMAL(10,2),
+    payment_type VARCHAR(20),
+    status VARCHAR(20) DEFAULT 'active',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS applications (
+    id SERIAL PRIMARY KEY,
+    job_id INTEGER REFERENCES jobs(id),
+    user_id INTEGER REFERENCES users(id),
+    status VARCHAR(20) DEFAULT 'pending',
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(job_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS ussd_sessions (
+    session_id VARCHAR(100) PRIMARY KEY,
+    phone_number VARCHAR(20) NOT NULL,
+    menu_level VARCHAR(50),
+    data JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Payments
+CREATE TABLE IF NOT EXISTS payments (
+    id SERIAL PRIMARY KEY,
+    session_id VARCHAR(100),
+    phone_number VARCHAR(20) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    currency VARCHAR(10) DEFAULT 'ZMW',
+    payment_method VARCHAR(50),
+    provider VARCHAR(50),
+    transaction_id VARCHAR(100),
+    status VARCHAR(20) DEFAULT 'pending',
+    purpose VARCHAR(100),
+    description TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Queue columns used by the payment workers (payment_worker.py)
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS next_poll_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS last_error TEXT;
+
+-- Webhooks look payments up by the provider's reference
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_transaction_id
+    ON payments (transaction_id) WHERE transaction_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_payments_in_flight
+    ON payments (provider, status, next_poll_at) WHERE status IN ('queued', 'processing');
+
+CREATE TABLE IF NOT EXISTS payment_sessions (
+    session_id VARCHAR(100) PRIMARY KEY,
+    phone_number VARCHAR(20) NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    currency VARCHAR(10) DEFAULT 'ZMW',
+    payment_method VARCHAR(50),
+    provider VARCHAR(50),
+    purpose VARCHAR(100),
+    data JSONB,
+    status VARCHAR(20) DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Idempotency log for /payment-webhook (services/payment_webhooks.py)
+CREATE TABLE IF NOT EXISTS payment_webhook_events (
+    idempotency_key VARCHAR(200) PRIMARY KEY,
+    transaction_id VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    outcome VARCHAR(20) NOT NULL,
+    payload JSONB,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_payment_webhook_events_transaction
+    ON payment_webhook_events (transaction_id, received_at);
+
+-- Dashboard totals (services/payment_rollup.py)
+CREATE TABLE IF NOT EXISTS payment_daily_rollup (
+    day DATE NOT NULL,
+    provider VARCHAR(20) NOT NULL DEFAULT '',
+    purpose VARCHAR(100) NOT NULL DEFAULT '',
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    completed_amount DECIMAL(12,2) NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, provider, purpose)
+);
+
+-- Composite indexes for the keyset-paged USSD listings (services/pagination.py)
+CREATE INDEX IF NOT EXISTS idx_jobs_active_created
+    ON jobs (created_at DESC, id DESC) WHERE status = 'active';
+CREATE INDEX IF NOT EXISTS idx_applications_user_applied
+    ON applications (user_id, applied_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_payments_phone_created
+    ON payments (phone_number, created_at DESC, id DESC);
+
+-- SMS outbox drained by sms_worker.py
+CREATE TABLE IF NOT EXISTS sms_outbox (
+    id SERIAL PRIMARY KEY,
+    phone_number VARCHAR(20) NOT NULL,
+    message TEXT NOT NULL,
+    digest_key VARCHAR(50),
+    status VARCHAR(20) DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_sms_outbox_due
+    ON sms_outbox (next_attempt_at, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_sms_outbox_digest
+    ON sms_outbox (phone_number, digest_key) WHERE status = 'pending' AND digest_key IS NOT NULL;
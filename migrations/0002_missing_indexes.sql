@@ -0,0 +1,17 @@
+-- 0002_missing_indexes.sql
+-- Indexes the hot queries need but production never had. users,
+-- employers and ussd_sessions are already covered by their UNIQUE and
+-- PRIMARY KEY constraints, and applications (job_id) by
+-- UNIQUE (job_id, user_id).
+
+-- Employer dashboard: "My Jobs" (ORDER BY created_at DESC LIMIT 5)
+CREATE INDEX IF NOT EXISTS idx_jobs_employer_created
+    ON jobs (employer_id, created_at DESC);
+
+-- Employer dashboard: latest applications across the employer's jobs
+CREATE INDEX IF NOT EXISTS idx_applications_job_applied
+    ON applications (job_id, applied_at DESC);
+
+-- Confirming / cancelling a USSD payment finds it by session
+CREATE INDEX IF NOT EXISTS idx_payments_session
+    ON payments (session_id) WHERE session_id IS NOT NULL;
@@ -0,0 +1,7 @@
+-- 0003_payment_submitting.sql
+-- Payment workers now claim payments as 'submitting' before calling the
+-- provider (services/payments.py), and look for ones whose claim ran out.
+
+DROP INDEX IF EXISTS idx_payments_in_flight;
+CREATE INDEX IF NOT EXISTS idx_payments_in_flight
+    ON payments (provider, status, next_poll_at) WHERE status IN ('queued', 'submitting', 'processing');
@@ -1,3 +1,14 @@
+from collections import namedtuple
+
+from services.log import get_logger
+
+log = get_logger('models.application')
+
+ApplicationRecord = namedtuple('ApplicationRecord', ['id', 'job_id', 'user_id', 'status', 'applied_at'])
+UserApplication = namedtuple('UserApplication', ['id', 'job_title', 'company_name', 'status', 'applied_at'])
+JobApplicant = namedtuple('JobApplicant', ['id', 'job_title', 'applicant_name', 'applicant_phone', 'status', 'applied_at'])
+
+
 class Application:
     def __init__(self, db_connection):
         self.conn = db_connection
@@ -15,18 +26,32 @@ class Application:
             application = cur.fetchone()
             self.conn.commit()
             
-            if application:
-                return {
-                    'id': application[0],
-                    'job_id': application[1],
-                    'user_id': application[2],
-                    'status': application[3],
-                    'applied_at': application[4]
-                }
+            return ApplicationRecord._make(application) if application else None
+        except Exception:
+            self.conn.rollback()
+            log.exception("create_application_failed")
             return None
-        except Exception as e:
+        finally:
+            cur.close()
+
+    def apply(self, job_id, phone_number):
+        """Apply phone_number's user to job_id in one statement; None if already applied"""
+        cur = self.conn.cursor()
+        try:
+            cur.execute("""
+                INSERT INTO applications (job_id, user_id, status)
+                SELECT %s, id, 'pending' FROM users WHERE phone_number = %s
+                ON CONFLICT (job_id, user_id) DO NOTHING
+                RETURNING id, job_id, user_id, status, applied_at
+            """, (job_id, phone_number))
+            
+            application = cur.fetchone()
+            self.conn.commit()
+            
+            return ApplicationRecord._make(application) if application else None
+        except Exception:
             self.conn.rollback()
-            print(f"Error creating application: {e}")
+            log.exception("create_application_failed")
             return None
         finally:
             cur.close()
@@ -44,19 +69,9 @@ class Application:
                 LIMIT %s OFFSET %s
             """, (user_id, limit, offset))
             
-            applications = cur.fetchall()
-            return [
-                {
-                    'id': app[0],
-                    'job_title': app[1],
-                    'company_name': app[2],
-                    'status': app[3],
-                    'applied_at': app[4]
-                }
-                for app in applications
-            ]
-        except Exception as e:
-            print(f"Error getting user applications: {e}")
+            return list(map(UserApplication._make, cur.fetchall()))
+        except Exception:
+            log.exception("get_user_applications_failed")
             return []
         finally:
             cur.close()
@@ -65,26 +80,17 @@ class Application:
         cur = self.conn.cursor()
         try:
             cur.execute("""
-                SELECT a.id, u.full_name, u.phone_number, a.status, a.applied_at
+                SELECT a.id, j.title, u.full_name, u.phone_number, a.status, a.applied_at
                 FROM applications a
+                JOIN jobs j ON a.job_id = j.id
                 JOIN users u ON a.user_id = u.id
                 WHERE a.job_id = %s
                 ORDER BY a.applied_at DESC
             """, (job_id,))
             
-            applications = cur.fetchall()
-            return [
-                {
-                    'id': app[0],
-                    'applicant_name': app[1],
-                    'applicant_phone': app[2],
-                    'status': app[3],
-                    'applied_at': app[4]
-                }
-                for app in applications
-            ]
-        except Exception as e:
-            print(f"Error getting job applications: {e}")
+            return list(map(JobApplicant._make, cur.fetchall()))
+        except Exception:
+            log.exception("get_job_applications_failed")
             return []
         finally:
             cur.close()
\ No newline at end of file
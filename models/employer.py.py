@@ -1,3 +1,15 @@
+from collections import namedtuple
+
+from services.log import get_logger
+
+log = get_logger('models.employer')
+
+EmployerRecord = namedtuple('EmployerRecord', ['id', 'phone_number', 'company_name', 'business_type'])
+EmployerProfile = namedtuple('EmployerProfile', ['id', 'phone_number', 'company_name', 'business_type',
+                                                 'created_at'])
+EmployerJob = namedtuple('EmployerJob', ['id', 'title', 'status', 'application_count'])
+
+
 class Employer:
     def __init__(self, db_connection):
         self.conn = db_connection
@@ -17,17 +29,10 @@ class Employer:
             employer = cur.fetchone()
             self.conn.commit()
             
-            if employer:
-                return {
-                    'id': employer[0],
-                    'phone_number': employer[1],
-                    'company_name': employer[2],
-                    'business_type': employer[3]
-                }
-            return None
-        except Exception as e:
+            return EmployerRecord._make(employer) if employer else None
+        except Exception:
             self.conn.rollback()
-            print(f"Error creating employer: {e}")
+            log.exception("create_employer_failed")
             return None
         finally:
             cur.close()
@@ -41,17 +46,9 @@ class Employer:
             """, (phone_number,))
             
             employer = cur.fetchone()
-            if employer:
-                return {
-                    'id': employer[0],
-                    'phone_number': employer[1],
-                    'company_name': employer[2],
-                    'business_type': employer[3],
-                    'created_at': employer[4]
-                }
-            return None
-        except Exception as e:
-            print(f"Error getting employer: {e}")
+            return EmployerProfile._make(employer) if employer else None
+        except Exception:
+            log.exception("get_employer_failed")
             return None
         finally:
             cur.close()
@@ -69,18 +66,9 @@ class Employer:
                 LIMIT 10
             """, (employer_id,))
             
-            jobs = cur.fetchall()
-            return [
-                {
-                    'id': job[0],
-                    'title': job[1],
-                    'status': job[2],
-                    'application_count': job[3]
-                }
-                for job in jobs
-            ]
-        except Exception as e:
-            print(f"Error getting employer jobs: {e}")
+            return list(map(EmployerJob._make, cur.fetchall()))
+        except Exception:
+            log.exception("get_employer_jobs_failed")
             return []
         finally:
             cur.close()
\ No newline at end of file
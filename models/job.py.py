@@ -1,3 +1,19 @@
+from collections import namedtuple
+
+from services.job_cache import notify_jobs_changed
+from services.log import get_logger
+
+log = get_logger('models.job')
+
+# Rows are namedtuples over the cursor's own tuples: no per-row dict
+NewJob = namedtuple('NewJob', ['id', 'employer_id', 'title', 'description', 'location', 'payment_amount',
+                               'payment_type', 'status'])
+JobListing = namedtuple('JobListing', ['id', 'title', 'location', 'payment_amount', 'payment_type',
+                                       'company_name', 'employer_phone'])
+JobDetail = namedtuple('JobDetail', ['id', 'title', 'description', 'location', 'payment_amount', 'payment_type',
+                                     'company_name', 'employer_phone'])
+
+
 class Job:
     def __init__(self, db_connection):
         self.conn = db_connection
@@ -12,27 +28,38 @@ class Job:
             """, (employer_id, title, description, location, payment_amount, payment_type))
             
             job = cur.fetchone()
+            notify_jobs_changed(cur)
             self.conn.commit()
             
-            if job:
-                return {
-                    'id': job[0],
-                    'employer_id': job[1],
-                    'title': job[2],
-                    'description': job[3],
-                    'location': job[4],
-                    'payment_amount': job[5],
-                    'payment_type': job[6],
-                    'status': job[7]
-                }
-            return None
-        except Exception as e:
+            return NewJob._make(job) if job else None
+        except Exception:
             self.conn.rollback()
-            print(f"Error creating job: {e}")
+            log.exception("create_job_failed")
             return None
         finally:
             cur.close()
 
+    def set_status(self, job_id, status):
+        """Open or close a job; cached listings are dropped on commit"""
+        cur = self.conn.cursor()
+        try:
+            cur.execute("""
+                UPDATE jobs SET status = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status IS DISTINCT FROM %s
+            """, (status, job_id, status))
+            
+            changed = cur.rowcount > 0
+            if changed:
+                notify_jobs_changed(cur)
+            self.conn.commit()
+            return changed
+        except Exception:
+            self.conn.rollback()
+            log.exception("update_job_status_failed")
+            return False
+        finally:
+            cur.close()
+
     def get_active_jobs(self, limit=10, offset=0):
         cur = self.conn.cursor()
         try:
@@ -46,21 +73,9 @@ class Job:
                 LIMIT %s OFFSET %s
             """, (limit, offset))
             
-            jobs = cur.fetchall()
-            return [
-                {
-                    'id': job[0],
-                    'title': job[1],
-                    'location': job[2],
-                    'payment_amount': job[3],
-                    'payment_type': job[4],
-                    'company_name': job[5],
-                    'employer_phone': job[6]
-                }
-                for job in jobs
-            ]
-        except Exception as e:
-            print(f"Error getting active jobs: {e}")
+            return list(map(JobListing._make, cur.fetchall()))
+        except Exception:
+            log.exception("get_active_jobs_failed")
             return []
         finally:
             cur.close()
@@ -77,20 +92,9 @@ class Job:
             """, (job_id,))
             
             job = cur.fetchone()
-            if job:
-                return {
-                    'id': job[0],
-                    'title': job[1],
-                    'description': job[2],
-                    'location': job[3],
-                    'payment_amount': job[4],
-                    'payment_type': job[5],
-                    'company_name': job[6],
-                    'employer_phone': job[7]
-                }
-            return None
-        except Exception as e:
-            print(f"Error getting job: {e}")
+            return JobDetail._make(job) if job else None
+        except Exception:
+            log.exception("get_job_failed")
             return None
         finally:
             cur.close()
\ No newline at end of file
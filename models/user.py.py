@@ -1,3 +1,13 @@
+from collections import namedtuple
+
+from services.log import get_logger
+
+log = get_logger('models.user')
+
+UserRecord = namedtuple('UserRecord', ['id', 'phone_number', 'full_name', 'skills', 'location'])
+UserProfile = namedtuple('UserProfile', ['id', 'phone_number', 'full_name', 'skills', 'location', 'created_at'])
+
+
 class User:
     def __init__(self, db_connection):
         self.conn = db_connection
@@ -18,18 +28,10 @@ class User:
             user = cur.fetchone()
             self.conn.commit()
             
-            if user:
-                return {
-                    'id': user[0],
-                    'phone_number': user[1],
-                    'full_name': user[2],
-                    'skills': user[3],
-                    'location': user[4]
-                }
-            return None
-        except Exception as e:
+            return UserRecord._make(user) if user else None
+        except Exception:
             self.conn.rollback()
-            print(f"Error creating user: {e}")
+            log.exception("create_user_failed")
             return None
         finally:
             cur.close()
@@ -43,18 +45,9 @@ class User:
             """, (phone_number,))
             
             user = cur.fetchone()
-            if user:
-                return {
-                    'id': user[0],
-                    'phone_number': user[1],
-                    'full_name': user[2],
-                    'skills': user[3],
-                    'location': user[4],
-                    'created_at': user[5]
-                }
-            return None
-        except Exception as e:
-            print(f"Error getting user: {e}")
+            return UserProfile._make(user) if user else None
+        except Exception:
+            log.exception("get_user_failed")
             return None
         finally:
             cur.close()
@@ -72,18 +65,10 @@ class User:
             user = cur.fetchone()
             self.conn.commit()
             
-            if user:
-                return {
-                    'id': user[0],
-                    'phone_number': user[1],
-                    'full_name': user[2],
-                    'skills': user[3],
-                    'location': user[4]
-                }
-            return None
-        except Exception as e:
+            return UserRecord._make(user) if user else None
+        except Exception:
             self.conn.rollback()
-            print(f"Error updating user: {e}")
+            log.exception("update_user_failed")
             return None
         finally:
             cur.close()
\ No newline at end of file
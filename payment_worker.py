@@ -0,0 +1,59 @@
+# payment_worker.py
+"""
+Runs the mobile-money payment workers (see services/payments.py).
+
+    python payment_worker.py              # one worker per provider in PAYMENT_CONFIG
+    python payment_worker.py mtn airtel   # only these providers
+"""
+import signal
+import sys
+import threading
+
+from dotenv import load_dotenv
+
+from services import metrics
+from services.db_pool import get_pool
+from services.log import get_logger
+from services.payment_providers import get_provider
+from services.payments import PAYMENT_CONFIG, PaymentWorker
+
+load_dotenv()
+
+log = get_logger('payment_worker')
+
+
+def main(providers):
+    workers = [
+        PaymentWorker(lambda: get_pool().getconn(), provider, get_provider(provider))
+        for provider in providers
+    ]
+
+    def shutdown(signum, frame):
+        log.info("payment_workers_stopping")
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    threads = [
+        threading.Thread(target=worker.run_forever, name=f"payments-{worker.provider}")
+        for worker in workers
+    ]
+    for thread in threads:
+        thread.start()
+    metrics.start()
+    log.info("payment_workers_started", providers=providers)
+
+    for thread in threads:
+        thread.join()
+    for worker in workers:
+        log.info("payment_worker_stopped", provider=worker.provider, **worker.stats)
+
+
+if __name__ == '__main__':
+    requested = sys.argv[1:] or PAYMENT_CONFIG['mobile_money_providers']
+    unknown = set(requested) - set(PAYMENT_CONFIG['mobile_money_providers'])
+    if unknown:
+        sys.exit(f"Unknown provider(s): {', '.join(sorted(unknown))}")
+    main(requested)
@@ -0,0 +1,84 @@
+# services/clients.py
+"""
+Process-wide registry of clients for external services.
+
+Nothing is built at import time. get_client(name) constructs the client
+with the factory registered for name the first time it is asked for,
+then hands the same instance to every caller in the process.
+
+The cache remembers which process filled it: after a fork (gunicorn
+workers, multiprocessing) the child starts empty and builds its own
+clients, so sockets and locks are never shared with the parent.
+
+Registered here:
+
+    africastalking   the SDK module, initialized with AT_USERNAME / AT_API_KEY
+    sms              africastalking.SMS (services/sms_service.py)
+    payment:<name>   mobile-money provider clients (services/payment_providers.py)
+"""
+import os
+import threading
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+_factories = {}
+_clients = {}
+_pid = None
+# Re-entrant: the sms factory asks for the africastalking client
+_lock = threading.RLock()
+
+
+def register_client(name, factory):
+    """Build name with factory() from now on, replacing any client already built"""
+    with _lock:
+        _factories[name] = factory
+        _clients.pop(name, None)
+
+
+def get_client(name, default_factory=None):
+    """
+    The process's client for name, built on first use.
+
+    default_factory is used when nothing is registered for name. A
+    factory that raises leaves nothing cached, so the next call retries.
+    """
+    global _pid
+
+    if _pid != os.getpid():
+        with _lock:
+            if _pid != os.getpid():
+                _clients.clear()
+                _pid = os.getpid()
+
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _lock:
+        if name not in _clients:
+            factory = _factories.get(name, default_factory)
+            if factory is None:
+                raise KeyError(f"No client registered for {name!r}")
+            _clients[name] = factory()
+        return _clients[name]
+
+
+def reset_clients():
+    """Drop every built client (tests, credential rotation)"""
+    with _lock:
+        _clients.clear()
+
+
+def _africastalking():
+    import africastalking
+
+    username = os.getenv('AT_USERNAME', 'sandbox')
+    africastalking.initialize(username, os.getenv('AT_API_KEY', ''))
+    log.info("africastalking_initialized", username=username)
+    return africastalking
+
+
+register_client('africastalking', _africastalking)
+register_client('sms', lambda: get_client('africastalking').SMS)
@@ -1,8 +1,11 @@
 # services/database_service.py
-import psycopg2
 import os
 from dotenv import load_dotenv
 from urllib.parse import urlparse
+from services.db_pool import get_pool, pool_stats
+from services.log import get_logger
+
+log = get_logger(__name__)
 
 load_dotenv()
 
@@ -26,7 +29,7 @@ class DatabaseService:
                     'sslmode': 'require'  # Render requires SSL
                 }
             except Exception as e:
-                print(f"Error parsing DATABASE_URL: {e}")
+                log.error("database_url_invalid", error=str(e))
         
         # Fallback for local development
         return {
@@ -39,11 +42,11 @@ class DatabaseService:
         }
 
     def get_connection(self):
+        # Shared with app.py - close() returns the connection to the pool
         try:
-            conn = psycopg2.connect(**self.config)
-            return conn
-        except Exception as e:
-            print(f"Database connection error: {e}")
+            return get_pool().getconn()
+        except Exception:
+            log.exception("database_connection_failed")
             return None
 
     def health_check(self):
@@ -57,5 +60,8 @@ class DatabaseService:
                 return True
             return False
         except Exception as e:
-            print(f"Health check failed: {e}")
-            return False
\ No newline at end of file
+            log.warning("database_health_check_failed", error=str(e))
+            return False
+
+    def pool_stats(self):
+        return pool_stats()
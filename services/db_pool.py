@@ -0,0 +1,404 @@
+# services/db_pool.py
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+from services import metrics
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_worker_count():
+    """
+    Number of gunicorn workers sharing the database budget on this host
+    """
+    return max(1, _env_int('WEB_CONCURRENCY', 1))
+
+
+def get_pool_config():
+    """
+    Pool sizing from the environment.
+
+    DB_POOL_MIN / DB_POOL_MAX size the pool of a single process. When
+    DB_MAX_CONNECTIONS is set it is the budget for the whole host, and it is
+    split across the WEB_CONCURRENCY gunicorn workers so that every worker
+    filling its pool can't exhaust the server's connection slots.
+    DB_PREPARED_STATEMENTS=True makes the pool's connections keep
+    server-side prepared statements (services/repository.py). It is off
+    by default, and must stay off behind a transaction-mode PgBouncer.
+    """
+    max_size = _env_int('DB_POOL_MAX', 10)
+    total_budget = _env_int('DB_MAX_CONNECTIONS', 0)
+    if total_budget > 0:
+        max_size = min(max_size, max(1, total_budget // get_worker_count()))
+
+    min_size = min(_env_int('DB_POOL_MIN', 1), max_size)
+
+    return {
+        'min_size': max(0, min_size),
+        'max_size': max_size,
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+        'ping_interval': float(os.getenv('DB_POOL_PING_INTERVAL', '30')),
+        'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        'prepared_statements': os.getenv('DB_PREPARED_STATEMENTS', 'False').lower() == 'true',
+    }
+
+
+def connect_from_env():
+    """
+    Open one physical connection using DATABASE_URL (Render) or the local DB_* settings
+    """
+    database_url = os.getenv('DATABASE_URL')
+
+    if database_url:
+        # For Render PostgreSQL - fix the URL format if needed
+        if database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+        if '//' in database_url:
+            host_part = database_url.split('//')[1].split('@')[-1].split('/')[0]
+            log.info("db_connect", host=host_part)
+
+        return psycopg2.connect(database_url)
+
+    # Fallback for local development
+    log.info("db_connect", host=os.getenv('DB_HOST', 'localhost'))
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'jowa'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        port=os.getenv('DB_PORT', '5432')
+    )
+
+
+class _Slot:
+    __slots__ = ('raw', 'created_at', 'last_used', 'prepared')
+
+    def __init__(self, raw, prepared_statements=False):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Names of the statements PREPAREd on this connection (services/repository.py)
+        self.prepared = set() if prepared_statements else None
+
+
+class PooledConnection:
+    """
+    Checked-out connection. Behaves like the psycopg2 connection it wraps,
+    except that close() hands it back to the pool instead of disconnecting.
+    """
+
+    def __init__(self, pool, slot):
+        self._pool = pool
+        self._slot = slot
+
+    @property
+    def raw(self):
+        return self._slot.raw if self._slot else None
+
+    def __getattr__(self, name):
+        if self._slot is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._slot.raw, name)
+
+    def cursor(self, *args, **kwargs):
+        # Timed and counted per request for /metrics
+        cur = metrics.TimedCursor(self.__getattr__('cursor')(*args, **kwargs))
+        if self._slot.prepared is not None:
+            cur.prepared = self._slot.prepared
+        return cur
+
+    def close(self):
+        if self._slot is not None:
+            slot, self._slot = self._slot, None
+            self._pool.putconn(slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+
+    Connections are opened lazily up to max_size and kept idle afterwards.
+    On checkout, a connection that has been idle for longer than
+    ping_interval is probed with SELECT 1; closed, failing or over-age
+    connections are recycled and replaced with a fresh one. With
+    prepared_statements, cursors carry the set of statements their
+    connection has PREPAREd, which services/repository.py uses.
+    """
+
+    def __init__(self, connect=connect_from_env, min_size=1, max_size=10,
+                 timeout=5.0, ping_interval=30.0, max_lifetime=1800.0, prepared_statements=False):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self._connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.max_lifetime = max_lifetime
+        self.prepared_statements = prepared_statements
+        self.pid = os.getpid()
+
+        self._idle = deque()
+        self._size = 0
+        self._lock = threading.Condition()
+        self._closed = False
+        self._counters = {
+            'checkouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def prefill(self):
+        """Open min_size connections up front (best effort)"""
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                slot = self._open()
+            except Exception as e:
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+                log.warning("db_pool_prefill_failed", error=str(e))
+                return
+            with self._lock:
+                self._idle.append(slot)
+                self._lock.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            slot = self._acquire_slot(deadline)
+
+            if slot is None:
+                # We reserved room for a new connection
+                try:
+                    slot = self._open()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._healthy(slot):
+                self._discard(slot)
+                continue
+
+            with self._lock:
+                self._counters['checkouts'] += 1
+            return PooledConnection(self, slot)
+
+    def putconn(self, slot):
+        raw = slot.raw
+        try:
+            if raw.closed:
+                raise psycopg2.InterfaceError("connection closed")
+            status = raw.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                raise psycopg2.InterfaceError("connection lost")
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                # Never hand the next caller someone else's open transaction
+                raw.rollback()
+        except Exception:
+            self._discard(slot)
+            return
+
+        if self._closed or time.monotonic() - slot.created_at > self.max_lifetime:
+            self._discard(slot)
+            return
+
+        slot.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(slot)
+            self._lock.notify()
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+        for slot in idle:
+            self._discard(slot)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+            return dict(
+                self._counters,
+                pid=self.pid,
+                size=self._size,
+                idle=idle,
+                in_use=self._size - idle,
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+
+    # Internal helpers
+
+    def _acquire_slot(self, deadline):
+        """
+        Return an idle slot, or None once room for a new connection has been
+        reserved. Blocks while the pool is exhausted.
+        """
+        with self._lock:
+            waited = False
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                if self._idle:
+                    # LIFO keeps the hottest connections busy and lets the rest age out
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"no database connection available within {self.timeout}s "
+                        f"(pool max_size={self.max_size})"
+                    )
+                if not waited:
+                    self._counters['waits'] += 1
+                    waited = True
+                self._lock.wait(remaining)
+
+    def _open(self):
+        raw = self._connect()
+        with self._lock:
+            self._counters['created'] += 1
+        return _Slot(raw, self.prepared_statements)
+
+    def _healthy(self, slot):
+        raw = slot.raw
+        if raw.closed:
+            return False
+
+        now = time.monotonic()
+        if now - slot.created_at > self.max_lifetime:
+            return False
+
+        if now - slot.last_used > self.ping_interval:
+            try:
+                cur = raw.cursor()
+                try:
+                    cur.execute("SELECT 1")
+                    cur.fetchone()
+                finally:
+                    cur.close()
+                raw.rollback()
+            except Exception:
+                return False
+
+        return True
+
+    def _discard(self, slot):
+        try:
+            if not slot.raw.closed:
+                slot.raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._size -= 1
+            self._counters['recycled'] += 1
+            self._lock.notify()
+
+
+# Process-wide pool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return this process's pool, creating it on first use.
+
+    The pool remembers the pid that created it: a gunicorn worker forked
+    from a master that already touched the database builds its own pool
+    instead of sharing the parent's sockets.
+    """
+    global _pool
+
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(**get_pool_config())
+        return _pool
+
+
+def set_pool(pool):
+    """Swap this process's pool (tests, the load-test stand-in)"""
+    global _pool
+
+    with _pool_lock:
+        _pool = pool
+
+
+def reset_pool():
+    """
+    Drop this process's pool. Called from gunicorn's post_fork hook; the
+    inherited connections belong to the parent and are left untouched.
+    """
+    global _pool
+
+    with _pool_lock:
+        pool, _pool = _pool, None
+
+    if pool is not None and pool.pid == os.getpid():
+        pool.closeall()
+
+
+def pool_stats():
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        return {'size': 0, 'idle': 0, 'in_use': 0, 'pid': os.getpid()}
+    return pool.stats()
+
+
+POOL_CONNECTIONS = metrics.gauge('jowa_db_pool_connections', "Pooled database connections by state", ['state'])
+POOL_WAITS = metrics.gauge('jowa_db_pool_waits', "Checkouts that had to wait for a free connection")
+POOL_TIMEOUTS = metrics.gauge('jowa_db_pool_timeouts', "Checkouts that gave up waiting")
+
+
+def _collect_pool_metrics():
+    stats = pool_stats()
+    POOL_CONNECTIONS.set(stats['idle'], state='idle')
+    POOL_CONNECTIONS.set(stats['in_use'], state='in_use')
+    POOL_WAITS.set(stats.get('waits', 0))
+    POOL_TIMEOUTS.set(stats.get('timeouts', 0))
+
+
+metrics.register_collector(_collect_pool_metrics)
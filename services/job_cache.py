@@ -0,0 +1,195 @@
+# services/job_cache.py
+"""
+Process-wide cache of rendered "Browse Available Jobs" pages.
+
+Most seekers page through the same first few screens of active jobs, so
+each page is rendered once per worker and served from memory, keyed by
+the keyset bound it was read from (services/pagination.py). Anything that
+writes to jobs sends NOTIFY jowa_jobs inside its transaction; every
+worker LISTENs on a dedicated connection and drops its pages when the
+notification arrives, i.e. once the write has committed.
+
+While the listener isn't connected the cache is bypassed, because
+changes could be missed. JOB_CACHE_TTL additionally bounds how long a page
+can be served, for writes made outside the app.
+"""
+import os
+import select
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from services.db_pool import connect_from_env
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+JOBS_CHANNEL = 'jowa_jobs'
+JOB_CACHE_TTL = int(os.getenv('JOB_CACHE_TTL', '60'))
+JOB_CACHE_PAGES = int(os.getenv('JOB_CACHE_PAGES', '256'))
+
+# text: rendered screen; first_key/last_key: pagination row keys;
+# jobs: ((id, title), ...) behind options 1-3. An empty page has no jobs.
+ListingPage = namedtuple('ListingPage', ['text', 'first_key', 'last_key', 'jobs'])
+
+
+def notify_jobs_changed(cur):
+    """Call in the transaction that writes to jobs; delivered on commit"""
+    cur.execute(f"NOTIFY {JOBS_CHANNEL}")
+
+
+def cache_key(bound):
+    if bound is None:
+        return None
+    operator, (created_at, row_id) = bound
+    return operator, created_at, row_id
+
+
+class JobListingCache:
+    """
+    Bounded, TTL'd map of keyset bound -> ListingPage.
+
+    put() takes the generation read before the query, so a page loaded
+    while an invalidation came in is never stored.
+    """
+
+    def __init__(self, ttl=JOB_CACHE_TTL, max_pages=JOB_CACHE_PAGES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._clock = clock
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.active = False
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, bound):
+        if not self.active:
+            return None
+        key = cache_key(bound)
+        now = self._clock()
+        with self._lock:
+            item = self._pages.get(key)
+            if item is None or item[0] <= now:
+                self._pages.pop(key, None)
+                self.stats['misses'] += 1
+                return None
+            self._pages.move_to_end(key)
+            self.stats['hits'] += 1
+            return item[1]
+
+    def put(self, bound, page, generation):
+        if not self.active:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._pages[cache_key(bound)] = (self._clock() + self.ttl, page)
+            self._pages.move_to_end(cache_key(bound))
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._pages.clear()
+            self.stats['invalidations'] += 1
+
+    def activate(self):
+        # Changes made before LISTEN took effect were not seen
+        self.invalidate()
+        self.active = True
+
+    def deactivate(self):
+        self.active = False
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._pages)
+
+
+class JobChangeListener:
+    """LISTENs for jobs changes on its own connection and invalidates the cache"""
+
+    def __init__(self, cache, connect=connect_from_env, channel=JOBS_CHANNEL,
+                 poll_interval=5.0, retry_interval=5.0):
+        self.cache = cache
+        self._connect = connect
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        # One listener per process; forked workers start their own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Pages inherited from the parent may be stale already
+            self.cache.deactivate()
+            threading.Thread(target=self._run, name='job-cache-listener', daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                log.warning("job_cache_listener_disconnected", error=str(e))
+            self.cache.deactivate()
+            time.sleep(self.retry_interval)
+
+    def _listen(self):
+        conn = self._connect()
+        try:
+            # LISTEN only takes effect outside a transaction block
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {self.channel}")
+            cur.close()
+            self.cache.activate()
+
+            while True:
+                if select.select([conn], [], [], self.poll_interval) != ([], [], []):
+                    self.drain(conn)
+        finally:
+            conn.close()
+
+    def drain(self, conn):
+        """Consume pending notifications; returns how many there were"""
+        conn.poll()
+        count = len(conn.notifies)
+        if count:
+            del conn.notifies[:]
+            self.cache.invalidate()
+        return count
+
+
+_cache = None
+_listener = None
+_cache_lock = threading.Lock()
+
+
+def get_job_cache():
+    """The process-wide cache, with its listener running in this process"""
+    global _cache, _listener
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cache = JobListingCache()
+                _listener = JobChangeListener(cache)
+                _cache = cache
+    if _listener is not None:
+        _listener.ensure_started()
+    return _cache
+
+
+def set_job_cache(cache, listener=None):
+    """Swap the process-wide cache (tests, scripts)"""
+    global _cache, _listener
+    _cache = cache
+    _listener = listener
@@ -0,0 +1,306 @@
+# services/loadtest.py
+"""
+USSD traffic generation and replay (see loadtest.py).
+
+A session script is one JSON line describing one dial:
+
+    {"session_id": "lt-000001", "phone_number": "+260970000001", "endpoint": "/at-ussd",
+     "flow": "browse_apply", "role": "seeker", "inputs": ["", "1", "1", "2"]}
+
+inputs are what the user typed on each hop, starting with the dial ("").
+/at-ussd receives them the way Africa's Talking sends them, as the
+cumulative text ("1*1*2"); /ussd receives one choice per hop.
+
+role says who the phone must already be ('seeker', 'employer') or 'new'
+for a registration; seed() creates those users, employers and a few jobs
+before a run, with the same INSERTs the menu itself uses.
+
+replay() runs the sessions through the WSGI app from a thread pool. Each
+session's hops are sequential, different sessions run concurrently. The
+menu level that handled a hop comes from the app itself (a metrics
+request listener), so the report is per menu state as the app sees it.
+
+Runs without PostgreSQL use the in-memory stand-in in
+tests/stand_in_database.py.
+"""
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from services import metrics, repository
+
+ENDPOINTS = ('/at-ussd', '/ussd')
+
+NAMES = ['Mary Banda', 'John Phiri', 'Grace Mwale', 'Peter Tembo', 'Ruth Zulu', 'Joseph Lungu']
+SKILLS = ['Construction', 'Farming', 'Cleaning', 'Driving', 'Cooking', 'Security']
+TOWNS = ['Lusaka', 'Ndola', 'Kitwe', 'Kabwe', 'Chipata', 'Livingstone']
+COMPANIES = ['BuildRight Ltd', 'Green Farms', 'CleanCo', 'Copperbelt Haulage']
+BUSINESSES = ['Construction', 'Farming', 'Cleaning', 'Transport']
+JOB_TITLES = ['Bricklayer', 'Farm hand', 'Office cleaner', 'Truck driver', 'Cook', 'Night guard']
+
+# Screens that mean the hop did not do what the user asked
+FAILURE_SCREENS = ('temporarily unavailable', 'an error occurred', 'session expired', 'failed')
+
+
+def _register_seeker(rng):
+    return 'new', ['', '1', rng.choice(NAMES), rng.choice(SKILLS), rng.choice(TOWNS)]
+
+
+def _register_employer(rng):
+    return 'new', ['', '2', rng.choice(COMPANIES), rng.choice(BUSINESSES)]
+
+
+def _browse_apply(rng):
+    pages = ['4'] * rng.choice([0, 0, 1])
+    return 'seeker', ['', '1', '1'] + pages + [rng.choice(['1', '2', '3'])]
+
+
+def _view_applications(rng):
+    return 'seeker', ['', '1', '2'] + ['6'] * rng.choice([0, 1])
+
+
+def _post_job(rng):
+    return 'employer', ['', '2', '1', rng.choice(JOB_TITLES), "Daily work, start Monday", rng.choice(TOWNS),
+                        str(rng.choice([50, 80, 120, 200])), rng.choice(['1', '2', '3'])]
+
+
+def _payment(rng):
+    return 'employer', ['', '3', '2', rng.choice(['1', '2', '3']), rng.choice(['1', '1', '1', '2'])]
+
+
+def _payment_history(rng):
+    return 'employer', ['', '3', '1']
+
+
+FLOWS = {
+    'register_seeker': _register_seeker,
+    'register_employer': _register_employer,
+    'browse_apply': _browse_apply,
+    'view_applications': _view_applications,
+    'post_job': _post_job,
+    'payment': _payment,
+    'payment_history': _payment_history,
+}
+
+# Roughly what the service sees: mostly seekers looking for work
+DEFAULT_MIX = {
+    'register_seeker': 10,
+    'register_employer': 3,
+    'browse_apply': 45,
+    'view_applications': 15,
+    'post_job': 10,
+    'payment': 7,
+    'payment_history': 10,
+}
+
+
+def parse_mix(spec):
+    """'browse_apply=3,payment=1' -> {'browse_apply': 3.0, 'payment': 1.0}"""
+    mix = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            flow, weight = part.split('=', 1)
+            if flow.strip() not in FLOWS:
+                raise ValueError(f"Unknown flow {flow.strip()!r}; choose from {', '.join(FLOWS)}")
+            mix[flow.strip()] = float(weight)
+    return mix or dict(DEFAULT_MIX)
+
+
+def generate_sessions(count, seed=0, mix=None, endpoints=ENDPOINTS, seekers=200, employers=40):
+    """
+    count session scripts drawn from mix (flow -> weight).
+
+    Existing users are picked from a fixed pool of seekers and employers
+    phones; each registration gets a phone of its own.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    flows = list(mix)
+    weights = [mix[flow] for flow in flows]
+
+    sessions = []
+    for number in range(1, count + 1):
+        flow = rng.choices(flows, weights)[0]
+        role, inputs = FLOWS[flow](rng)
+        if role == 'seeker':
+            phone_number = f"+26097{rng.randrange(seekers):07d}"
+        elif role == 'employer':
+            phone_number = f"+26096{rng.randrange(employers):07d}"
+        else:
+            phone_number = f"+26095{number:07d}"
+        sessions.append({
+            'session_id': f"lt-{seed}-{number:06d}",
+            'phone_number': phone_number,
+            'endpoint': rng.choice(endpoints),
+            'flow': flow,
+            'role': role,
+            'inputs': inputs,
+        })
+    return sessions
+
+
+def write_sessions(path, sessions):
+    with open(path, 'w', encoding='utf-8') as f:
+        for session in sessions:
+            f.write(json.dumps(session) + '\n')
+
+
+def read_sessions(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def seed(cur, sessions, jobs_per_employer=2):
+    """Register every seeker and employer the sessions expect, and give employers jobs"""
+    seekers = sorted({session['phone_number'] for session in sessions if session['role'] == 'seeker'})
+    employers = sorted({session['phone_number'] for session in sessions if session['role'] == 'employer'})
+
+    for i, phone_number in enumerate(seekers):
+        repository.save_seeker(cur, phone_number, NAMES[i % len(NAMES)], SKILLS[i % len(SKILLS)],
+                               TOWNS[i % len(TOWNS)])
+
+    for i, phone_number in enumerate(employers):
+        employer_id = repository.save_employer(cur, phone_number, COMPANIES[i % len(COMPANIES)],
+                                               BUSINESSES[i % len(BUSINESSES)])
+        for j in range(jobs_per_employer):
+            cur.execute("""
+                INSERT INTO jobs (employer_id, title, description, location, payment_amount, payment_type)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (employer_id, JOB_TITLES[(i + j) % len(JOB_TITLES)], "Seeded by loadtest.py",
+                  TOWNS[(i + j) % len(TOWNS)], 50 + 10 * j, 'daily'))
+
+
+# Replay
+
+def hop_requests(session):
+    """(path, form or JSON body) for each hop of a session script"""
+    inputs = session['inputs']
+    for i, choice in enumerate(inputs):
+        if session['endpoint'] == '/at-ussd':
+            yield {'sessionId': session['session_id'], 'phoneNumber': session['phone_number'],
+                   'text': '*'.join(inputs[1:i + 1])}
+        else:
+            yield {'sessionId': session['session_id'], 'phoneNumber': session['phone_number'], 'text': choice}
+
+
+def _failed(status, text):
+    if status >= 400:
+        return True
+    text = text.lower()
+    return any(screen in text for screen in FAILURE_SCREENS)
+
+
+class HopResult:
+    __slots__ = ('flow', 'endpoint', 'menu_level', 'seconds', 'queries', 'error')
+
+    def __init__(self, flow, endpoint, menu_level, seconds, queries, error):
+        self.flow = flow
+        self.endpoint = endpoint
+        self.menu_level = menu_level
+        self.seconds = seconds
+        self.queries = queries
+        self.error = error
+
+
+def replay(app, sessions, concurrency=10):
+    """Run sessions through app with concurrency threads; returns ([HopResult], wall seconds)"""
+    local = threading.local()
+
+    def remember(record):
+        local.record = record
+
+    def run(session):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        results = []
+        for body in hop_requests(session):
+            local.record = None
+            started = time.perf_counter()
+            try:
+                if session['endpoint'] == '/at-ussd':
+                    response = client.post('/at-ussd', data=body)
+                else:
+                    response = client.post('/ussd', json=body)
+                status, text = response.status_code, response.get_data(as_text=True)
+            except Exception as e:
+                status, text = 599, str(e)
+            seconds = time.perf_counter() - started
+
+            record = local.record
+            results.append(HopResult(session['flow'], session['endpoint'],
+                                     record.menu_level if record and record.menu_level else 'unknown',
+                                     seconds, record.queries if record else 0, _failed(status, text)))
+        return results
+
+    metrics.add_request_listener(remember)
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            per_session = list(pool.map(run, sessions))
+        elapsed = time.perf_counter() - started
+    finally:
+        metrics.remove_request_listener(remember)
+
+    return [result for results in per_session for result in results], elapsed
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _summarize(results):
+    seconds = sorted(result.seconds for result in results)
+    errors = sum(1 for result in results if result.error)
+    return {
+        'hops': len(results),
+        'errors': errors,
+        'error_rate': errors / len(results) if results else 0.0,
+        'p50_ms': percentile(seconds, 0.50) * 1000,
+        'p95_ms': percentile(seconds, 0.95) * 1000,
+        'p99_ms': percentile(seconds, 0.99) * 1000,
+        'queries_per_hop': sum(result.queries for result in results) / len(results) if results else 0.0,
+    }
+
+
+def summarize(results, sessions, elapsed):
+    """Throughput, overall latency and error rate, then the same per menu state, endpoint and flow"""
+    def grouped(attribute):
+        groups = {}
+        for result in results:
+            groups.setdefault(getattr(result, attribute), []).append(result)
+        return {name: _summarize(group) for name, group in sorted(groups.items())}
+
+    return {
+        'sessions': len(sessions),
+        'seconds': elapsed,
+        'hops_per_second': len(results) / elapsed if elapsed else 0.0,
+        'sessions_per_second': len(sessions) / elapsed if elapsed else 0.0,
+        'overall': _summarize(results),
+        'menu_levels': grouped('menu_level'),
+        'endpoints': grouped('endpoint'),
+        'flows': grouped('flow'),
+    }
+
+
+def format_report(summary):
+    overall = summary['overall']
+    lines = [
+        f"{summary['sessions']} sessions, {overall['hops']} hops in {summary['seconds']:.2f}s: "
+        f"{summary['hops_per_second']:.1f} hops/s, {summary['sessions_per_second']:.1f} sessions/s, "
+        f"{overall['errors']} errors ({overall['error_rate']:.1%})",
+    ]
+    for title, key in (('menu state', 'menu_levels'), ('endpoint', 'endpoints'), ('flow', 'flows')):
+        lines.append('')
+        lines.append(f"{title:<26}{'hops':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+        for name, row in summary[key].items():
+            lines.append(f"{name:<26}{row['hops']:>7}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+                         f"{row['p99_ms']:>9.2f}{row['queries_per_hop']:>9.1f}{row['errors']:>8}")
+    return '\n'.join(lines)
@@ -0,0 +1,199 @@
+# services/log.py
+"""
+Structured logging that stays off the request thread.
+
+    from services.log import get_logger
+    log = get_logger(__name__)
+    log.info('payment_initiated', payment_id=7, amount=10)
+
+Every record is one JSON line on stdout:
+
+    {"ts": "...", "level": "INFO", "logger": "app", "event": "payment_initiated",
+     "route": "/at-ussd", "payment_id": 7, "amount": 10}
+
+The caller only puts the record on a bounded queue. A listener thread,
+started per process on first use, formats and writes it. When the queue
+is full, records are dropped and counted, so logging never blocks a hop.
+
+- LOG_LEVEL (default INFO) is the minimum level written.
+- LOG_SAMPLE_RATES, e.g. "/at-ussd=0.1,/ussd=0.1", keeps only that share
+  of requests to a route below WARNING. Routes are the URL rules, as in
+  the metrics labels. The decision is made once per request
+  (begin_request), so a sampled request keeps all of its lines.
+  Warnings and errors are always written.
+- Phone numbers are masked to their last three digits
+  (+260******567) in the message and in every string field.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+ROOT_LOGGER = 'jowa'
+
+PHONE_NUMBER = re.compile(r'(?<![\w-])\+?\d{9,15}(?![\w-])')
+
+_route = contextvars.ContextVar('log_route', default=None)
+_sampled = contextvars.ContextVar('log_sampled', default=True)
+
+
+def parse_sample_rates(spec):
+    """'/at-ussd=0.1,/ussd=0.25' -> {'/at-ussd': 0.1, '/ussd': 0.25}"""
+    rates = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            route, rate = part.split('=', 1)
+            rates[route.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+
+
+def redact(text):
+    def mask(match):
+        number = match.group(0)
+        return number[:4] + '*' * (len(number) - 7) + number[-3:] if len(number) > 7 else number
+    return PHONE_NUMBER.sub(mask, text)
+
+
+def begin_request(route, rates=None, rand=random.random):
+    """Tag this request's records with route and decide whether it is sampled"""
+    rate = (LOG_SAMPLE_RATES if rates is None else rates).get(route, 1.0)
+    _route.set(route)
+    _sampled.set(rate >= 1.0 or rand() < rate)
+
+
+def end_request():
+    _route.set(None)
+    _sampled.set(True)
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + '.') else record.name,
+            'event': redact(record.getMessage()),
+        }
+        if getattr(record, 'route', None):
+            entry['route'] = record.route
+        for key, value in getattr(record, 'fields', {}).items():
+            entry[key] = redact(value) if isinstance(value, str) else value
+        if record.exc_info:
+            entry['error'] = redact(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Tags and samples on the calling thread; formatting happens in the listener"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING and not _sampled.get():
+            return False
+        record.route = _route.get()
+        return super().filter(record)
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogger:
+    """logger.info(event, **fields); exception() adds the current traceback"""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, event, fields, exc_info=False):
+        # Started first: LOG_LEVEL is only applied to the root logger then
+        _ensure_started()
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+_handler = None
+_listener = None
+_pid = None
+_lock = threading.Lock()
+
+
+def _ensure_started():
+    # One listener thread per process; forked workers start their own
+    global _handler, _listener, _pid
+
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid == os.getpid():
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        if _handler is not None:
+            root.removeHandler(_handler)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JSONFormatter())
+        _handler = _QueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, stream)
+        _listener.start()
+
+        root.addHandler(_handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        _pid = os.getpid()
+        atexit.register(flush)
+
+
+def flush():
+    """Write out everything queued so far (at exit, in tests)"""
+    with _lock:
+        if _listener is not None and _pid == os.getpid():
+            _listener.stop()
+            _listener.start()
+
+
+def dropped():
+    """Records lost to a full queue in this process"""
+    return _handler.dropped if _handler is not None and _pid == os.getpid() else 0
+
+
+def get_logger(name):
+    if name == '__main__' or not name:
+        name = 'app'
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
@@ -0,0 +1,529 @@
+# services/metrics.py
+"""
+Prometheus-style metrics, exported by /metrics in the text format.
+
+    from services import metrics
+    SENT = metrics.counter('jowa_sms_sent_total', "SMS handed to the provider", ['provider'])
+    SENT.inc(provider='at')
+
+Counters, gauges and histograms live in this process's memory; updating
+one takes a lock and a dict lookup, nothing else.
+
+Gunicorn runs several workers, and each scrape reaches just one of them.
+With METRICS_DIR set (gunicorn.conf.py points it at a fresh temporary
+directory), every process writes its values to METRICS_DIR/<pid>.json
+every METRICS_FLUSH_INTERVAL seconds, and /metrics adds up the files of
+all workers, so the counts cover the whole host. Processes that serve
+no requests (sms_worker.py, payment_worker.py) call start() to publish
+theirs:
+
+- counters and histograms are summed, including those of workers that
+  have exited, so totals never go backwards when a worker is recycled;
+- gauges are summed over live workers (mark_process_dead() drops those
+  of a worker that exited);
+- local gauges (e.g. the SMS outbox depth, read from the database at
+  scrape time) are reported by the scraped process only.
+
+Each request (begin_request / end_request) is timed and counts the
+queries run on pooled cursors (TimedCursor, services/db_pool.py). A USSD
+hop tags its request with its menu_level, which feeds the per-menu
+latency and query histograms. The request's statements and their
+parameters go to request listeners such as services/query_audit.py.
+"""
+import atexit
+import bisect
+import contextvars
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+# Queries run outside a request (batching threads, workers)
+BACKGROUND = 'background'
+
+_lock = threading.Lock()
+_metrics = {}
+_collectors = []
+_request_listeners = []
+_query_listeners = []
+_version = 0
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._samples = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        with _lock:
+            return {key: (list(value) if isinstance(value, list) else value)
+                    for key, value in self._samples.items()}
+
+    def _describe(self):
+        return {'type': self.kind, 'help': self.documentation, 'labels': list(self.labels)}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        global _version
+        key = self._key(labels)
+        with _lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+            _version += 1
+
+
+class Gauge(_Metric):
+    """Summed across workers, or reported by the scraped process only (local=True)"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), local=False):
+        super().__init__(name, documentation, labels)
+        self.local = local
+
+    def set(self, value, **labels):
+        global _version
+        key = self._key(labels)
+        with _lock:
+            self._samples[key] = value
+            _version += 1
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        global _version
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self._samples.get(key)
+            if counts is None:
+                # One count per bucket, then +Inf, then the sum
+                counts = self._samples[key] = [0] * (len(self.buckets) + 1) + [0]
+            counts[slot] += 1
+            counts[-1] += value
+            _version += 1
+
+    def _describe(self):
+        return dict(super()._describe(), buckets=list(self.buckets))
+
+
+def _register(cls, name, *args, **kwargs):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"{name} is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name, documentation, labels=()):
+    return _register(Counter, name, documentation, labels)
+
+
+def gauge(name, documentation, labels=(), local=False):
+    return _register(Gauge, name, documentation, labels, local=local)
+
+
+def histogram(name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram, name, documentation, labels, buckets=buckets)
+
+
+def register_collector(collect):
+    """collect() is called before every snapshot of this process, e.g. to set gauges"""
+    _collectors.append(collect)
+
+
+# Requests and hops
+
+REQUESTS = counter('jowa_http_requests_total', "HTTP requests by route and status", ['route', 'status'])
+REQUEST_SECONDS = histogram('jowa_http_request_seconds', "HTTP request latency by route", ['route'])
+REQUEST_QUERIES = histogram('jowa_http_request_db_queries', "Database queries per HTTP request", ['route'],
+                            buckets=QUERY_COUNT_BUCKETS)
+HOP_SECONDS = histogram('jowa_ussd_hop_seconds', "USSD hop latency by menu level", ['menu_level'])
+HOP_QUERIES = histogram('jowa_ussd_hop_db_queries', "Database queries per USSD hop by menu level",
+                        ['menu_level'], buckets=QUERY_COUNT_BUCKETS)
+HOP_DB_SECONDS = histogram('jowa_ussd_hop_db_seconds', "Time a USSD hop spent in the database by menu level",
+                           ['menu_level'])
+QUERIES = counter('jowa_db_queries_total', "Database queries by route", ['route'])
+QUERY_SECONDS = histogram('jowa_db_query_seconds', "Database query duration by route", ['route'],
+                          buckets=QUERY_BUCKETS)
+
+
+# One query run through a TimedCursor; started is the wall clock, rows the cursor's rowcount
+Statement = namedtuple('Statement', ['sql', 'params', 'started', 'seconds', 'rows'])
+
+# What end_request() hands to request listeners
+RequestRecord = namedtuple('RequestRecord', ['route', 'status', 'seconds', 'queries', 'db_seconds', 'menu_level',
+                                             'statements'])
+
+
+def add_request_listener(listener):
+    """listener(RequestRecord) is called on the request's thread as each request ends"""
+    _request_listeners.append(listener)
+
+
+def remove_request_listener(listener):
+    if listener in _request_listeners:
+        _request_listeners.remove(listener)
+
+
+def add_query_listener(listener):
+    """listener(cursor, Statement, error) is called after every query on a TimedCursor, with the raw cursor"""
+    _query_listeners.append(listener)
+
+
+def remove_query_listener(listener):
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+
+class _RequestStats:
+    __slots__ = ('route', 'started', 'queries', 'db_seconds', 'menu_level', 'statements')
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.menu_level = None
+        # Statement of every query, in order
+        self.statements = []
+
+
+_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def begin_request(route):
+    _ensure_started()
+    _request.set(_RequestStats(route))
+
+
+def tag_request(menu_level):
+    """Count this request as a USSD hop at menu_level"""
+    stats = _request.get()
+    if stats is not None:
+        stats.menu_level = menu_level
+
+
+def current_route():
+    """The route of the request on this thread, or BACKGROUND"""
+    stats = _request.get()
+    return stats.route if stats is not None else BACKGROUND
+
+
+def end_request(status):
+    stats = _request.get()
+    if stats is None:
+        return
+    _request.set(None)
+
+    elapsed = time.perf_counter() - stats.started
+    REQUESTS.inc(route=stats.route, status=status)
+    REQUEST_SECONDS.observe(elapsed, route=stats.route)
+    REQUEST_QUERIES.observe(stats.queries, route=stats.route)
+    if stats.menu_level is not None:
+        HOP_SECONDS.observe(elapsed, menu_level=stats.menu_level)
+        HOP_QUERIES.observe(stats.queries, menu_level=stats.menu_level)
+        HOP_DB_SECONDS.observe(stats.db_seconds, menu_level=stats.menu_level)
+
+    if _request_listeners:
+        record = RequestRecord(stats.route, status, elapsed, stats.queries, stats.db_seconds, stats.menu_level,
+                               stats.statements)
+        for listener in list(_request_listeners):
+            listener(record)
+
+
+def record_query(seconds, statement=None):
+    stats = _request.get()
+    route = BACKGROUND
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+        if statement is not None:
+            stats.statements.append(statement)
+        route = stats.route
+    QUERIES.inc(route=route)
+    QUERY_SECONDS.observe(seconds, route=route)
+
+
+class TimedCursor:
+    """Wraps a DB-API cursor; execute() and executemany() are timed and counted"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=None):
+        started, clock, error = time.time(), time.perf_counter(), None
+        try:
+            return self._cursor.execute(sql, params)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(Statement(sql, params, started, time.perf_counter() - clock, self._rowcount()), error)
+
+    def executemany(self, sql, params_seq):
+        started, clock, error = time.time(), time.perf_counter(), None
+        try:
+            return self._cursor.executemany(sql, params_seq)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(Statement(sql, 'executemany', started, time.perf_counter() - clock, self._rowcount()),
+                         error)
+
+    def _rowcount(self):
+        return getattr(self._cursor, 'rowcount', -1)
+
+    def _record(self, statement, error):
+        record_query(statement.seconds, statement)
+        for listener in list(_query_listeners):
+            listener(self._cursor, statement, error)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+
+# Snapshots and export
+
+def snapshot(include_local=True):
+    """{name: description + 'samples': [[label values, value]]} for this process"""
+    for collect in list(_collectors):
+        try:
+            collect()
+        except Exception:
+            pass
+
+    with _lock:
+        metrics = list(_metrics.values())
+
+    result = {}
+    for metric in metrics:
+        if not include_local and getattr(metric, 'local', False):
+            continue
+        result[metric.name] = dict(metric._describe(),
+                                   samples=[[list(key), value] for key, value in metric.samples().items()])
+    return result
+
+
+def _merge(snapshots):
+    merged = {}
+    for metrics in snapshots:
+        for name, metric in metrics.items():
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for key, value in metric['samples']:
+                key = tuple(key)
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif isinstance(value, list):
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+
+def _read_dir(directory, skip=None):
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        if path == skip:
+            continue
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshots.append(json.load(f)['metrics'])
+        except (OSError, ValueError, KeyError):
+            # Being replaced right now, or a worker died mid-write
+            continue
+    return snapshots
+
+
+def collect(directory=None):
+    """Every metric of the host (METRICS_DIR) or of this process, merged"""
+    directory = METRICS_DIR if directory is None else directory
+    local = snapshot()
+    if not directory:
+        return _merge([local])
+
+    try:
+        write_snapshot(directory, local)
+    except OSError:
+        # Not published: this process's numbers as they are, in place of its last file
+        return _merge(_read_dir(directory, skip=_path(directory, os.getpid())) + [local])
+    shared = _read_dir(directory)
+    local_only = {name: metric for name, metric in local.items() if metric['type'] == 'gauge'
+                  and getattr(_metrics.get(name), 'local', False)}
+    return _merge(shared + [local_only])
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def render(metrics):
+    """The Prometheus text exposition of collect()'s result"""
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key in sorted(metric['samples']):
+            value = metric['samples'][key]
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_labels(metric['labels'], key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = 'le="' + (bound if bound == '+Inf' else _number(float(bound))) + '"'
+                lines.append(f"{name}_bucket{_labels(metric['labels'], key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric['labels'], key)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(metric['labels'], key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+# Per-process files
+
+def _path(directory, pid):
+    return os.path.join(directory, f"{pid}.json")
+
+
+def _write_json(path, data):
+    # A temp file of its own per call: the flush thread and a scrape write at the same time
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def write_snapshot(directory=None, metrics=None):
+    """Publish this process's shared metrics to directory (atomically)"""
+    directory = directory or METRICS_DIR
+    if not directory:
+        return
+    metrics = snapshot(include_local=False) if metrics is None else {
+        name: metric for name, metric in metrics.items() if not getattr(_metrics.get(name), 'local', False)}
+    _write_json(_path(directory, os.getpid()), {'pid': os.getpid(), 'metrics': metrics})
+
+
+def mark_process_dead(pid, directory=None):
+    """Keep an exited worker's counters and histograms, drop its gauges (gunicorn child_exit)"""
+    path = _path(directory or METRICS_DIR, pid)
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    data['metrics'] = {name: metric for name, metric in data['metrics'].items() if metric['type'] != 'gauge'}
+    _write_json(path, data)
+
+
+def clear_dir(directory=None):
+    """Forget a previous run's workers (gunicorn on_starting)"""
+    directory = directory or METRICS_DIR
+    if directory:
+        for path in glob.glob(os.path.join(directory, '*.json*')):
+            os.remove(path)
+
+
+_pid = None
+_start_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; the parent's numbers are in the parent's file
+    with _lock:
+        for metric in _metrics.values():
+            metric._samples.clear()
+
+
+def _ensure_started():
+    # One flushing thread per process; forked workers start their own
+    global _pid
+
+    if _pid == os.getpid():
+        return
+    with _start_lock:
+        if _pid == os.getpid():
+            return
+        if _pid is not None:
+            _reset_after_fork()
+        _pid = os.getpid()
+        if METRICS_DIR:
+            threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True).start()
+            atexit.register(_flush_at_exit)
+
+
+def start():
+    """Publish this process's metrics to METRICS_DIR without serving requests (sms_worker.py, payment_worker.py)"""
+    _ensure_started()
+
+
+def _flush_forever():
+    written = None
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        if _version != written:
+            written = _version
+            try:
+                write_snapshot()
+            except OSError:
+                pass
+
+
+def _flush_at_exit():
+    try:
+        write_snapshot()
+    except OSError:
+        pass
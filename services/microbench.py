@@ -0,0 +1,123 @@
+# services/microbench.py
+"""
+Micro-benchmarks with a query count (see benchmark.py for the cases).
+
+A Case is a name and a setup() that returns the call to measure. Each
+case is timed as the best of `repeat` rounds of `number` calls, and the
+statements the call sends to the fake database are counted, so a result
+is (microseconds per call, queries per call).
+
+compare() checks results against the stored baseline:
+
+- any extra query per call is a regression; query counts don't depend
+  on the machine, so this check is exact;
+- a call slower than the baseline by more than `tolerance` (and by more
+  than `floor_us`, so that sub-microsecond jitter doesn't count) is a
+  regression. Timings only compare on the machine that recorded them.
+"""
+import json
+import time
+from collections import namedtuple
+
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_FLOOR_US = 2.0
+
+Case = namedtuple('Case', ['name', 'setup'])
+Result = namedtuple('Result', ['name', 'us_per_call', 'queries'])
+Finding = namedtuple('Finding', ['name', 'kind', 'baseline', 'current'])
+
+
+def calibrate(call, target_seconds=0.02, limit=100_000):
+    """Calls per round so that a round takes about target_seconds"""
+    number = 1
+    while number < limit:
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        if time.perf_counter() - started >= target_seconds:
+            break
+        number *= 2
+    return number
+
+
+def measure(case, count_queries, repeat=5, number=None):
+    """
+    Time one case. count_queries() returns the fake database's running
+    statement count; the first call's difference is the query count.
+    """
+    call = case.setup()
+
+    before = count_queries()
+    call()
+    queries = count_queries() - before
+
+    number = number or calibrate(call)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        elapsed = (time.perf_counter() - started) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return Result(case.name, best * 1e6, queries)
+
+
+def run(cases, count_queries, repeat=5, number=None):
+    return [measure(case, count_queries, repeat=repeat, number=number) for case in cases]
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    baseline = {result.name: {'us_per_call': round(result.us_per_call, 3), 'queries': result.queries}
+                for result in results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, floor_us=DEFAULT_FLOOR_US, timings=True):
+    """Findings for every regression ('queries', 'time') and every case missing from the baseline ('new')"""
+    findings = []
+    for result in results:
+        expected = baseline.get(result.name)
+        if expected is None:
+            findings.append(Finding(result.name, 'new', None, result.us_per_call))
+            continue
+        if result.queries > expected['queries']:
+            findings.append(Finding(result.name, 'queries', expected['queries'], result.queries))
+        slower = result.us_per_call - expected['us_per_call']
+        if timings and slower > floor_us and slower > expected['us_per_call'] * tolerance:
+            findings.append(Finding(result.name, 'time', expected['us_per_call'], result.us_per_call))
+    return findings
+
+
+def format_results(results, baseline):
+    lines = [f"{'case':<40}{'us/call':>11}{'baseline':>11}{'change':>9}{'queries':>9}"]
+    for result in results:
+        expected = baseline.get(result.name)
+        if expected:
+            change = (result.us_per_call / expected['us_per_call'] - 1) if expected['us_per_call'] else 0.0
+            lines.append(f"{result.name:<40}{result.us_per_call:>11.2f}{expected['us_per_call']:>11.2f}"
+                         f"{change:>+9.0%}{result.queries:>5} ({expected['queries']})")
+        else:
+            lines.append(f"{result.name:<40}{result.us_per_call:>11.2f}{'-':>11}{'':>9}{result.queries:>9}")
+    return '\n'.join(lines)
+
+
+def format_findings(findings):
+    lines = []
+    for finding in findings:
+        if finding.kind == 'queries':
+            lines.append(f"{finding.name}: {finding.current} queries per call, baseline {finding.baseline}")
+        elif finding.kind == 'time':
+            lines.append(f"{finding.name}: {finding.current:.2f} us per call, baseline {finding.baseline:.2f}")
+        else:
+            lines.append(f"{finding.name}: not in the baseline (record it with --save)")
+    return '\n'.join(lines)
@@ -0,0 +1,136 @@
+# services/migrations.py
+"""
+Versioned schema migrations.
+
+The schema lives in migrations/NNNN_name.sql, applied in version order
+by migrate.py at deploy time (never at app startup). Each file runs in
+its own transaction together with its schema_version row, so a failed
+migration leaves nothing half-applied and the next deploy retries it.
+
+A session-level advisory lock keeps two deploys from migrating at once.
+Applied files must not be edited; a changed checksum is reported by
+status() and migrate() so that the drift is visible.
+"""
+import hashlib
+import os
+import re
+from collections import namedtuple
+
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# pg_advisory_lock key; any constant shared by everyone running migrate.py
+MIGRATION_LOCK_ID = 4_201_001
+
+CREATE_SCHEMA_VERSION_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(200) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+Migration = namedtuple('Migration', ['version', 'name', 'sql', 'checksum'])
+
+
+class MigrationError(Exception):
+    """The migrations directory or the schema_version table is inconsistent"""
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """All migrations in directory, ordered by version"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Two migrations numbered {version}: {migrations[version].name}, {filename}")
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            sql = f.read()
+        migrations[version] = Migration(version, filename, sql, hashlib.sha256(sql.encode('utf-8')).hexdigest())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def applied_versions(cur):
+    """{version: checksum} of everything in schema_version"""
+    cur.execute("SELECT version, checksum FROM schema_version ORDER BY version")
+    return dict(cur.fetchall())
+
+
+def status(conn, migrations=None):
+    """[(migration, state)] with state 'applied', 'pending' or 'changed'"""
+    migrations = load_migrations() if migrations is None else migrations
+    cur = conn.cursor()
+    try:
+        cur.execute(CREATE_SCHEMA_VERSION_SQL)
+        applied = applied_versions(cur)
+        conn.commit()
+    finally:
+        cur.close()
+
+    states = []
+    for migration in migrations:
+        if migration.version not in applied:
+            states.append((migration, 'pending'))
+        elif applied[migration.version] != migration.checksum:
+            states.append((migration, 'changed'))
+        else:
+            states.append((migration, 'applied'))
+    return states
+
+
+def migrate(conn, migrations=None, target=None):
+    """
+    Apply every pending migration up to target (default: all).
+
+    Returns the migrations applied. Raises the database error of the
+    first migration that fails, after rolling it back.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    cur = conn.cursor()
+    try:
+        cur.execute(CREATE_SCHEMA_VERSION_SQL)
+        conn.commit()
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            applied = applied_versions(cur)
+            conn.commit()
+
+            unknown = sorted(set(applied) - {migration.version for migration in migrations})
+            if unknown:
+                raise MigrationError(f"Database has migrations this code doesn't know: {unknown}")
+
+            done = []
+            for migration in migrations:
+                if target is not None and migration.version > target:
+                    break
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        log.warning("migration_changed", migration=migration.name)
+                    continue
+
+                log.info("migration_applying", migration=migration.name)
+                try:
+                    cur.execute(migration.sql)
+                    cur.execute("""
+                        INSERT INTO schema_version (version, name, checksum)
+                        VALUES (%s, %s, %s)
+                    """, (migration.version, migration.name, migration.checksum))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                done.append(migration)
+            return done
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    finally:
+        cur.close()
@@ -0,0 +1,71 @@
+# services/pagination.py
+"""
+Keyset pagination for the paged USSD listings.
+
+Rather than LIMIT n OFFSET page*n, which reads and discards every earlier
+row, a page is fetched relative to the (created_at, id) key of a row that
+was already shown, so page 10 costs the same index range scan as page 0.
+The keys live in the session data:
+
+    page    index of the page on screen
+    starts  key of the first row of every page visited so far
+    last    key of the last row on the current page
+
+"Next" continues strictly after last; "previous" and re-reading the
+current page start from the stored first key. Rows posted while the user
+pages through a listing therefore don't shift the pages already seen.
+"""
+
+FIRST = 'first'
+CURRENT = 'current'
+NEXT = 'next'
+PREVIOUS = 'previous'
+
+
+def row_key(created_at, row_id):
+    """JSON-safe sort key of a row"""
+    return [created_at.isoformat() if created_at is not None else None, row_id]
+
+
+def seek(data, move):
+    """
+    Work out which page to show for move (FIRST, CURRENT, NEXT, PREVIOUS).
+
+    Returns (page, bound) where bound is None for an unbounded first page
+    or (operator, key) to pass to keyset_clause().
+    """
+    page = data.get('page', 0)
+    starts = data.get('starts') or []
+    last = data.get('last')
+
+    if move == NEXT and last:
+        return page + 1, ('<', last)
+    if move == PREVIOUS:
+        page = max(0, page - 1)
+    if move in (CURRENT, PREVIOUS) and len(starts) > page:
+        return page, ('<=', starts[page])
+    # First visit, or session data from before keyset paging
+    return 0, None
+
+
+def landed(data, page, first_key, last_key):
+    """Session data for having shown page with first_key..last_key"""
+    starts = list(data.get('starts') or [])[:page]
+    starts.append(first_key)
+    return dict(data, page=page, starts=starts, last=last_key)
+
+
+def keyset_clause(created_column, id_column, bound):
+    """
+    ("AND (created, id) < (%s, %s)", params) for bound, or ("", ()).
+
+    Listings are ordered newest first, so the row-value comparison walks
+    the (created_at DESC, id DESC) index backwards from the key.
+    """
+    if bound is None:
+        return "", ()
+    operator, (created_at, row_id) = bound
+    return (
+        f"AND ({created_column}, {id_column}) {operator} (%s::timestamp, %s)",
+        (created_at, row_id),
+    )
@@ -0,0 +1,91 @@
+# services/payment_providers.py
+"""
+Mobile-money provider clients used by the payment workers.
+
+Every client has the same two calls:
+
+    request_payment(payment, idempotency_key) -> reference
+        Ask the provider to charge payment['phone_number']. The provider
+        prompts the customer on their handset and answers with its own
+        transaction reference; the result arrives later. A request with
+        an idempotency_key the provider has seen before charges nothing
+        and answers the first request's reference.
+    check_status(reference) -> 'pending' | 'completed' | 'failed'
+
+No real MTN / Airtel / Zamtel integration exists yet, so every provider
+in PAYMENT_CONFIG['mobile_money_providers'] is served by SimulatedProvider
+unless a client is registered for it with register_provider(). Clients
+live in the process-wide registry (services/clients.py), so each
+process builds its own on first use.
+"""
+import itertools
+import random
+import threading
+
+from services.clients import get_client, register_client
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+
+class ProviderError(Exception):
+    """The provider could not be reached or refused the request"""
+
+
+class SimulatedProvider:
+    """
+    Stand-in for a provider API.
+
+    outcome(payment) decides how each payment ends (default: 80%
+    completed, like the old inline simulation). A payment stays 'pending'
+    for the first pending_polls status checks, as a real one does while
+    the customer approves the prompt.
+    """
+
+    def __init__(self, name, outcome=None, pending_polls=0, fail_requests=0):
+        self.name = name
+        self.outcome = outcome or (lambda payment: 'completed' if random.random() > 0.2 else 'failed')
+        self.pending_polls = pending_polls
+        self.fail_requests = fail_requests
+        self.payments = {}
+        self.references = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def request_payment(self, payment, idempotency_key=None):
+        with self._lock:
+            if idempotency_key in self.references:
+                return self.references[idempotency_key]
+            if self.fail_requests:
+                self.fail_requests -= 1
+                raise ProviderError(f"{self.name} simulator: service unavailable")
+            reference = f"{self.name.upper()}-SIM-{next(self._counter):06d}"
+            self.payments[reference] = {
+                'payment': dict(payment),
+                'status': self.outcome(payment),
+                'polls_left': self.pending_polls,
+            }
+            if idempotency_key is not None:
+                self.references[idempotency_key] = reference
+        log.info("payment_simulated", provider=self.name, amount=payment['amount'],
+                 phone_number=payment['phone_number'], reference=reference)
+        return reference
+
+    def check_status(self, reference):
+        with self._lock:
+            entry = self.payments.get(reference)
+            if entry is None:
+                raise ProviderError(f"{self.name} simulator: unknown reference {reference}")
+            if entry['polls_left'] > 0:
+                entry['polls_left'] -= 1
+                return 'pending'
+            return entry['status']
+
+
+def register_provider(name, client):
+    """Use client for provider name; a callable is taken as a factory, built once per process"""
+    register_client(f"payment:{name}", client if callable(client) else (lambda: client))
+
+
+def get_provider(name):
+    return get_client(f"payment:{name}", lambda: SimulatedProvider(name))
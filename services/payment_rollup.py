@@ -0,0 +1,65 @@
+# services/payment_rollup.py
+"""
+Per-day payment totals for the admin dashboard.
+
+payment_daily_rollup holds one row per day, provider and purpose with
+the number and value of completed payments and the number of failed
+ones. Days are the payment's creation day, as the old DATE(created_at)
+report had it.
+
+The row is bumped by record_rollup() in the same transaction that
+finishes the payment (complete_payment and the webhook batches), so the
+dashboard reads a handful of rows however long the payment history is.
+rebuild_rollup() recomputes the table from payments; run it once after
+deploying (backfill_payment_rollup.py) or whenever it is in doubt.
+"""
+from collections import OrderedDict
+
+
+def record_rollup(cur, payments):
+    """
+    Add finished payments, each a (day, provider, purpose, amount,
+    status), to the rollup with one upsert.
+    """
+    totals = OrderedDict()
+    for day, provider, purpose, amount, status in payments:
+        key = (day, provider or '', purpose or '')
+        completed_count, completed_amount, failed_count = totals.get(key, (0, 0, 0))
+        if status == 'completed':
+            completed_count += 1
+            completed_amount += amount or 0
+        elif status == 'failed':
+            failed_count += 1
+        totals[key] = (completed_count, completed_amount, failed_count)
+
+    if not totals:
+        return
+
+    rows = [key + counts for key, counts in sorted(totals.items())]
+    cur.execute(f"""
+        INSERT INTO payment_daily_rollup (day, provider, purpose, completed_count, completed_amount, failed_count)
+        VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))}
+        ON CONFLICT (day, provider, purpose) DO UPDATE SET
+        completed_count = payment_daily_rollup.completed_count + EXCLUDED.completed_count,
+        completed_amount = payment_daily_rollup.completed_amount + EXCLUDED.completed_amount,
+        failed_count = payment_daily_rollup.failed_count + EXCLUDED.failed_count
+    """, [value for row in rows for value in row])
+
+
+def rebuild_rollup(cur):
+    """Recompute the whole rollup from payments; returns the number of rows"""
+    # Completions wait for the rebuild instead of adding to rows it replaces
+    cur.execute("LOCK TABLE payment_daily_rollup IN EXCLUSIVE MODE")
+    cur.execute("DELETE FROM payment_daily_rollup")
+    cur.execute("""
+        INSERT INTO payment_daily_rollup (day, provider, purpose, completed_count, completed_amount, failed_count)
+        SELECT DATE(created_at), COALESCE(provider, ''), COALESCE(purpose, ''),
+               COUNT(*) FILTER (WHERE status = 'completed'),
+               COALESCE(SUM(amount) FILTER (WHERE status = 'completed'), 0),
+               COUNT(*) FILTER (WHERE status = 'failed')
+        FROM payments
+        WHERE status IN ('completed', 'failed')
+        GROUP BY 1, 2, 3
+    """)
+    return cur.rowcount
+
@@ -0,0 +1,289 @@
+# services/payment_webhooks.py
+"""
+Batched, idempotent ingestion of provider payment callbacks.
+
+/payment-webhook hands each callback to the process's WebhookIngestor and
+waits for its outcome. A background thread collects callbacks for up to
+WEBHOOK_BATCH_WINDOW seconds and applies them in one transaction:
+
+- the payments they refer to are locked by transaction_id (unique
+  index idx_payments_transaction_id), in id order so that ingestors in
+  other gunicorn workers queue behind each other instead of deadlocking;
+- callbacks whose idempotency key is already in payment_webhook_events
+  are duplicates and change nothing;
+- the rest are checked in arrival order against PAYMENT_TRANSITIONS, so
+  a late 'pending' after 'completed' is rejected rather than applied;
+- status changes go out as one UPDATE ... FROM (VALUES ...), finished
+  payments as one payment_daily_rollup upsert, and the callbacks are
+  recorded with their outcome in one multi-row INSERT.
+
+Callbacks for a transaction_id we don't know (yet) are not recorded, so
+the provider's retry is looked at afresh.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from services.log import get_logger
+from services.payment_rollup import record_rollup
+from services.payments import can_transition, payment_finished
+
+log = get_logger(__name__)
+
+WEBHOOK_BATCH_WINDOW = float(os.getenv('WEBHOOK_BATCH_WINDOW', '0.02'))
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '500'))
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', '10'))
+
+# Provider status words accepted by /payment-webhook
+WEBHOOK_PAYMENT_STATUSES = {
+    'pending': 'processing',
+    'processing': 'processing',
+    'completed': 'completed',
+    'success': 'completed',
+    'successful': 'completed',
+    'failed': 'failed',
+    'rejected': 'failed',
+    'cancelled': 'failed',
+    'expired': 'failed',
+}
+
+# Outcomes
+APPLIED = 'applied'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+UNKNOWN = 'unknown'
+ERROR = 'error'
+
+WebhookEvent = namedtuple('WebhookEvent', ['key', 'transaction_id', 'status', 'payload'])
+
+
+def parse_webhook(data, headers):
+    """
+    Build a WebhookEvent from a callback body, or None if it is unusable.
+
+    The key is the provider's Idempotency-Key header or eventId; without
+    either, a retry of the same report (transaction and status) is what
+    counts as a duplicate.
+    """
+    transaction_id = data.get('transactionId')
+    status = WEBHOOK_PAYMENT_STATUSES.get(str(data.get('status', '')).lower())
+    if not transaction_id or status is None:
+        return None
+
+    key = headers.get('Idempotency-Key') or data.get('eventId') or f"{transaction_id}:{status}"
+    return WebhookEvent(str(key), str(transaction_id), status, data)
+
+
+def plan_batch(events, payments, seen):
+    """
+    Decide every event of a batch, in arrival order.
+
+    payments maps transaction_id -> (payment_id, status) for the locked
+    rows; seen holds idempotency keys recorded by earlier batches.
+    Returns (outcomes, one per event; {payment_id: new status}; the
+    [(event, outcome)] to record).
+    """
+    current = {transaction_id: status for transaction_id, (_, status) in payments.items()}
+    outcomes, changes, records = [], {}, []
+    seen = set(seen)
+
+    for event in events:
+        if event.transaction_id not in payments:
+            outcomes.append(UNKNOWN)
+            continue
+        if event.key in seen:
+            outcomes.append(DUPLICATE)
+            continue
+        seen.add(event.key)
+
+        status = current[event.transaction_id]
+        if status == event.status:
+            outcome = DUPLICATE
+        elif can_transition(status, event.status):
+            outcome = APPLIED
+            current[event.transaction_id] = event.status
+            changes[payments[event.transaction_id][0]] = event.status
+        else:
+            outcome = REJECTED
+        outcomes.append(outcome)
+        records.append((event, outcome))
+
+    return outcomes, changes, records
+
+
+def _values(rows, template):
+    """A VALUES list for rows and its flattened parameters"""
+    return ", ".join([template] * len(rows)), [value for row in rows for value in row]
+
+
+def ingest_batch(cur, events):
+    """Apply a batch of WebhookEvents on cur; returns one outcome per event"""
+    cur.execute("""
+        SELECT transaction_id, id, status
+        FROM payments
+        WHERE transaction_id = ANY(%s)
+        ORDER BY id
+        FOR UPDATE
+    """, (sorted({event.transaction_id for event in events}),))
+    payments = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+    keys = sorted({event.key for event in events if event.transaction_id in payments})
+    seen = set()
+    if keys:
+        cur.execute("""
+            SELECT idempotency_key FROM payment_webhook_events
+            WHERE idempotency_key = ANY(%s)
+        """, (keys,))
+        seen = {row[0] for row in cur.fetchall()}
+
+    outcomes, changes, records = plan_batch(events, payments, seen)
+
+    if changes:
+        values, params = _values(sorted(changes.items()), "(%s, %s)")
+        cur.execute(f"""
+            UPDATE payments AS p
+            SET status = v.status, updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES {values}) AS v (id, status)
+            WHERE p.id = v.id
+            RETURNING p.session_id, p.phone_number, p.amount, p.purpose, p.transaction_id, p.status,
+                      p.provider, DATE(p.created_at)
+        """, params)
+        finished = [row for row in cur.fetchall() if row[5] in ('completed', 'failed')]
+        record_rollup(cur, [(day, provider, purpose, amount, status)
+                            for _, _, amount, purpose, _, status, provider, day in finished])
+        for session_id, phone_number, amount, purpose, transaction_id, status, _, _ in finished:
+            payment_finished(cur, session_id, phone_number, amount, purpose, transaction_id, status)
+
+    if records:
+        values, params = _values(
+            [(event.key, event.transaction_id, event.status, outcome, json.dumps(event.payload))
+             for event, outcome in records],
+            "(%s, %s, %s, %s, %s)")
+        cur.execute(f"""
+            INSERT INTO payment_webhook_events (idempotency_key, transaction_id, status, outcome, payload)
+            VALUES {values}
+            ON CONFLICT (idempotency_key) DO NOTHING
+        """, params)
+
+    return outcomes
+
+
+class _Pending:
+    def __init__(self, event):
+        self.event = event
+        self.outcome = ERROR
+        self.done = threading.Event()
+
+
+class WebhookIngestor:
+    """
+    Group-commits webhook callbacks.
+
+    submit() blocks until the batch holding the event has committed, so
+    a 2xx answer always means the callback is durable.
+    """
+
+    def __init__(self, connect, window=WEBHOOK_BATCH_WINDOW, batch_size=WEBHOOK_BATCH_SIZE,
+                 timeout=WEBHOOK_TIMEOUT):
+        self._connect = connect
+        self.window = window
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {'events': 0, 'batches': 0, 'failed_batches': 0,
+                      APPLIED: 0, DUPLICATE: 0, REJECTED: 0, UNKNOWN: 0}
+
+    def submit(self, event):
+        """Queue event for the next batch and return its outcome"""
+        self._ensure_started()
+        pending = _Pending(event)
+        self._queue.put(pending)
+        if not pending.done.wait(self.timeout):
+            return ERROR
+        return pending.outcome
+
+    def flush(self, batch):
+        """Apply a list of pending callbacks in one transaction"""
+        try:
+            outcomes = self._apply([pending.event for pending in batch])
+        except Exception:
+            self.stats['failed_batches'] += 1
+            log.exception("payment_webhook_batch_failed", size=len(batch))
+            outcomes = [ERROR] * len(batch)
+        else:
+            self.stats['batches'] += 1
+            for outcome in outcomes:
+                self.stats[outcome] += 1
+
+        self.stats['events'] += len(batch)
+        for pending, outcome in zip(batch, outcomes):
+            pending.outcome = outcome
+            pending.done.set()
+
+    def _apply(self, events):
+        conn = self._connect()
+        if not conn:
+            raise RuntimeError("no database connection")
+        cur = conn.cursor()
+        try:
+            outcomes = ingest_batch(cur, events)
+            conn.commit()
+            return outcomes
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def _ensure_started(self):
+        # One batching thread per process; forked workers start their own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='payment-webhooks', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+
+_ingestor = None
+_ingestor_lock = threading.Lock()
+
+
+def get_webhook_ingestor():
+    global _ingestor
+
+    if _ingestor is None:
+        with _ingestor_lock:
+            if _ingestor is None:
+                from services.db_pool import get_pool
+                _ingestor = WebhookIngestor(lambda: get_pool().getconn())
+    return _ingestor
+
+
+def set_webhook_ingestor(ingestor):
+    """Swap the process-wide ingestor (tests, scripts)"""
+    global _ingestor
+    _ingestor = ingestor
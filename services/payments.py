@@ -0,0 +1,282 @@
+# services/payments.py
+"""
+Asynchronous mobile-money payments.
+
+The USSD hop never talks to a provider. Confirming a payment only moves
+its payments row to 'queued' and the user is told it is pending. One
+PaymentWorker per provider (payment_worker.py) then
+
+- claims queued payments ('submitting') in a short transaction, asks the
+  provider for each one outside any transaction, then commits each
+  provider's reference ('processing', stored in transaction_id) on its
+  own, retrying failed requests up to PAYMENT_CONFIG['max_retries']
+  times. The payment id is the request's idempotency key, so a payment
+  left 'submitting' by a failed commit or a dead worker is claimed again
+  after PAYMENT_SUBMIT_LEASE seconds and gets back the same reference
+  instead of a second charge;
+- polls processing payments until the provider reports a result, or
+  fails them after PAYMENT_CONFIG['transaction_timeout'] seconds.
+
+A provider can also report the result through /payment-webhook
+(services/payment_webhooks.py). Both paths only move payments along
+PAYMENT_TRANSITIONS, under a row lock, so whichever arrives second is a
+no-op.
+"""
+import os
+import time
+
+from services.log import get_logger
+from services.payment_rollup import record_rollup
+from services.sms_outbox import enqueue_sms
+
+log = get_logger(__name__)
+
+PAYMENT_CONFIG = {
+    'mobile_money_providers': ['mtn', 'airtel', 'zamtel'],
+    'default_currency': 'ZMW',
+    'transaction_timeout': 300,  # 5 minutes
+    'max_retries': 3
+}
+
+IN_FLIGHT_STATUSES = ('queued', 'submitting', 'processing')
+
+# Which status a payment may move to from each status; anything else,
+# e.g. a 'processing' callback after 'completed', is out of order.
+PAYMENT_TRANSITIONS = {
+    'initiated': {'queued', 'cancelled'},
+    'queued': {'submitting', 'processing', 'completed', 'failed', 'cancelled'},
+    'submitting': {'queued', 'processing', 'completed', 'failed'},
+    'processing': {'completed', 'failed'},
+    'completed': set(),
+    'failed': set(),
+    'cancelled': set(),
+}
+
+PAYMENT_POLL_INTERVAL = int(os.getenv('PAYMENT_POLL_INTERVAL', '5'))
+PAYMENT_BATCH_SIZE = int(os.getenv('PAYMENT_BATCH_SIZE', '20'))
+PAYMENT_SUBMIT_LEASE = int(os.getenv('PAYMENT_SUBMIT_LEASE', '60'))
+
+
+def queue_payment(cur, session_id, provider):
+    """
+    Hand the session's initiated payment to the provider's worker.
+
+    Returns (payment_id, amount, purpose), or None if there is nothing
+    to confirm.
+    """
+    cur.execute("""
+        UPDATE payments
+        SET status = 'queued', provider = %s, attempts = 0,
+            next_poll_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE session_id = %s AND status = 'initiated'
+        RETURNING id, amount, purpose
+    """, (provider, session_id))
+    payment = cur.fetchone()
+    if payment:
+        cur.execute("""
+            UPDATE payment_sessions
+            SET status = 'processing', updated_at = CURRENT_TIMESTAMP
+            WHERE session_id = %s
+        """, (session_id,))
+    return payment
+
+
+def can_transition(current, new):
+    return new in PAYMENT_TRANSITIONS.get(current, set())
+
+
+def payment_finished(cur, session_id, phone_number, amount, purpose, transaction_id, status):
+    """Close the USSD payment session and queue the SMS telling the payer"""
+    cur.execute("""
+        UPDATE payment_sessions
+        SET status = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE session_id = %s
+    """, (status, session_id))
+
+    if status == 'completed':
+        enqueue_sms(cur, phone_number,
+            f"Payment of K{amount} for {purpose} completed successfully. Transaction ID: {transaction_id}. Thank you for using JOWA!")
+    else:
+        enqueue_sms(cur, phone_number,
+            f"Your payment of K{amount} for {purpose} was not completed. Please try again or contact support.")
+
+
+def complete_payment(cur, status, payment_id=None, transaction_id=None):
+    """
+    Record the final status of an in-flight payment, found by id or by
+    the provider's transaction_id, add it to the daily rollup and queue
+    the SMS telling the payer.
+
+    Returns True if the payment changed; False if it is unknown or
+    already finished.
+    """
+    if payment_id is not None:
+        where, key = "id = %s", payment_id
+    else:
+        where, key = "transaction_id = %s", transaction_id
+
+    cur.execute(f"""
+        UPDATE payments
+        SET status = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE {where} AND status IN ('queued', 'submitting', 'processing')
+        RETURNING session_id, phone_number, amount, purpose, transaction_id, provider, DATE(created_at)
+    """, (status, key))
+    payment = cur.fetchone()
+    if not payment:
+        return False
+
+    session_id, phone_number, amount, purpose, transaction_id, provider, day = payment
+    record_rollup(cur, [(day, provider, purpose, amount, status)])
+    payment_finished(cur, session_id, phone_number, amount, purpose, transaction_id, status)
+    return True
+
+
+class PaymentWorker:
+    """Submits and polls the payments of one provider"""
+
+    def __init__(self, connect, provider, client, batch_size=PAYMENT_BATCH_SIZE,
+                 poll_interval=PAYMENT_POLL_INTERVAL, max_attempts=PAYMENT_CONFIG['max_retries'],
+                 timeout=PAYMENT_CONFIG['transaction_timeout'], submit_lease=PAYMENT_SUBMIT_LEASE,
+                 idle_sleep=1.0):
+        self._connect = connect
+        self.provider = provider
+        self.client = client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.submit_lease = submit_lease
+        self.idle_sleep = idle_sleep
+        self.running = False
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'request_errors': 0}
+
+    def run_once(self):
+        """Submit queued payments, then poll due ones; returns rows handled"""
+        return self._submit() + self._in_transaction(self._poll)
+
+    def run_forever(self):
+        self.running = True
+        while self.running:
+            try:
+                handled = self.run_once()
+            except Exception:
+                log.exception("payment_worker_batch_failed", provider=self.provider)
+                handled = 0
+            if not handled:
+                time.sleep(self.idle_sleep)
+
+    def stop(self):
+        self.running = False
+
+    def _in_transaction(self, step):
+        conn = self._connect()
+        if not conn:
+            return 0
+        cur = conn.cursor()
+        try:
+            handled = step(cur)
+            conn.commit()
+            return handled
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def _submit(self):
+        claimed = self._in_transaction(self._claim) or []
+
+        for payment_id, phone_number, amount, purpose, attempts in claimed:
+            # No transaction is open here: a failure after the provider
+            # accepted the payment can't roll it back to 'queued'
+            try:
+                reference = self.client.request_payment({
+                    'id': payment_id, 'phone_number': phone_number, 'amount': amount, 'purpose': purpose,
+                }, idempotency_key=str(payment_id))
+                error = None
+            except Exception as e:
+                self.stats['request_errors'] += 1
+                error = e
+
+            try:
+                if error is None:
+                    self._in_transaction(lambda cur: self._submitted(cur, payment_id, reference))
+                else:
+                    self._in_transaction(lambda cur: self._request_failed(cur, payment_id, attempts, error))
+            except Exception:
+                # Stays 'submitting' and is claimed again once its lease is up
+                log.exception("payment_submit_not_recorded", provider=self.provider, payment_id=payment_id)
+        return len(claimed)
+
+    def _claim(self, cur):
+        """Move due payments to 'submitting' for submit_lease seconds"""
+        cur.execute("""
+            UPDATE payments
+            SET status = 'submitting', attempts = attempts + 1,
+                next_poll_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second', updated_at = CURRENT_TIMESTAMP
+            WHERE id IN (
+                SELECT id
+                FROM payments
+                WHERE provider = %s AND status IN ('queued', 'submitting') AND next_poll_at <= CURRENT_TIMESTAMP
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, phone_number, amount, purpose, attempts
+        """, (self.submit_lease, self.provider, self.batch_size))
+        return cur.fetchall()
+
+    def _submitted(self, cur, payment_id, reference):
+        cur.execute("""
+            UPDATE payments
+            SET status = 'processing', transaction_id = %s, last_error = NULL,
+                next_poll_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second', updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'submitting'
+        """, (reference, self.poll_interval, payment_id))
+        self.stats['submitted'] += 1
+
+    def _request_failed(self, cur, payment_id, attempts, error):
+        if attempts >= self.max_attempts:
+            self._finish(cur, payment_id, 'failed')
+            return
+        cur.execute("""
+            UPDATE payments
+            SET status = 'queued', last_error = %s,
+                next_poll_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second', updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'submitting'
+        """, (str(error), self.poll_interval * 2 ** (attempts - 1), payment_id))
+
+    def _poll(self, cur):
+        cur.execute("""
+            SELECT id, transaction_id, created_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+            FROM payments
+            WHERE provider = %s AND status = 'processing' AND next_poll_at <= CURRENT_TIMESTAMP
+            ORDER BY next_poll_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (self.timeout, self.provider, self.batch_size))
+        rows = cur.fetchall()
+
+        for payment_id, reference, expired in rows:
+            try:
+                status = self.client.check_status(reference)
+                error = None
+            except Exception as e:
+                status, error = 'pending', str(e)
+
+            if status in ('completed', 'failed'):
+                self._finish(cur, payment_id, status)
+            elif expired:
+                self._finish(cur, payment_id, 'failed')
+            else:
+                cur.execute("""
+                    UPDATE payments
+                    SET last_error = %s, next_poll_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                    WHERE id = %s
+                """, (error, self.poll_interval, payment_id))
+        return len(rows)
+
+    def _finish(self, cur, payment_id, status):
+        if complete_payment(cur, status, payment_id=payment_id):
+            self.stats[status] += 1
@@ -0,0 +1,120 @@
+# services/profile_cache.py
+"""
+Process-wide cache of resolved seeker and employer profiles.
+
+Nearly every hop of a session looks the caller up by phone number: the
+main menu to pick a dashboard, the dashboards for the name on screen,
+job posting for the employer id. Profiles only change when the caller
+registers or updates one, so each worker keeps the (id, name) it read
+per phone number and role, for at most PROFILE_CACHE_TTL seconds and
+dropping the least recently used past PROFILE_CACHE_SIZE entries.
+
+Only complete profiles are cached: a phone that hasn't registered is
+looked up on every hop, so a registration made through another worker
+is seen on the next one. Registration and profile writes invalidate the
+phone's entries once they commit; a worker that didn't make the write
+shows the old name for at most PROFILE_CACHE_TTL. PROFILE_CACHE_SIZE=0
+turns the cache off.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services import metrics
+
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '60'))
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', '10000'))
+
+LOOKUPS = metrics.counter('jowa_profile_cache_lookups_total', "Profile cache lookups by role and result",
+                          ['role', 'result'])
+INVALIDATIONS = metrics.counter('jowa_profile_cache_invalidations_total',
+                                "Profile cache entries dropped after a profile write")
+
+
+class ProfileCache:
+    """
+    Bounded, TTL'd map of (phone number, role) -> profile row.
+
+    put() takes the generation read before the query, so a profile loaded
+    while an invalidation came in is never stored.
+    """
+
+    ROLES = ('seeker', 'employer')
+
+    def __init__(self, ttl=PROFILE_CACHE_TTL, max_entries=PROFILE_CACHE_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, phone_number, role):
+        if self.max_entries <= 0:
+            return None
+        key = (phone_number, role)
+        now = self._clock()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] <= now:
+                self._entries.pop(key, None)
+                self.stats['misses'] += 1
+                result, profile = 'miss', None
+            else:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                result, profile = 'hit', item[1]
+        LOOKUPS.inc(role=role, result=result)
+        return profile
+
+    def put(self, phone_number, role, profile, generation):
+        if self.max_entries <= 0:
+            return
+        key = (phone_number, role)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (self._clock() + self.ttl, profile)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, phone_number):
+        """Drop both of this phone's profiles; call once the write has committed"""
+        with self._lock:
+            self.generation += 1
+            for role in self.ROLES:
+                self._entries.pop((phone_number, role), None)
+            self.stats['invalidations'] += 1
+        INVALIDATIONS.inc()
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_profile_cache():
+    """The process-wide cache"""
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ProfileCache()
+    return _cache
+
+
+def set_profile_cache(cache):
+    """Swap the process-wide cache (tests, scripts)"""
+    global _cache
+    _cache = cache
@@ -0,0 +1,258 @@
+# services/profiler.py
+"""
+Sampled stack profiling of live USSD traffic, switched on at runtime.
+
+    POST /admin/profile  percent=10 seconds=60    (Authorization: Bearer <ADMIN_TOKEN>)
+    GET  /admin/profile  > jowa.collapsed          (flamegraph.pl / speedscope / inferno)
+
+start() writes a control file to PROFILE_DIR, which every gunicorn
+worker checks at most once a second. While the window is open, each
+worker picks `percent` of its PROFILE_ROUTES requests; a sampler thread
+then records the stack of every thread busy with a picked request every
+PROFILE_INTERVAL seconds. Stacks are aggregated per worker and written to
+PROFILE_DIR/<profile id>/<pid>.collapsed as collapsed stacks ("a;b;c 12"
+per line), during the window and when it closes; collect() adds up the
+workers' files.
+
+Stack sampling rather than cProfile: it costs the picked requests
+nothing but the GIL for a few microseconds per sample, and what it
+records is whole stacks, which is what a flame graph needs.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from services.log import get_logger
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', '') or os.path.join(tempfile.gettempdir(), 'jowa-profiles')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.005'))
+PROFILE_FLUSH_INTERVAL = float(os.getenv('PROFILE_FLUSH_INTERVAL', '5'))
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '600'))
+PROFILE_ROUTES = ('/at-ussd', '/ussd')
+
+CONTROL_FILE = 'control.json'
+CONTROL_CHECK_INTERVAL = 1.0
+
+log = get_logger(__name__)
+
+_lock = threading.Lock()
+# Held while a worker's file is written: the sampler and GET /admin/profile both flush
+_flush_lock = threading.Lock()
+_threads = set()        # idents of threads busy with a picked request
+_counts = Counter()     # collapsed stack -> samples, for _profile_id
+_profile_id = None
+_sampler_pid = None
+_control = {'checked': 0.0, 'mtime': None, 'value': None}
+
+
+def _write_atomically(path, text):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # A temp file of its own per call, so concurrent writers never share one
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def start(percent, seconds, directory=None):
+    """Profile percent of PROFILE_ROUTES requests on every worker for the next seconds"""
+    percent = max(0.0, min(100.0, float(percent)))
+    seconds = max(1, min(PROFILE_MAX_SECONDS, int(seconds)))
+    now = time.time()
+    control = {
+        'id': datetime.fromtimestamp(now).strftime('%Y%m%dT%H%M%S') + f"-{os.urandom(3).hex()}",
+        'percent': percent,
+        'started': now,
+        'until': now + seconds,
+    }
+    _write_atomically(os.path.join(directory or PROFILE_DIR, CONTROL_FILE), json.dumps(control))
+    _forget_control()
+    log.info("profile_started", profile_id=control['id'], percent=percent, seconds=seconds)
+    return control
+
+
+def stop(directory=None):
+    """Close the current window early; returns its control, or None"""
+    control = read_control(directory)
+    if control is None:
+        return None
+    control['until'] = min(control['until'], time.time())
+    _write_atomically(os.path.join(directory or PROFILE_DIR, CONTROL_FILE), json.dumps(control))
+    _forget_control()
+    log.info("profile_stopped", profile_id=control['id'])
+    return control
+
+
+def read_control(directory=None):
+    try:
+        with open(os.path.join(directory or PROFILE_DIR, CONTROL_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _forget_control():
+    _control['checked'] = 0.0
+
+
+def active_control():
+    """The open window's control, re-reading the file at most once per CONTROL_CHECK_INTERVAL"""
+    clock = time.monotonic()
+    if clock - _control['checked'] >= CONTROL_CHECK_INTERVAL:
+        _control['checked'] = clock
+        try:
+            mtime = os.stat(os.path.join(PROFILE_DIR, CONTROL_FILE)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != _control['mtime']:
+            _control['mtime'] = mtime
+            _control['value'] = read_control() if mtime is not None else None
+    control = _control['value']
+    if control is None or time.time() >= control['until']:
+        return None
+    return control
+
+
+def begin_request(route, rand=random.random):
+    """Pick this request for sampling if a window is open and it's one of PROFILE_ROUTES"""
+    if route not in PROFILE_ROUTES:
+        return False
+    control = active_control()
+    if control is None or rand() * 100 >= control['percent']:
+        return False
+    with _lock:
+        _threads.add(threading.get_ident())
+    _ensure_sampler()
+    return True
+
+
+def end_request():
+    if _threads:
+        with _lock:
+            _threads.discard(threading.get_ident())
+
+
+def collapse(frame):
+    """'file:function;file:function...' from the outermost frame in"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def render(counts):
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def parse(text):
+    counts = Counter()
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack and count.isdigit():
+            counts[stack] += int(count)
+    return counts
+
+
+def _path(profile_id, pid, directory=None):
+    return os.path.join(directory or PROFILE_DIR, profile_id, f"{pid}.collapsed")
+
+
+def flush():
+    """Write this worker's samples of the current profile"""
+    with _flush_lock:
+        with _lock:
+            profile_id, counts = _profile_id, Counter(_counts)
+        if profile_id and counts:
+            _write_atomically(_path(profile_id, os.getpid()), render(counts))
+
+
+def collect(profile_id=None, directory=None):
+    """(profile id, samples added up over every worker) of profile_id, by default the latest profile"""
+    directory = directory or PROFILE_DIR
+    if profile_id is None:
+        control = read_control(directory)
+        profile_id = control['id'] if control else None
+    counts = Counter()
+    if profile_id:
+        # Ids are a timestamp and a random suffix, never paths
+        profile_dir = os.path.join(directory, os.path.basename(profile_id))
+        for name in sorted(os.listdir(profile_dir)) if os.path.isdir(profile_dir) else ():
+            if name.endswith('.collapsed'):
+                with open(os.path.join(profile_dir, name), encoding='utf-8') as f:
+                    counts.update(parse(f.read()))
+    return profile_id, counts
+
+
+def _ensure_sampler():
+    # One sampler per process while a window is open; forked workers start their own
+    global _sampler_pid
+
+    if _sampler_pid == os.getpid():
+        return
+    with _lock:
+        if _sampler_pid == os.getpid():
+            return
+        _sampler_pid = os.getpid()
+    threading.Thread(target=_sample_until_closed, name='profile-sampler', daemon=True).start()
+
+
+def _switch_profile(profile_id):
+    global _profile_id
+    flush()
+    with _lock:
+        _profile_id = profile_id
+        _counts.clear()
+
+
+def sample():
+    """
+    One sampling pass: record the stack of every thread busy with a picked
+    request. Returns False once the window has closed.
+    """
+    control = active_control()
+    if control is None:
+        return False
+    if control['id'] != _profile_id:
+        _switch_profile(control['id'])
+
+    frames = sys._current_frames()
+    with _lock:
+        for ident in _threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                _counts[collapse(frame)] += 1
+    del frames
+    return True
+
+
+def _sample_until_closed():
+    global _sampler_pid
+
+    flushed = time.monotonic()
+    try:
+        while sample():
+            time.sleep(PROFILE_INTERVAL)
+            if time.monotonic() - flushed >= PROFILE_FLUSH_INTERVAL:
+                flushed = time.monotonic()
+                flush()
+        flush()
+    except Exception:
+        log.exception("profile_sampler_failed", profile_id=_profile_id)
+    finally:
+        # Always, or _ensure_sampler would never start another in this worker
+        with _lock:
+            _sampler_pid = None
+            _threads.clear()
@@ -0,0 +1,160 @@
+# services/query_audit.py
+"""
+Per-request query audit: duplicate queries, N+1 shapes and query budgets.
+
+metrics.TimedCursor records the SQL and parameters of every query a
+request runs; when the request ends, audit() looks at them:
+
+- a duplicate is the same statement with the same parameters run twice
+  in one request - the second run can only return what the first did,
+  unless the request wrote in between, so it is almost always a lookup
+  that should have been passed along;
+- a repeated shape is one fingerprint (the SQL with its literals and
+  whitespace normalised) run REPEATED_QUERY_THRESHOLD or more times with
+  different parameters - the signature of a query in a loop (N+1);
+- a budget is the most queries a request may run, declared per USSD
+  menu_level or per route (set_budgets, see HOP_QUERY_BUDGETS in app.py).
+
+QUERY_AUDIT picks what happens to findings:
+
+    off     nothing is recorded
+    log     warnings in the log and jowa_query_audit_findings_total (default)
+    strict  as log, and the findings are kept in violations() - the test
+            suite fails on any (conftest.py)
+"""
+import functools
+import os
+import re
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+from services import metrics
+from services.log import get_logger
+
+QUERY_AUDIT = os.getenv('QUERY_AUDIT', 'log').lower()
+REPEATED_QUERY_THRESHOLD = int(os.getenv('REPEATED_QUERY_THRESHOLD', '3'))
+
+log = get_logger(__name__)
+
+FINDINGS = metrics.counter('jowa_query_audit_findings_total',
+                           "Duplicate queries, repeated query shapes and blown query budgets",
+                           ['kind', 'route', 'menu_level'])
+
+Finding = namedtuple('Finding', ['kind', 'route', 'menu_level', 'sql', 'count', 'budget'])
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_VALUES = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_SPACE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_menu_budgets = {}
+_route_budgets = {}
+_violations = []
+_mode = QUERY_AUDIT
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    The statement's shape: literals and placeholders become ?, multi-row
+    VALUES lists collapse to one row, whitespace to single spaces.
+    """
+    if sql is None:
+        return None
+    shape = _STRING.sub('?', sql)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _VALUES.sub('(...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def set_budgets(menu_levels=None, routes=None):
+    """Replace the query budgets: {menu_level: queries} and {route: queries}"""
+    with _lock:
+        _menu_budgets.clear()
+        _menu_budgets.update(menu_levels or {})
+        _route_budgets.clear()
+        _route_budgets.update(routes or {})
+
+
+def budget_for(route, menu_level=None):
+    """A USSD hop's menu_level budget, else the route's, else None"""
+    if menu_level is not None and menu_level in _menu_budgets:
+        return _menu_budgets[menu_level]
+    return _route_budgets.get(route)
+
+
+def audit(record):
+    """Findings for one metrics.RequestRecord"""
+    # fingerprint -> how often each parameter set ran
+    runs = defaultdict(Counter)
+    for statement in record.statements or ():
+        if statement.sql is not None:
+            runs[fingerprint(statement.sql)][repr(statement.params)] += 1
+
+    findings = []
+    for shape, by_params in runs.items():
+        most = max(by_params.values())
+        if most > 1:
+            findings.append(Finding('duplicate', record.route, record.menu_level, shape, most, None))
+        if len(by_params) >= REPEATED_QUERY_THRESHOLD:
+            findings.append(Finding('repeated', record.route, record.menu_level, shape,
+                                    sum(by_params.values()), None))
+
+    budget = budget_for(record.route, record.menu_level)
+    if budget is not None and record.queries > budget:
+        findings.append(Finding('over_budget', record.route, record.menu_level, None, record.queries, budget))
+    return findings
+
+
+def set_mode(mode):
+    global _mode
+    if mode not in ('off', 'log', 'strict'):
+        raise ValueError(f"QUERY_AUDIT must be off, log or strict, not {mode!r}")
+    _mode = mode
+
+
+def get_mode():
+    return _mode
+
+
+def violations():
+    """Findings kept in strict mode"""
+    with _lock:
+        return list(_violations)
+
+
+def clear_violations():
+    with _lock:
+        _violations.clear()
+
+
+def format_finding(finding):
+    where = finding.route if finding.menu_level is None else f"{finding.route} {finding.menu_level}"
+    if finding.kind == 'over_budget':
+        return f"{where}: {finding.count} queries, budget {finding.budget}"
+    if finding.kind == 'duplicate':
+        return f"{where}: same query run {finding.count} times: {finding.sql}"
+    return f"{where}: one query shape run {finding.count} times (N+1?): {finding.sql}"
+
+
+def _on_request(record):
+    if _mode == 'off':
+        return
+    findings = audit(record)
+    for finding in findings:
+        FINDINGS.inc(kind=finding.kind, route=finding.route, menu_level=finding.menu_level or '')
+        if finding.kind == 'over_budget':
+            log.warning("query_budget_exceeded", route=finding.route, menu_level=finding.menu_level,
+                        queries=finding.count, budget=finding.budget)
+        else:
+            log.warning(f"{finding.kind}_query", route=finding.route, menu_level=finding.menu_level,
+                        count=finding.count, sql=finding.sql)
+    if findings and _mode == 'strict':
+        with _lock:
+            _violations.extend(findings)
+
+
+metrics.add_request_listener(_on_request)
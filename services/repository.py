@@ -0,0 +1,386 @@
+# services/repository.py
+"""
+Every query of the USSD request path, in one place.
+
+Handlers call these functions with the hop's cursor instead of writing
+SQL, so each lookup exists once and is tuned here. Rows come back as
+namedtuples, which unpack like the plain tuples they replace.
+
+Queries declared with prepare=True run as server-side prepared
+statements: the first use on a pooled connection sends
+PREPARE jowa_<name> AS ..., later uses only EXECUTE jowa_<name> (...),
+so PostgreSQL parses and plans them once per connection instead of once
+per hop. The PREPARE goes over the raw connection, not the hop's timed
+cursor - it is per connection, not per hop, and isn't counted against
+any hop's query budget. Only cursors of a pool with prepared_statements
+(services/db_pool.py, DB_PREPARED_STATEMENTS) prepare; any other cursor
+runs the plain SQL.
+"""
+import re
+from collections import namedtuple
+
+from services import pagination
+
+SessionRow = namedtuple('SessionRow', ['menu_level', 'data'])
+ProfileRow = namedtuple('ProfileRow', ['id', 'name'])
+JobRow = namedtuple('JobRow', ['id', 'title', 'location', 'payment_amount', 'payment_type', 'company_name',
+                               'created_at'])
+ApplicationRow = namedtuple('ApplicationRow', ['job_title', 'company_name', 'status', 'applied_at', 'id'])
+AppliedRow = namedtuple('AppliedRow', ['id', 'employer_phone'])
+EmployerJobRow = namedtuple('EmployerJobRow', ['title', 'status', 'application_count'])
+JobApplicationRow = namedtuple('JobApplicationRow', ['applicant_name', 'job_title', 'applied_at', 'applicant_phone'])
+PaymentRow = namedtuple('PaymentRow', ['purpose', 'amount', 'status', 'created_at', 'transaction_id', 'id'])
+PaymentStatusRow = namedtuple('PaymentStatusRow', ['status', 'amount', 'phone_number', 'purpose'])
+PaymentSessionRow = namedtuple('PaymentSessionRow', ['amount', 'provider', 'purpose'])
+
+_PLACEHOLDER = re.compile(r'%s')
+
+
+class Query:
+    __slots__ = ('name', 'sql', 'prepare', 'prepare_sql', 'execute_sql')
+
+    def __init__(self, name, sql, prepare=False):
+        self.name = f"jowa_{name}"
+        self.sql = ' '.join(sql.split())
+        self.prepare = prepare
+        numbers = iter(range(1, self.sql.count('%s') + 1))
+        self.prepare_sql = f"PREPARE {self.name} AS " + _PLACEHOLDER.sub(lambda match: f"${next(numbers)}", self.sql)
+        arguments = ', '.join(['%s'] * self.sql.count('%s'))
+        self.execute_sql = f"EXECUTE {self.name} ({arguments})" if arguments else f"EXECUTE {self.name}"
+
+
+def _paged(name, sql, created_column, id_column):
+    """One Query per keyset bound operator of services/pagination.py ({after} marks the spot)"""
+    queries = {None: Query(name, sql.format(after=''), prepare=True)}
+    for operator, suffix in (('<', 'after'), ('<=', 'from')):
+        after, _ = pagination.keyset_clause(created_column, id_column, (operator, (None, None)))
+        queries[operator] = Query(f"{name}_{suffix}", sql.format(after=after), prepare=True)
+    return queries
+
+
+def _execute(cur, query, params=()):
+    prepared = getattr(cur, 'prepared', None) if query.prepare else None
+    if prepared is None:
+        cur.execute(query.sql, params)
+        return
+    if query.name not in prepared:
+        raw = cur.connection.cursor()
+        try:
+            raw.execute(query.prepare_sql)
+        finally:
+            raw.close()
+        prepared.add(query.name)
+    cur.execute(query.execute_sql, params)
+
+
+def _one(cur, row_type=None):
+    row = cur.fetchone()
+    if row is None or row_type is None:
+        return row
+    return row_type._make(row)
+
+
+def _all(cur, row_type):
+    return [row_type._make(row) for row in cur.fetchall()]
+
+
+def _paged_params(params, bound):
+    if bound is None:
+        return params
+    operator, (created_at, row_id) = bound
+    return params + (created_at, row_id)
+
+
+# Sessions
+
+READ_SESSION = Query('read_session', "SELECT menu_level, data FROM ussd_sessions WHERE session_id = %s",
+                     prepare=True)
+UPDATE_SESSION = Query('update_session', """
+    UPDATE ussd_sessions
+    SET menu_level = %s, data = %s, updated_at = CURRENT_TIMESTAMP
+    WHERE session_id = %s
+""", prepare=True)
+UPSERT_SESSION = Query('upsert_session', """
+    INSERT INTO ussd_sessions (session_id, phone_number, menu_level, data)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (session_id) DO UPDATE SET
+    menu_level = EXCLUDED.menu_level,
+    data = EXCLUDED.data,
+    updated_at = CURRENT_TIMESTAMP
+""", prepare=True)
+
+
+def read_session(cur, session_id):
+    _execute(cur, READ_SESSION, (session_id,))
+    return _one(cur, SessionRow)
+
+
+def write_session(cur, session_id, phone_number, menu_level, data_json):
+    """Upsert one ussd_sessions row; without a phone_number the row must exist"""
+    if phone_number is None:
+        _execute(cur, UPDATE_SESSION, (menu_level, data_json, session_id))
+    else:
+        _execute(cur, UPSERT_SESSION, (session_id, phone_number, menu_level, data_json))
+
+
+def write_sessions(cur, rows):
+    """Upsert many (session_id, phone_number, menu_level, data_json) rows"""
+    cur.executemany(UPSERT_SESSION.sql, rows)
+
+
+# People
+
+USER_PROFILE = Query('user_profile', "SELECT id, full_name FROM users WHERE phone_number = %s", prepare=True)
+EMPLOYER_PROFILE = Query('employer_profile', "SELECT id, company_name FROM employers WHERE phone_number = %s",
+                         prepare=True)
+USER_EXISTS = Query('user_exists', "SELECT phone_number FROM users WHERE phone_number = %s", prepare=True)
+CREATE_USER = Query('create_user', "INSERT INTO users (phone_number) VALUES (%s) ON CONFLICT DO NOTHING",
+                    prepare=True)
+SAVE_SEEKER = Query('save_seeker', """
+    INSERT INTO users (phone_number, full_name, skills, location)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (phone_number) DO UPDATE SET
+    full_name = EXCLUDED.full_name,
+    skills = EXCLUDED.skills,
+    location = EXCLUDED.location
+    RETURNING id
+""")
+SAVE_EMPLOYER = Query('save_employer', """
+    INSERT INTO employers (phone_number, company_name, business_type)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (phone_number) DO UPDATE SET
+    company_name = EXCLUDED.company_name,
+    business_type = EXCLUDED.business_type
+    RETURNING id
+""")
+
+
+def user_profile(cur, phone_number):
+    """(id, full_name) of the user with this phone, or None if there is no user row"""
+    _execute(cur, USER_PROFILE, (phone_number,))
+    return _one(cur, ProfileRow)
+
+
+def employer_profile(cur, phone_number):
+    """(id, company_name) of the employer with this phone, or None"""
+    _execute(cur, EMPLOYER_PROFILE, (phone_number,))
+    return _one(cur, ProfileRow)
+
+
+def user_exists(cur, phone_number):
+    _execute(cur, USER_EXISTS, (phone_number,))
+    return cur.fetchone() is not None
+
+
+def create_user(cur, phone_number):
+    _execute(cur, CREATE_USER, (phone_number,))
+
+
+def save_seeker(cur, phone_number, full_name, skills, location):
+    """Create or update the seeker profile; returns the user id"""
+    _execute(cur, SAVE_SEEKER, (phone_number, full_name, skills, location))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def save_employer(cur, phone_number, company_name, business_type):
+    """Create or update the employer profile; returns the employer id"""
+    _execute(cur, SAVE_EMPLOYER, (phone_number, company_name, business_type))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+# Jobs and applications
+
+JOBS_PAGE = _paged('jobs_page', """
+    SELECT j.id, j.title, j.location, j.payment_amount, j.payment_type, e.company_name, j.created_at
+    FROM jobs j
+    JOIN employers e ON j.employer_id = e.id
+    WHERE j.status = 'active' {after}
+    ORDER BY j.created_at DESC, j.id DESC
+    LIMIT 3
+""", 'j.created_at', 'j.id')
+APPLY = Query('apply', """
+    INSERT INTO applications (job_id, user_id, status)
+    SELECT %s, id, 'pending' FROM users WHERE phone_number = %s
+    ON CONFLICT (job_id, user_id) DO NOTHING
+    RETURNING id, (
+        SELECT e.phone_number FROM employers e JOIN jobs ON jobs.employer_id = e.id
+        WHERE jobs.id = applications.job_id
+    )
+""")
+APPLICATIONS_PAGE = _paged('applications_page', """
+    SELECT j.title, e.company_name, a.status, a.applied_at, a.id
+    FROM applications a
+    JOIN jobs j ON a.job_id = j.id
+    JOIN employers e ON j.employer_id = e.id
+    WHERE a.user_id = (SELECT id FROM users WHERE phone_number = %s) {after}
+    ORDER BY a.applied_at DESC, a.id DESC
+    LIMIT 5
+""", 'a.applied_at', 'a.id')
+INSERT_JOB = Query('insert_job', """
+    INSERT INTO jobs (employer_id, title, description, location, payment_amount, payment_type)
+    VALUES (%s, %s, %s, %s, %s, %s)
+""")
+EMPLOYER_JOBS = Query('employer_jobs', """
+    SELECT j.title, j.status, COUNT(a.id) as applications
+    FROM jobs j
+    LEFT JOIN applications a ON j.id = a.job_id
+    WHERE j.employer_id = (SELECT id FROM employers WHERE phone_number = %s)
+    GROUP BY j.id, j.title, j.status
+    ORDER BY j.created_at DESC
+    LIMIT 5
+""")
+EMPLOYER_APPLICATIONS = Query('employer_applications', """
+    SELECT u.full_name, j.title, a.applied_at, u.phone_number
+    FROM applications a
+    JOIN jobs j ON a.job_id = j.id
+    JOIN users u ON a.user_id = u.id
+    WHERE j.employer_id = (SELECT id FROM employers WHERE phone_number = %s)
+    ORDER BY a.applied_at DESC
+    LIMIT 5
+""")
+
+
+def jobs_page(cur, bound):
+    """Up to 3 active jobs, newest first, from a services/pagination.py bound"""
+    _execute(cur, JOBS_PAGE[bound[0] if bound else None], _paged_params((), bound))
+    return _all(cur, JobRow)
+
+
+def apply(cur, job_id, phone_number):
+    """The new application, or None if this phone had already applied (or isn't a user)"""
+    _execute(cur, APPLY, (job_id, phone_number))
+    return _one(cur, AppliedRow)
+
+
+def applications_page(cur, phone_number, bound):
+    _execute(cur, APPLICATIONS_PAGE[bound[0] if bound else None], _paged_params((phone_number,), bound))
+    return _all(cur, ApplicationRow)
+
+
+def insert_job(cur, employer_id, title, description, location, payment_amount, payment_type):
+    _execute(cur, INSERT_JOB, (employer_id, title, description, location, payment_amount, payment_type))
+
+
+def employer_jobs(cur, phone_number):
+    _execute(cur, EMPLOYER_JOBS, (phone_number,))
+    return _all(cur, EmployerJobRow)
+
+
+def employer_applications(cur, phone_number):
+    _execute(cur, EMPLOYER_APPLICATIONS, (phone_number,))
+    return _all(cur, JobApplicationRow)
+
+
+# Payments
+
+CREATE_PAYMENT = Query('create_payment', """
+    INSERT INTO payments (session_id, phone_number, amount, purpose, description, status)
+    VALUES (%s, %s, %s, %s, %s, 'initiated')
+    RETURNING id
+""")
+PAYMENT_BY_TRANSACTION = Query('payment_by_transaction', """
+    SELECT status, amount, phone_number, purpose
+    FROM payments
+    WHERE transaction_id = %s
+""")
+SAVE_PAYMENT_SESSION = Query('save_payment_session', """
+    INSERT INTO payment_sessions (session_id, phone_number, amount, provider, purpose, status)
+    VALUES (%s, %s, %s, %s, %s, 'pending')
+    ON CONFLICT (session_id) DO UPDATE SET
+    phone_number = EXCLUDED.phone_number,
+    amount = EXCLUDED.amount,
+    provider = EXCLUDED.provider,
+    purpose = EXCLUDED.purpose,
+    status = 'pending',
+    updated_at = CURRENT_TIMESTAMP
+""")
+SAVE_PREMIUM_SESSION = Query('save_premium_session', """
+    INSERT INTO payment_sessions (session_id, phone_number, amount, purpose, status)
+    VALUES (%s, %s, %s, 'Premium Job Posting', 'premium_job')
+    ON CONFLICT (session_id) DO UPDATE SET
+    phone_number = EXCLUDED.phone_number,
+    amount = EXCLUDED.amount,
+    purpose = EXCLUDED.purpose,
+    status = 'premium_job',
+    updated_at = CURRENT_TIMESTAMP
+""")
+PENDING_PAYMENT_SESSION = Query('pending_payment_session', """
+    SELECT amount, provider, purpose
+    FROM payment_sessions
+    WHERE session_id = %s AND status = 'pending'
+""")
+CANCEL_PAYMENT_SESSION = Query('cancel_payment_session', """
+    UPDATE payment_sessions
+    SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+    WHERE session_id = %s
+""")
+CANCEL_PAYMENT = Query('cancel_payment', """
+    UPDATE payments
+    SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP
+    WHERE session_id = %s AND status = 'initiated'
+""")
+PAYMENTS_PAGE = _paged('payments_page', """
+    SELECT purpose, amount, status, created_at, transaction_id, id
+    FROM payments
+    WHERE phone_number = %s {after}
+    ORDER BY created_at DESC, id DESC
+    LIMIT 5
+""", 'created_at', 'id')
+TOTAL_REVENUE = Query('total_revenue', """
+    SELECT COALESCE(SUM(completed_amount), 0) as total_revenue
+    FROM payment_daily_rollup
+""")
+DAILY_TRANSACTIONS = Query('daily_transactions', """
+    SELECT COALESCE(SUM(completed_count), 0) as count, COALESCE(SUM(completed_amount), 0) as amount
+    FROM payment_daily_rollup
+    WHERE day = CURRENT_DATE
+""")
+
+
+def create_payment(cur, session_id, phone_number, amount, purpose, description):
+    """The new payment's id"""
+    _execute(cur, CREATE_PAYMENT, (session_id, phone_number, amount, purpose, description))
+    return cur.fetchone()[0]
+
+
+def payment_by_transaction(cur, transaction_id):
+    _execute(cur, PAYMENT_BY_TRANSACTION, (transaction_id,))
+    return _one(cur, PaymentStatusRow)
+
+
+def save_payment_session(cur, session_id, phone_number, amount, provider, purpose):
+    _execute(cur, SAVE_PAYMENT_SESSION, (session_id, phone_number, amount, provider, purpose))
+
+
+def save_premium_session(cur, session_id, phone_number, amount):
+    _execute(cur, SAVE_PREMIUM_SESSION, (session_id, phone_number, amount))
+
+
+def pending_payment_session(cur, session_id):
+    _execute(cur, PENDING_PAYMENT_SESSION, (session_id,))
+    return _one(cur, PaymentSessionRow)
+
+
+def cancel_payment(cur, session_id):
+    """Cancel the session's payment, unless it has already gone to the provider"""
+    _execute(cur, CANCEL_PAYMENT_SESSION, (session_id,))
+    _execute(cur, CANCEL_PAYMENT, (session_id,))
+
+
+def payments_page(cur, phone_number, bound):
+    _execute(cur, PAYMENTS_PAGE[bound[0] if bound else None], _paged_params((phone_number,), bound))
+    return _all(cur, PaymentRow)
+
+
+def total_revenue(cur):
+    _execute(cur, TOTAL_REVENUE)
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def daily_transactions(cur):
+    """(count, amount) of today's completed payments"""
+    _execute(cur, DAILY_TRANSACTIONS)
+    return cur.fetchone()
@@ -0,0 +1,314 @@
+# services/session_store.py
+import abc
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # optional - only needed for SESSION_STORE=redis
+    redis = None
+
+from services import repository
+from services.db_pool import get_worker_count
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', '180'))
+
+
+def read_session_row(cur, session_id):
+    """Read (menu_level, data) straight from ussd_sessions"""
+    row = repository.read_session(cur, session_id)
+    if not row:
+        return None
+
+    menu_level, data_json = row
+    if isinstance(data_json, dict):
+        return menu_level, data_json
+    return menu_level, json.loads(data_json) if data_json else {}
+
+
+def write_session_row(cur, session_id, phone_number, menu_level, data):
+    """Upsert one ussd_sessions row"""
+    repository.write_session(cur, session_id, phone_number, menu_level, json.dumps(data))
+
+
+class SessionStore(abc.ABC):
+    """
+    Where live USSD session state (menu_level + data) is kept between hops.
+
+    transactional stores write through the hop's cursor before it commits;
+    the others are updated after the commit and mirror state to
+    ussd_sessions asynchronously through a SessionWriteBehind.
+    """
+
+    transactional = False
+
+    @abc.abstractmethod
+    def get(self, session_id, cur=None):
+        """(menu_level, data) of the session, or None"""
+
+    @abc.abstractmethod
+    def put(self, session_id, phone_number, menu_level, data, cur=None):
+        """Store the session's state; cur is the hop's, for transactional stores"""
+
+    @abc.abstractmethod
+    def delete(self, session_id):
+        """Forget the session (it ended)"""
+
+
+class DatabaseSessionStore(SessionStore):
+    """Synchronous ussd_sessions reads and writes (the original behaviour)"""
+
+    transactional = True
+
+    def get(self, session_id, cur=None):
+        return read_session_row(cur, session_id)
+
+    def put(self, session_id, phone_number, menu_level, data, cur=None):
+        write_session_row(cur, session_id, phone_number, menu_level, data)
+
+    def delete(self, session_id):
+        pass
+
+
+class _MirroredStore(SessionStore):
+    """Shared miss fallback and write-behind plumbing for the non-SQL stores"""
+
+    def __init__(self, write_behind=None):
+        self.write_behind = write_behind
+
+    def get(self, session_id, cur=None):
+        state = self._get(session_id)
+        if state is None and cur is not None:
+            # Sessions begun before a restart (or mirrored by another worker)
+            state = read_session_row(cur, session_id)
+        return state
+
+    def put(self, session_id, phone_number, menu_level, data, cur=None):
+        self._put(session_id, phone_number, menu_level, data)
+        if self.write_behind is not None:
+            self.write_behind.enqueue(session_id, phone_number, menu_level, data)
+
+    @abc.abstractmethod
+    def _get(self, session_id):
+        """(menu_level, data) from this store only, or None"""
+
+    @abc.abstractmethod
+    def _put(self, session_id, phone_number, menu_level, data):
+        pass
+
+
+class MemorySessionStore(_MirroredStore):
+    """
+    In-process dict with a TTL. Only correct when every hop of a session
+    reaches the same process, i.e. a single gunicorn worker.
+    """
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, write_behind=None, clock=time.monotonic):
+        super().__init__(write_behind)
+        self.ttl = ttl
+        self._clock = clock
+        self._items = {}
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + ttl
+
+    def _get(self, session_id):
+        now = self._clock()
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is None:
+                return None
+            expires_at, menu_level, data = item
+            if expires_at <= now:
+                del self._items[session_id]
+                return None
+            return menu_level, json.loads(data)
+
+    def _put(self, session_id, phone_number, menu_level, data):
+        now = self._clock()
+        # Stored serialized so callers can't mutate the cached copy
+        item = (now + self.ttl, menu_level, json.dumps(data))
+        with self._lock:
+            self._items[session_id] = item
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._items.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._items)
+
+    def _sweep(self, now):
+        expired = [key for key, item in self._items.items() if item[0] <= now]
+        for key in expired:
+            del self._items[key]
+        self._next_sweep = now + self.ttl
+
+
+class RedisSessionStore(_MirroredStore):
+    """
+    Session state in Redis (or anything speaking its protocol), shared by
+    every worker. client only needs get/set(ex=)/delete.
+    """
+
+    key_prefix = 'jowa:ussd:'
+
+    def __init__(self, client, ttl=SESSION_TTL_SECONDS, write_behind=None):
+        super().__init__(write_behind)
+        self.client = client
+        self.ttl = ttl
+
+    def _get(self, session_id):
+        raw = self.client.get(self.key_prefix + session_id)
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        menu_level, data = json.loads(raw)
+        return menu_level, data
+
+    def _put(self, session_id, phone_number, menu_level, data):
+        self.client.set(self.key_prefix + session_id, json.dumps([menu_level, data]), ex=self.ttl)
+
+    def delete(self, session_id):
+        self.client.delete(self.key_prefix + session_id)
+
+
+class SessionWriteBehind:
+    """
+    Mirrors session changes to ussd_sessions from a background thread.
+
+    The table is kept for analytics only, so updates are batched (last
+    state per session wins) and dropped rather than blocking a hop when
+    the queue is full.
+    """
+
+    def __init__(self, connect, interval=1.0, batch_size=200, max_queue=10000):
+        self._connect = connect
+        self.interval = interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'failed_batches': 0}
+
+    def enqueue(self, session_id, phone_number, menu_level, data):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((session_id, phone_number, menu_level, json.dumps(data)))
+            self.stats['enqueued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written"""
+        pending = {}
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending[item[0]] = item
+            if len(pending) >= self.batch_size:
+                self._write(list(pending.values()))
+                pending = {}
+        if pending:
+            self._write(list(pending.values()))
+        return self.stats['written']
+
+    def _ensure_started(self):
+        # One flusher thread per process; forked workers start their own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='session-write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                log.warning("session_write_behind_flush_failed", error=str(e))
+
+    def _write(self, rows):
+        conn = self._connect()
+        if not conn:
+            self.stats['failed_batches'] += 1
+            return
+        cur = conn.cursor()
+        try:
+            repository.write_sessions(cur, rows)
+            conn.commit()
+            self.stats['written'] += len(rows)
+        except Exception as e:
+            conn.rollback()
+            self.stats['failed_batches'] += 1
+            log.warning("session_write_behind_batch_failed", rows=len(rows), error=str(e))
+        finally:
+            cur.close()
+            conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_session_store(connect):
+    """
+    Build the store named by SESSION_STORE (memory, redis or database).
+
+    Without an explicit choice: redis when REDIS_URL is set, memory for a
+    single worker, and the database otherwise so that hops landing on
+    different gunicorn workers still see the same state.
+    """
+    backend = os.getenv('SESSION_STORE', '').lower()
+    redis_url = os.getenv('REDIS_URL')
+
+    if not backend:
+        if redis_url:
+            backend = 'redis'
+        elif get_worker_count() == 1:
+            backend = 'memory'
+        else:
+            backend = 'database'
+
+    if backend == 'redis':
+        if redis is None:
+            raise RuntimeError("SESSION_STORE=redis needs the 'redis' package installed")
+        client = redis.Redis.from_url(redis_url or 'redis://localhost:6379/0')
+        return RedisSessionStore(client, write_behind=SessionWriteBehind(connect))
+
+    if backend == 'memory':
+        return MemorySessionStore(write_behind=SessionWriteBehind(connect))
+
+    return DatabaseSessionStore()
+
+
+def get_session_store():
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from services.db_pool import get_pool
+                _store = create_session_store(lambda: get_pool().getconn())
+    return _store
+
+
+def set_session_store(store):
+    """Swap the process-wide store (tests, scripts)"""
+    global _store
+    _store = store
@@ -0,0 +1,123 @@
+# services/sms_batcher.py
+"""
+Batching layer between the SMS outbox worker and SMSService.
+
+Two ways of sending fewer SMS for the same information:
+
+- identical texts going to different numbers share one multi-recipient
+  API call (and a repeated text to the same number is sent once);
+- outbox rows queued with a digest_key (e.g. one per job application)
+  wait up to SMS_DIGEST_WINDOW seconds, and everything pending for the
+  same phone and key is then merged into a single digest SMS.
+
+stats counts what went out against what would have without batching;
+the same numbers go to /metrics as the jowa_sms_* counters.
+"""
+import os
+from collections import OrderedDict
+
+from services import metrics
+
+SMS_DIGEST_WINDOW = int(os.getenv('SMS_DIGEST_WINDOW', '300'))
+SMS_MAX_RECIPIENTS = int(os.getenv('SMS_MAX_RECIPIENTS', '100'))
+# Three concatenated GSM-7 segments
+DIGEST_MAX_CHARS = 459
+
+MESSAGES = metrics.counter('jowa_sms_messages_total', "Outbox messages handed to the SMS batcher")
+API_CALLS = metrics.counter('jowa_sms_api_calls_total', "SMS API calls")
+SENT = metrics.counter('jowa_sms_sent_total', "SMS the provider accepted")
+SAVED = metrics.counter('jowa_sms_saved_total', "SMS and API calls batching made unnecessary",
+                        ['kind'])
+
+DIGEST_HEADLINES = {
+    'applications': "JOWA: {count} new job applications",
+}
+
+
+def build_digest(digest_key, texts):
+    """One SMS summarising texts; a single text is sent unchanged"""
+    if len(texts) == 1:
+        return texts[0]
+
+    headline = DIGEST_HEADLINES.get(digest_key, "JOWA: {count} new notifications").format(count=len(texts))
+    digest = headline
+    for shown, text in enumerate(texts):
+        line = f"\n- {text}"
+        more = f"\n+{len(texts) - shown} more"
+        if len(digest) + len(line) + len(more) > DIGEST_MAX_CHARS and shown:
+            return digest + more
+        digest += line
+    return digest
+
+
+class SMSBatcher:
+    def __init__(self, sms_service, max_recipients=SMS_MAX_RECIPIENTS):
+        self.sms_service = sms_service
+        self.max_recipients = max_recipients
+        self.stats = {
+            'messages': 0,      # outbox rows handed in
+            'deliveries': 0,    # distinct (number, text) pairs left after coalescing
+            'api_calls': 0,
+            'sms_sent': 0,      # recipients the provider accepted
+            'saved_sms': 0,     # messages - deliveries: folded into digests or duplicates
+            'saved_calls': 0,   # deliveries - api_calls: shared multi-recipient calls
+        }
+
+    def send(self, messages):
+        """
+        Send outbox messages, each an (id, phone_number, text, digest_key).
+
+        Returns {id: None} for accepted messages; failures map to
+        ('rejected', status_code, status) or ('error', description).
+        """
+        outcomes = {}
+        texts = OrderedDict()
+
+        for phone_number, text, ids in self._coalesce(messages):
+            texts.setdefault(text, OrderedDict()).setdefault(phone_number, []).extend(ids)
+
+        deliveries = 0
+        api_calls_before, sent_before = self.stats['api_calls'], self.stats['sms_sent']
+        for text, recipients in texts.items():
+            numbers = list(recipients)
+            deliveries += len(numbers)
+            for start in range(0, len(numbers), self.max_recipients):
+                chunk = numbers[start:start + self.max_recipients]
+                self.stats['api_calls'] += 1
+                try:
+                    rejected = self.sms_service.deliver(chunk, text)
+                except Exception as e:
+                    failures = {number: ('error', str(e)) for number in chunk}
+                else:
+                    failures = {number: ('rejected',) + tuple(rejected[number]) for number in chunk if number in rejected}
+
+                for number in chunk:
+                    if number not in failures:
+                        self.stats['sms_sent'] += 1
+                    for outbox_id in recipients[number]:
+                        outcomes[outbox_id] = failures.get(number)
+
+        api_calls = self.stats['api_calls'] - api_calls_before
+        self.stats['messages'] += len(messages)
+        self.stats['deliveries'] += deliveries
+        self.stats['saved_sms'] = self.stats['messages'] - self.stats['deliveries']
+        self.stats['saved_calls'] = self.stats['deliveries'] - self.stats['api_calls']
+
+        MESSAGES.inc(len(messages))
+        API_CALLS.inc(api_calls)
+        SENT.inc(self.stats['sms_sent'] - sent_before)
+        SAVED.inc(len(messages) - deliveries, kind='sms')
+        SAVED.inc(deliveries - api_calls, kind='api_calls')
+        return outcomes
+
+    def _coalesce(self, messages):
+        """Yield (phone_number, text, ids) after merging digests per phone and key"""
+        digests = OrderedDict()
+        for outbox_id, phone_number, text, digest_key in messages:
+            if digest_key:
+                digests.setdefault((phone_number, digest_key), []).append((outbox_id, text))
+            else:
+                yield phone_number, text, [outbox_id]
+
+        for (phone_number, digest_key), items in digests.items():
+            yield phone_number, build_digest(digest_key, [text for _, text in items]), [i for i, _ in items]
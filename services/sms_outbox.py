@@ -0,0 +1,190 @@
+# services/sms_outbox.py
+"""
+Durable SMS outbox.
+
+Request handlers never call the SMS API. enqueue_sms() inserts a row into
+sms_outbox on the hop's cursor, so the message is committed (or rolled
+back) together with the change it reports. sms_worker.py runs
+SMSOutboxWorker in its own process to drain the table:
+
+- claims due rows in batches with FOR UPDATE SKIP LOCKED, so several
+  workers can run side by side;
+- sends them through SMSBatcher (services/sms_batcher.py), which shares
+  API calls between recipients and merges digest rows;
+- marks accepted messages sent;
+- reschedules failures with exponential backoff;
+- dead-letters messages (status 'dead') after SMS_MAX_ATTEMPTS, or at
+  once when the provider rejects the number outright.
+"""
+import os
+import random
+import time
+
+from services.log import get_logger
+from services.sms_batcher import SMS_DIGEST_WINDOW, SMSBatcher
+from services.sms_service import PERMANENT_STATUS_CODES
+
+log = get_logger(__name__)
+
+SMS_BATCH_SIZE = int(os.getenv('SMS_BATCH_SIZE', '50'))
+SMS_MAX_ATTEMPTS = int(os.getenv('SMS_MAX_ATTEMPTS', '5'))
+SMS_RETRY_BASE_SECONDS = int(os.getenv('SMS_RETRY_BASE_SECONDS', '30'))
+SMS_RETRY_MAX_SECONDS = int(os.getenv('SMS_RETRY_MAX_SECONDS', '3600'))
+SMS_POLL_INTERVAL = float(os.getenv('SMS_POLL_INTERVAL', '2'))
+
+
+def enqueue_sms(cur, phone_number, message, digest_key=None, digest_window=SMS_DIGEST_WINDOW):
+    """
+    Queue an SMS in the caller's transaction.
+
+    With a digest_key the message is held for digest_window seconds and
+    sent as one digest with whatever else is queued for the same phone
+    and key by then.
+    """
+    delay = digest_window if digest_key else 0
+    cur.execute("""
+        INSERT INTO sms_outbox (phone_number, message, digest_key, next_attempt_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+    """, (phone_number, message, digest_key, delay))
+
+
+def outbox_depth(cur):
+    """(pending, due now, seconds the most overdue one has waited); served by idx_sms_outbox_due"""
+    cur.execute("""
+        SELECT COUNT(*),
+               COUNT(*) FILTER (WHERE next_attempt_at <= CURRENT_TIMESTAMP),
+               COALESCE(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(next_attempt_at)), 0)
+        FROM sms_outbox
+        WHERE status = 'pending'
+    """)
+    pending, due, overdue = cur.fetchone()
+    return pending, due, max(0.0, float(overdue))
+
+
+def backoff_delay(attempts, base=SMS_RETRY_BASE_SECONDS, cap=SMS_RETRY_MAX_SECONDS, jitter=0.1):
+    """Seconds to wait before attempt number attempts + 1"""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay + delay * jitter * random.random()
+
+
+class SMSOutboxWorker:
+    def __init__(self, connect, sms_service, batch_size=SMS_BATCH_SIZE, max_attempts=SMS_MAX_ATTEMPTS,
+                 base_delay=SMS_RETRY_BASE_SECONDS, max_delay=SMS_RETRY_MAX_SECONDS, jitter=0.1,
+                 poll_interval=SMS_POLL_INTERVAL):
+        self._connect = connect
+        self.batcher = SMSBatcher(sms_service)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.poll_interval = poll_interval
+        self.running = False
+        self.stats = {'batches': 0, 'sent': 0, 'retried': 0, 'dead': 0}
+
+    def run_once(self):
+        """Send one batch of due messages; returns how many rows were claimed"""
+        conn = self._connect()
+        if not conn:
+            return 0
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT id, phone_number, message, attempts, digest_key
+                FROM sms_outbox
+                WHERE status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP
+                ORDER BY next_attempt_at, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (self.batch_size,))
+            rows = cur.fetchall()
+            rows += self._claim_digest_companions(cur, rows)
+
+            outcomes = self.batcher.send([(row[0], row[1], row[2], row[4]) for row in rows])
+            for row in rows:
+                self._record(cur, row, self._classify(outcomes.get(row[0])))
+
+            conn.commit()
+            if rows:
+                self.stats['batches'] += 1
+            return len(rows)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    def run_forever(self):
+        self.running = True
+        while self.running:
+            try:
+                claimed = self.run_once()
+            except Exception:
+                log.exception("sms_outbox_batch_failed")
+                claimed = 0
+            # A full batch means there is probably more waiting
+            if claimed < self.batch_size:
+                time.sleep(self.poll_interval)
+
+    def stop(self):
+        self.running = False
+
+    def _claim_digest_companions(self, cur, rows):
+        """Pending rows that belong in the same digest as a due one, even if not due yet"""
+        due = {(row[1], row[4]) for row in rows if row[4]}
+        if not due:
+            return []
+        cur.execute("""
+            SELECT id, phone_number, message, attempts, digest_key
+            FROM sms_outbox
+            WHERE status = 'pending' AND digest_key IS NOT NULL
+              AND phone_number = ANY(%s) AND digest_key = ANY(%s) AND NOT id = ANY(%s)
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+        """, ([phone for phone, _ in due], [key for _, key in due], [row[0] for row in rows]))
+        return [row for row in cur.fetchall() if (row[1], row[4]) in due]
+
+    @staticmethod
+    def _classify(outcome):
+        """None when the provider accepted the message, else (permanent, error)"""
+        if outcome is None:
+            return None
+        if outcome[0] == 'error':
+            return False, outcome[1]
+        _, status_code, status = outcome
+        return status_code in PERMANENT_STATUS_CODES, f"{status_code} {status}"
+
+    def _record(self, cur, row, failure):
+        outbox_id, phone_number, message, attempts, digest_key = row
+        attempts += 1
+
+        if failure is None:
+            cur.execute("""
+                UPDATE sms_outbox
+                SET status = 'sent', attempts = %s, sent_at = CURRENT_TIMESTAMP, last_error = NULL
+                WHERE id = %s
+            """, (attempts, outbox_id))
+            self.stats['sent'] += 1
+            return
+
+        permanent, error = failure
+        if permanent or attempts >= self.max_attempts:
+            cur.execute("""
+                UPDATE sms_outbox
+                SET status = 'dead', attempts = %s, last_error = %s
+                WHERE id = %s
+            """, (attempts, error, outbox_id))
+            self.stats['dead'] += 1
+            log.warning("sms_dead_lettered", outbox_id=outbox_id, phone_number=phone_number, attempts=attempts,
+                        error=error)
+            return
+
+        delay = backoff_delay(attempts, self.base_delay, self.max_delay, self.jitter)
+        cur.execute("""
+            UPDATE sms_outbox
+            SET attempts = %s, last_error = %s,
+                next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE id = %s
+        """, (attempts, error, delay, outbox_id))
+        self.stats['retried'] += 1
@@ -1,47 +1,123 @@
-import africastalking
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from services.clients import get_client
+from services.log import get_logger
+
+log = get_logger(__name__)
+
+# Africa's Talking per-recipient status codes
+SENT_STATUS_CODES = {100, 101, 102}        # Processed, Sent, Queued
+PERMANENT_STATUS_CODES = {403, 404, 406}   # InvalidPhoneNumber, UnsupportedNumberType, UserInBlacklist
+
+
+class SMSDeliveryError(Exception):
+    """The SMS API call itself failed (network, HTTP error, bad response)"""
+
 
 class SMSService:
-    def __init__(self):
+    def __init__(self, api_url=None):
         self.username = os.getenv('AT_USERNAME', 'sandbox')
         self.api_key = os.getenv('AT_API_KEY', '')
+        # Any endpoint speaking the AT messaging API, e.g. a local fake in tests
+        self.api_url = api_url or os.getenv('SMS_API_URL')
+        self.sms = None
         self.initialized = False
-        self.initialize()
+        self._init_attempted = False
 
     def initialize(self):
+        """Fetch the SDK's SMS client from the registry (services/clients.py); done on first send"""
+        self._init_attempted = True
         try:
-            africastalking.initialize(self.username, self.api_key)
-            self.sms = africastalking.SMS
+            self.sms = get_client('sms')
             self.initialized = True
-            print("SMS Service initialized successfully")
         except Exception as e:
-            print(f"SMS Service initialization failed: {e}")
+            log.error("sms_service_init_failed", error=str(e))
             self.initialized = False
+        return self.initialized
 
-    def send_sms(self, phone_number, message):
-        if not self.initialized:
-            print(f"SMS Simulation to {phone_number}: {message}")
+    def send_sms(self, phone_number, message, cur=None):
+        """
+        Queue an SMS in the caller's transaction when cur is given
+        (services/sms_outbox.py); otherwise send it right away.
+        """
+        if cur is not None:
+            from services.sms_outbox import enqueue_sms
+            enqueue_sms(cur, phone_number, message)
             return True
-        
+
         try:
-            response = self.sms.send(message, [phone_number])
-            print(f"SMS sent to {phone_number}: {response}")
+            failed = self.deliver([phone_number], message)
+            if failed:
+                log.warning("sms_rejected", phone_number=phone_number, status=str(failed[phone_number]))
+                return False
+            log.info("sms_sent", phone_number=phone_number)
             return True
         except Exception as e:
-            print(f"SMS sending failed: {e}")
+            log.warning("sms_send_failed", phone_number=phone_number, error=str(e))
             return False
 
-    def send_application_notification(self, employer_phone, job_title, applicant_phone):
+    def deliver(self, recipients, message):
+        """
+        Send message to recipients in one API call.
+
+        Returns {number: (status_code, status)} for the recipients that
+        were not accepted; raises SMSDeliveryError if the call failed.
+        """
+        if not self.api_url and not self._init_attempted:
+            self.initialize()
+
+        if self.api_url:
+            response = self._post(recipients, message)
+        elif self.initialized:
+            try:
+                response = self.sms.send(message, recipients)
+            except Exception as e:
+                raise SMSDeliveryError(str(e))
+        else:
+            log.info("sms_simulated", recipients=', '.join(recipients), message=message)
+            return {}
+
+        return self._rejected(response, recipients)
+
+    def _post(self, recipients, message):
+        # Only the worker sends, so the app doesn't pay for importing requests
+        import requests
+
+        try:
+            response = requests.post(
+                self.api_url,
+                data={'username': self.username, 'to': ','.join(recipients), 'message': message},
+                headers={'apiKey': self.api_key, 'Accept': 'application/json'},
+                timeout=10
+            )
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise SMSDeliveryError(str(e))
+
+    @staticmethod
+    def _rejected(response, recipients):
+        try:
+            results = response['SMSMessageData']['Recipients']
+        except (TypeError, KeyError):
+            raise SMSDeliveryError(f"Unexpected SMS API response: {response}")
+
+        rejected = {number: (None, 'NoResponse') for number in recipients}
+        for result in results:
+            if result.get('statusCode') in SENT_STATUS_CODES:
+                rejected.pop(result.get('number'), None)
+            else:
+                rejected[result.get('number')] = (result.get('statusCode'), result.get('status'))
+        return rejected
+
+    def send_application_notification(self, employer_phone, job_title, applicant_phone, cur=None):
         message = f"New application for '{job_title}' from {applicant_phone}. Login to JOWA to view details."
-        return self.send_sms(employer_phone, message)
+        return self.send_sms(employer_phone, message, cur)
 
-    def send_application_confirmation(self, applicant_phone, job_title):
+    def send_application_confirmation(self, applicant_phone, job_title, cur=None):
         message = f"Thank you for applying to '{job_title}'. The employer will contact you soon via JOWA."
-        return self.send_sms(applicant_phone, message)
+        return self.send_sms(applicant_phone, message, cur)
 
-    def send_job_posted_confirmation(self, employer_phone, job_title):
+    def send_job_posted_confirmation(self, employer_phone, job_title, cur=None):
         message = f"Your job '{job_title}' has been posted successfully. Job seekers can now apply."
-        return self.send_sms(employer_phone, message)
\ No newline at end of file
+        return self.send_sms(employer_phone, message, cur)
@@ -0,0 +1,275 @@
+# services/tracing.py
+"""
+Per-request trace spans and the slow-query log.
+
+Each request is a span, and each query it runs is a child span with the
+query's fingerprint (services/query_audit.py - no parameters, so no
+phone numbers), duration and row count. Queries are seen through
+metrics.TimedCursor, which wraps every pooled cursor: app.py's and
+services/database_service.py's.
+
+- TRACE_FILE is where finished traces go, one OTLP/JSON
+  ExportTraceServiceRequest per line - the format of the OpenTelemetry
+  Collector's file exporter, which its otlpjsonfile receiver (and most
+  OTLP tooling) reads back. Empty (the default) turns export off.
+- TRACE_SAMPLE_RATE is the share of requests exported (default 1).
+- SLOW_QUERY_MS: any query slower than this (default 200, 0 turns it
+  off), in a request or not, is logged as a slow_query warning with its
+  EXPLAIN plan, which is also added to its span. Each query shape is
+  explained at most once per SLOW_QUERY_EXPLAIN_INTERVAL seconds
+  (default 300), so a slow query doesn't get run twice on every hop.
+
+Traces are queued and written by a background thread, started per
+process on first use. Each trace is a single append, so the gunicorn
+workers can share one file; a full queue drops traces, never blocks.
+"""
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from services import metrics
+from services.log import get_logger
+from services.query_audit import fingerprint
+
+TRACE_FILE = os.getenv('TRACE_FILE', '')
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1'))
+TRACE_QUEUE_SIZE = int(os.getenv('TRACE_QUEUE_SIZE', '1000'))
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))
+
+SERVICE_NAME = 'jowa'
+
+# OTLP enums
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'EXECUTE')
+
+log = get_logger(__name__)
+
+SLOW_QUERIES = metrics.counter('jowa_db_slow_queries_total', "Queries slower than SLOW_QUERY_MS", ['route'])
+
+
+class _Trace:
+    __slots__ = ('trace_id', 'span_id', 'name', 'started', 'spans')
+
+    def __init__(self, name):
+        self.trace_id = os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.name = name
+        self.started = time.time_ns()
+        self.spans = []
+
+
+_trace = contextvars.ContextVar('tracing_trace', default=None)
+
+
+def begin_request(name, rand=random.random):
+    """Start the request's span, if it is exported; metrics.end_request() finishes it"""
+    if TRACE_FILE and (TRACE_SAMPLE_RATE >= 1.0 or rand() < TRACE_SAMPLE_RATE):
+        _trace.set(_Trace(name))
+    else:
+        _trace.set(None)
+
+
+def current_trace_id():
+    trace = _trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def _span(trace, span_id, parent_id, name, kind, started, ended, attributes, error=None):
+    span = {
+        'traceId': trace.trace_id,
+        'spanId': span_id,
+        'name': name,
+        'kind': kind,
+        'startTimeUnixNano': str(started),
+        'endTimeUnixNano': str(ended),
+        'attributes': [_attribute(key, value) for key, value in attributes.items() if value is not None],
+        'status': {'code': STATUS_ERROR, 'message': error} if error else {'code': STATUS_OK},
+    }
+    if parent_id:
+        span['parentSpanId'] = parent_id
+    return span
+
+
+def export_request(spans):
+    """One OTLP/JSON ExportTraceServiceRequest"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', SERVICE_NAME),
+                                    _attribute('process.pid', os.getpid())]},
+        'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+    }]}
+
+
+# Slow queries
+
+_explained = {}
+_explained_lock = threading.Lock()
+
+
+def _due_for_explain(shape):
+    now = time.monotonic()
+    with _explained_lock:
+        last = _explained.get(shape)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        _explained[shape] = now
+        return True
+
+
+def explain(cursor, sql, params):
+    """
+    The query's EXPLAIN plan as text, or None. Runs on a second cursor of
+    the same connection, inside a savepoint, so a failing EXPLAIN can't
+    abort the request's transaction.
+    """
+    conn = getattr(cursor, 'connection', None)
+    if conn is None:
+        return None
+    in_transaction = not getattr(conn, 'autocommit', False)
+    cur = conn.cursor()
+    try:
+        if in_transaction:
+            cur.execute("SAVEPOINT jowa_explain")
+        try:
+            cur.execute("EXPLAIN " + sql, params)
+            plan = '\n'.join(row[0] for row in cur.fetchall())
+        except Exception as e:
+            if in_transaction:
+                cur.execute("ROLLBACK TO SAVEPOINT jowa_explain")
+            log.warning("explain_failed", error=str(e))
+            return None
+        if in_transaction:
+            cur.execute("RELEASE SAVEPOINT jowa_explain")
+        return plan
+    except Exception as e:
+        log.warning("explain_failed", error=str(e))
+        return None
+    finally:
+        cur.close()
+
+
+def _on_query(cursor, statement, error):
+    trace = _trace.get()
+    slow = SLOW_QUERY_MS > 0 and statement.seconds * 1000 >= SLOW_QUERY_MS
+    if trace is None and not slow:
+        return
+
+    shape = fingerprint(statement.sql) if statement.sql else ''
+    operation = shape.split(' ', 1)[0].upper() if shape else 'QUERY'
+    plan = None
+    if slow:
+        if (error is None and statement.params != 'executemany' and operation in EXPLAINABLE
+                and _due_for_explain(shape)):
+            plan = explain(cursor, statement.sql, statement.params)
+        SLOW_QUERIES.inc(route=metrics.current_route())
+        log.warning("slow_query", ms=round(statement.seconds * 1000, 1), rows=statement.rows, sql=shape,
+                    trace_id=current_trace_id(), plan=plan)
+
+    if trace is not None:
+        started = int(statement.started * 1e9)
+        trace.spans.append(_span(
+            trace, os.urandom(8).hex(), trace.span_id, operation, SPAN_KIND_CLIENT,
+            started, started + int(statement.seconds * 1e9),
+            {'db.system': 'postgresql', 'db.operation': operation, 'db.statement': shape,
+             'db.rowcount': statement.rows, 'db.plan': plan},
+            error=type(error).__name__ if error else None))
+
+
+def _on_request(record):
+    trace = _trace.get()
+    if trace is None:
+        return
+    _trace.set(None)
+
+    root = _span(trace, trace.span_id, None, trace.name, SPAN_KIND_SERVER,
+                 trace.started, time.time_ns(),
+                 {'http.route': record.route, 'http.response.status_code': record.status,
+                  'jowa.menu_level': record.menu_level, 'db.query_count': record.queries},
+                 error=f"HTTP {record.status}" if record.status >= 500 else None)
+    _enqueue(export_request([root] + trace.spans))
+
+
+# Export
+
+_queue = None
+_pid = None
+_lock = threading.Lock()
+_dropped = 0
+
+
+def _enqueue(payload):
+    global _dropped
+    _ensure_started()
+    try:
+        _queue.put_nowait(payload)
+    except queue.Full:
+        _dropped += 1
+
+
+def dropped():
+    """Traces lost to a full queue in this process"""
+    return _dropped
+
+
+def _ensure_started():
+    # One writer thread per process; forked workers start their own
+    global _queue, _pid
+
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid == os.getpid():
+            return
+        _queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        threading.Thread(target=_write_forever, args=(_queue,), name='trace-writer', daemon=True).start()
+        _pid = os.getpid()
+        atexit.register(flush)
+
+
+def _write(payload):
+    line = (json.dumps(payload, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+    fd = os.open(TRACE_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def _write_forever(trace_queue):
+    while True:
+        payload = trace_queue.get()
+        try:
+            _write(payload)
+        except OSError as e:
+            log.warning("trace_write_failed", error=str(e))
+        finally:
+            trace_queue.task_done()
+
+
+def flush():
+    """Wait until every queued trace is written (at exit, in tests)"""
+    if _queue is not None and _pid == os.getpid():
+        _queue.join()
+
+
+metrics.add_query_listener(_on_query)
+metrics.add_request_listener(_on_request)
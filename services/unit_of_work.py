@@ -0,0 +1,75 @@
+# services/unit_of_work.py
+from services.log import get_logger
+from services.session_store import DatabaseSessionStore
+
+log = get_logger(__name__)
+
+
+class UnitOfWork:
+    """
+    One database transaction per USSD hop.
+
+    Handlers stage the next session state with set_session() and queue side
+    effects (SMS, notifications) with after_commit(); domain writes go through
+    cursor() as usual. commit() saves the session state to the session store,
+    commits everything in a single transaction and only then runs the queued
+    side effects. Nothing in between calls conn.commit().
+    """
+
+    def __init__(self, conn, session_id=None, phone_number=None, session_store=None):
+        self.conn = conn
+        self.session_id = session_id
+        self.phone_number = phone_number
+        self.session_store = session_store if session_store is not None else DatabaseSessionStore()
+        self._session = None
+        self._after_commit = []
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def set_session(self, session_id, menu_level, data):
+        # Last write wins: a hop that moves through several states pays for one UPDATE
+        self._session = (session_id, menu_level, dict(data or {}))
+
+    @property
+    def pending_session(self):
+        return self._session
+
+    def discard_session(self):
+        self._session = None
+
+    def after_commit(self, func, *args, **kwargs):
+        self._after_commit.append((func, args, kwargs))
+
+    def commit(self):
+        session, self._session = self._session, None
+        store = self.session_store
+
+        if session is not None and store.transactional:
+            cur = self.conn.cursor()
+            try:
+                store.put(session[0], self.phone_number, session[1], session[2], cur=cur)
+            finally:
+                cur.close()
+
+        self.conn.commit()
+
+        if session is not None and not store.transactional:
+            # Only publish the new state once the hop's writes are durable
+            store.put(session[0], self.phone_number, session[1], session[2])
+
+        callbacks, self._after_commit = self._after_commit, []
+        for func, args, kwargs in callbacks:
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                log.exception("post_commit_side_effect_failed")
+
+    def rollback(self):
+        self._session = None
+        self._after_commit = []
+        try:
+            self.conn.rollback()
+        except Exception as e:
+            log.warning("rollback_failed", error=str(e))
+
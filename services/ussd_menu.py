@@ -0,0 +1,183 @@
+# services/ussd_menu.py
+"""
+Declarative USSD menu graph.
+
+Each menu_level is a State. Its options map an input to either another
+state's name (plain navigation), a Branch on registration, or a handler
+function(hop, choice) -> Screen for anything that reads or writes data.
+Menu compiles the graph once into a dispatch table keyed by
+(menu_level, input); handlers return transport-neutral Screens that a
+response adapter turns into Africa's Talking text or the /ussd JSON.
+"""
+from collections import namedtuple
+
+from services import ussd_replay
+
+Screen = namedtuple('Screen', ['text', 'end'])
+
+
+def con(text):
+    """A screen that waits for more input"""
+    return Screen(text, False)
+
+
+def end(text):
+    """A screen that closes the session"""
+    return Screen(text, True)
+
+
+def invalid_option(hop, choice):
+    return con("Invalid option. Please try again.")
+
+
+class Branch:
+    """Go to registered_state if the caller is registered as role, else new_state"""
+
+    def __init__(self, role, registered_state, new_state):
+        self.role = role
+        self.registered_state = registered_state
+        self.new_state = new_state
+
+
+class State:
+    """
+    One menu_level.
+
+    screen(hop) renders the state when it is entered by navigation;
+    enter(hop) replaces the default entry (reset data, render screen) for
+    states that start with data, such as the first page of a listing.
+    otherwise(hop, choice) handles input without a matching option and
+    defaults to "Invalid option" without changing state. replayable
+    states carry no data and can be rebuilt from the input history.
+    """
+
+    def __init__(self, screen=None, options=None, otherwise=invalid_option, enter=None, replayable=False):
+        self.screen = screen
+        self.options = options or {}
+        self.otherwise = otherwise
+        self.enter = enter
+        self.replayable = replayable
+
+
+class Hop:
+    """Everything a handler needs for one USSD hop"""
+
+    def __init__(self, menu, session_id, phone_number, cur, conn, menu_level, data, profiles=None):
+        self.menu = menu
+        self.session_id = session_id
+        self.phone_number = phone_number
+        self.cur = cur
+        self.conn = conn
+        self.menu_level = menu_level
+        self.data = data
+        # role -> profile name, so one hop doesn't look the caller up twice
+        self.profiles = profiles if profiles is not None else {}
+
+    def goto(self, menu_level, data=None):
+        """Stage the next state on the hop's unit of work"""
+        self.menu_level = menu_level
+        self.data = data if data is not None else {}
+        self.conn.set_session(self.session_id, menu_level, self.data)
+
+    def enter(self, menu_level):
+        return self.menu.enter(menu_level, self)
+
+    def is_registered(self, role):
+        return self.menu.is_registered(self.cur, role, self.phone_number, self.profiles)
+
+
+class Menu:
+    def __init__(self, states, is_registered):
+        self.states = states
+        self.is_registered = is_registered
+        self.dispatch_table = {}
+        self.fallbacks = {}
+        self.transitions = {}
+        self.replayable_states = set()
+        self._compile()
+
+    def _compile(self):
+        for name, state in self.states.items():
+            self.fallbacks[name] = state.otherwise
+            for choice, target in state.options.items():
+                self._check_target(name, target)
+                self.dispatch_table[(name, choice)] = self._handler_for(target)
+
+            if state.replayable:
+                self.replayable_states.add(name)
+                self.transitions[name] = {
+                    choice: self._replay_target(target) for choice, target in state.options.items()
+                }
+
+    def _check_target(self, name, target):
+        if isinstance(target, Branch):
+            names = [target.registered_state, target.new_state]
+        elif isinstance(target, str):
+            names = [target]
+        else:
+            names = []
+        for state_name in names:
+            if state_name not in self.states:
+                raise ValueError(f"'{name}' has an option leading to unknown state '{state_name}'")
+
+    def _handler_for(self, target):
+        if isinstance(target, str):
+            return lambda hop, choice: self.enter(target, hop)
+        if isinstance(target, Branch):
+            def branch(hop, choice):
+                registered = hop.is_registered(target.role)
+                return self.enter(target.registered_state if registered else target.new_state, hop)
+            return branch
+        return target
+
+    @staticmethod
+    def _replay_target(target):
+        if isinstance(target, str):
+            return target
+        if isinstance(target, Branch):
+            return (target.role, target.registered_state, target.new_state)
+        # Handlers may read data, write it or end the session
+        return ussd_replay.AMBIGUOUS
+
+    def enter(self, menu_level, hop):
+        state = self.states[menu_level]
+        if state.enter is not None:
+            return state.enter(hop)
+        hop.goto(menu_level, {})
+        return state.screen(hop)
+
+    def dispatch(self, menu_level, choice, hop):
+        handler = self.dispatch_table.get((menu_level, choice))
+        if handler is None:
+            handler = self.fallbacks.get(menu_level)
+        if handler is None:
+            return end("Invalid option. Please dial again.")
+        return handler(hop, choice)
+
+    def replay(self, history, is_registered):
+        return ussd_replay.replay(history, is_registered, self.transitions, self.replayable_states)
+
+    def is_replayable(self, menu_level, data):
+        return menu_level in self.replayable_states and not data
+
+
+class ATResponse:
+    """Africa's Talking plain text: CON keeps the session open, END closes it"""
+
+    def render(self, screen, session_id):
+        return ("END " if screen.end else "CON ") + screen.text
+
+
+class JSONResponse:
+    """The /ussd JSON body (type 2 continues the session, 1 ends it)"""
+
+    def render(self, screen, session_id):
+        return {
+            "sessionId": session_id,
+            "message": screen.text,
+            "type": "1" if screen.end else "2"
+        }
+
+
+AT_RESPONSE = ATResponse()
+JSON_RESPONSE = JSONResponse()
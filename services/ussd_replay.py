@@ -0,0 +1,55 @@
+# services/ussd_replay.py
+"""
+Rebuild the menu position from Africa's Talking's cumulative text.
+
+AT sends the whole input history ("1*2*3") on every hop. As long as a
+session has only moved between plain navigation menus, replaying that
+history gives the current menu_level without reading ussd_sessions, and
+the hop doesn't need to write it either. Free-text flows (registration,
+job posting), paged listings and payment screens carry data that can't be
+derived from the keys pressed, so replay reports them as ambiguous and
+the caller falls back to the session store.
+
+The transition table comes from the menu graph (services/ussd_menu.py):
+for every replayable state it maps an option to the next state's name,
+to a (role, registered_state, new_state) branch, or to AMBIGUOUS for
+options handled by code. Options that aren't listed leave the menu where
+it is ("Invalid option").
+"""
+
+AMBIGUOUS = 'AMBIGUOUS'
+
+
+def split_text(text):
+    """'1*2*John' -> ['1', '2', 'John']; '' -> []"""
+    return text.split('*') if text else []
+
+
+def replay(history, is_registered, transitions, replayable_states):
+    """
+    Walk the inputs that came before the current one.
+
+    is_registered(role) is only called when the path goes through an
+    option whose target depends on it. Returns the menu_level the session
+    is in, or None when replay can't tell.
+    """
+    state = 'main_menu'
+
+    for choice in history:
+        if state not in replayable_states:
+            return None
+
+        target = transitions.get(state, {}).get(choice, state)
+
+        if isinstance(target, tuple):
+            role, registered_state, new_state = target
+            target = registered_state if is_registered(role) else new_state
+
+        if target == AMBIGUOUS:
+            return None
+
+        state = target
+
+    if state not in replayable_states:
+        return None
+    return state
@@ -17,7 +17,7 @@ class USSDService:
     def handle_main_menu(self, session_id, phone_number, text, session_data):
         if text == '1':
             user = self.user_model.get_by_phone(phone_number)
-            if user and user.get('full_name'):
+            if user and user.full_name:
                 session_data['menu_level'] = 'job_seeker_dashboard'
                 return self.job_seeker_dashboard(phone_number), session_data
             else:
@@ -27,7 +27,7 @@ class USSDService:
         
         elif text == '2':
             employer = self.employer_model.get_by_phone(phone_number)
-            if employer and employer.get('company_name'):
+            if employer and employer.company_name:
                 session_data['menu_level'] = 'employer_dashboard'
                 return self.employer_dashboard(phone_number), session_data
             else:
@@ -48,35 +48,36 @@ class USSDService:
 
     def job_seeker_dashboard(self, phone_number):
         user = self.user_model.get_by_phone(phone_number)
-        name = user.get('full_name', 'User') if user else "User"
+        name = user.full_name or 'User' if user else "User"
         
         return f"""Welcome {name}!\n\n1. Browse Available Jobs\n2. My Applications\n3. Update Profile\n4. Back to Main Menu\n\nReply with 1, 2, 3, or 4"""
 
     def employer_dashboard(self, phone_number):
         employer = self.employer_model.get_by_phone(phone_number)
-        company_name = employer.get('company_name', 'Employer') if employer else "Employer"
+        company_name = employer.company_name or 'Employer' if employer else "Employer"
         
         return f"""Welcome {company_name}!\n\n1. Post New Job\n2. View My Jobs\n3. View Applications\n4. Back to Main Menu\n\nReply with 1, 2, 3, or 4"""
 
-    def browse_jobs(self, phone_number, page=0):
+    def browse_jobs(self, phone_number, page=0, session_data=None):
         jobs = self.job_model.get_active_jobs(limit=3, offset=page*3)
         
         if not jobs:
             return "No jobs available at the moment. Check back later!"
         
+        if session_data is not None:
+            # Remember what "1"-"3" point at for handle_job_application
+            session_data['jobs'] = [[job.id, job.title] for job in jobs]
+        
         return format_job_listing(jobs, page)
 
-    def handle_job_application(self, phone_number, job_index, page=0):
-        jobs = self.job_model.get_active_jobs(limit=3, offset=page*3)
+    def handle_job_application(self, phone_number, job_index, session_data):
+        jobs = session_data.get('jobs') or []
         
         if 0 <= job_index < len(jobs):
-            job = jobs[job_index]
-            user = self.user_model.get_by_phone(phone_number)
-            
-            if user:
-                application = self.application_model.create(job['id'], user['id'])
-                if application:
-                    return f"Application submitted for: {job['title']}\n\nEmployer will contact you soon!"
+            job_id, job_title = jobs[job_index]
+            application = self.application_model.apply(job_id, phone_number)
+            if application:
+                return f"Application submitted for: {job_title}\n\nEmployer will contact you soon!"
         
         return "Invalid job selection. Please try again."
 
@@ -85,5 +86,5 @@ class USSDService:
         if not user:
             return "User not found."
         
-        applications = self.application_model.get_by_user_id(user['id'], limit=5, offset=page*5)
+        applications = self.application_model.get_by_user_id(user.id, limit=5, offset=page*5)
         return format_application_list(applications, page)
\ No newline at end of file
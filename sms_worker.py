@@ -0,0 +1,39 @@
+# sms_worker.py
+"""
+Sends the SMS queued in sms_outbox (see services/sms_outbox.py).
+
+Run it next to the web process:  python sms_worker.py
+"""
+import signal
+
+from dotenv import load_dotenv
+
+from services import metrics
+from services.db_pool import get_pool
+from services.log import get_logger
+from services.sms_outbox import SMSOutboxWorker
+from services.sms_service import SMSService
+
+load_dotenv()
+
+log = get_logger('sms_worker')
+
+
+def main():
+    worker = SMSOutboxWorker(lambda: get_pool().getconn(), SMSService())
+
+    def shutdown(signum, frame):
+        log.info("sms_worker_stopping")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    metrics.start()
+    log.info("sms_worker_started")
+    worker.run_forever()
+    log.info("sms_worker_stopped", **worker.stats, batching=worker.batcher.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""A local stand-in for the Africa's Talking messaging endpoint"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeSMSAPI:
+    """
+    Serves POST /version1/messaging on 127.0.0.1 with AT-shaped responses.
+
+    rejected maps a number to the statusCode it gets (e.g. 403 for an
+    invalid number); outage makes the next N calls fail with HTTP 500.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.rejected = {}
+        self.outage = 0
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+                form = {key: values[0] for key, values in parse_qs(body).items()}
+                api.requests.append({'apiKey': self.headers.get('apiKey'), **form})
+
+                if api.outage:
+                    api.outage -= 1
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+
+                recipients = []
+                for number in form['to'].split(','):
+                    code = api.rejected.get(number, 101)
+                    recipients.append({
+                        'number': number,
+                        'statusCode': code,
+                        'status': 'Success' if code == 101 else 'InvalidPhoneNumber',
+                        'messageId': f"ATXid_{len(api.requests)}",
+                    })
+                payload = json.dumps({'SMSMessageData': {'Message': 'Sent', 'Recipients': recipients}})
+                self.send_response(201)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(payload.encode('utf-8'))
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/version1/messaging"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
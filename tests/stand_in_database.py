@@ -0,0 +1,296 @@
+"""
+An in-memory stand-in for PostgreSQL, for the load test, the benchmarks
+and the tests that run the menu end to end.
+
+The app's SQL is PostgreSQL-only (ON CONFLICT, FOR UPDATE, row-value
+keysets, NOTIFY), so SQLite cannot stand in for it. StandInDatabase
+instead recognises each statement the menu sends and keeps just enough
+state (users, employers, jobs, applications, payments, sessions) for
+every flow to reach its last screen, with an optional per-query latency.
+It measures the app and the pool, not the database: its SQL matching
+checks nothing but the statements it knows.
+"""
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+import psycopg2.extensions
+
+
+class _StandInCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self._db = connection._db
+        self._rows = []
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        if sql.startswith('PREPARE '):
+            # Kept per connection, like PostgreSQL's, and answered as the plain statement
+            _, name, _, body = sql.split(' ', 3)
+            self.connection.prepared[name] = re.sub(r'\$\d+', '%s', body)
+            self._rows = []
+            return
+        if sql.startswith('EXECUTE '):
+            name = sql.split(' ')[1]
+            if name not in self.connection.prepared:
+                raise psycopg2.ProgrammingError(f"prepared statement \"{name}\" does not exist")
+            sql = self.connection.prepared[name]
+        self._rows = self._db.run(sql, tuple(params or ()))
+        self.rowcount = len(self._rows)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class _StandInConnection:
+    def __init__(self, db):
+        self._db = db
+        self.closed = 0
+        self.prepared = {}
+
+    def cursor(self):
+        return _StandInCursor(self)
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class StandInDatabase:
+    """
+    The statements of the USSD menu, answered from dicts.
+
+    Writes apply at once (there are no transactions); a statement it
+    doesn't recognise raises ProgrammingError, as a typo would on
+    PostgreSQL, rather than quietly returning no rows. latency seconds are slept per
+    statement, outside the lock, to stand in for the network round trip.
+    Prepared statements (services/repository.py) are remembered per
+    connection; a PREPARE is neither slept nor counted.
+    """
+
+    def __init__(self, latency=0.0, clock=datetime.now):
+        self.latency = latency
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids = 0
+        self.users = {}             # phone -> [id, full_name]
+        self.employers = {}         # phone -> [id, company_name]
+        self.jobs = []              # [id, employer_phone, title, location, amount, type, created_at]
+        self.applications = {}      # (job_id, user_phone) -> [id, created_at]
+        self.payments = {}          # session_id -> [id, phone, amount, purpose, status, created_at]
+        self.payment_sessions = {}  # session_id -> [amount, provider, purpose, status]
+        self.sessions = {}          # session_id -> (menu_level, data json)
+        self.sms_outbox = []        # (phone, message, digest_key)
+        self.notifications = []     # channels NOTIFYed
+        self.statements = 0
+
+    def connect(self):
+        return _StandInConnection(self)
+
+    def _next_id(self):
+        self._ids += 1
+        return self._ids
+
+    def _now(self):
+        # Strictly increasing, so keyset pagination has a total order
+        return self._clock() + timedelta(microseconds=self._ids)
+
+    def run(self, sql, params):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.statements += 1
+            for fragment, handler in self._HANDLERS:
+                if fragment in sql:
+                    return handler(self, sql, params)
+        raise psycopg2.ProgrammingError(f"stand-in database doesn't know this statement: {sql}")
+
+    # Sessions
+
+    def _read_session(self, sql, params):
+        row = self.sessions.get(params[0])
+        return [row] if row else []
+
+    def _write_session(self, sql, params):
+        if sql.startswith('UPDATE'):
+            menu_level, data, session_id = params
+        else:
+            session_id, _, menu_level, data = params
+        self.sessions[session_id] = (menu_level, data)
+        return []
+
+    # People
+
+    def _user_profile(self, sql, params):
+        user = self.users.get(params[0])
+        return [tuple(user)] if user else []
+
+    def _user_phone(self, sql, params):
+        return [(params[0],)] if params[0] in self.users else []
+
+    def _insert_user(self, sql, params):
+        user = self.users.get(params[0])
+        if user is None:
+            user = self.users[params[0]] = [self._next_id(), None]
+        if len(params) > 1:
+            user[1] = params[1]
+        return [(user[0],)] if 'RETURNING id' in sql else []
+
+    def _employer_profile(self, sql, params):
+        employer = self.employers.get(params[0])
+        return [tuple(employer)] if employer else []
+
+    def _insert_employer(self, sql, params):
+        employer = self.employers.setdefault(params[0], [self._next_id(), None])
+        employer[1] = params[1]
+        return [(employer[0],)]
+
+    # Jobs and applications
+
+    def _insert_job(self, sql, params):
+        employer_id, title, _, location, amount, payment_type = params
+        phone = next(phone for phone, employer in self.employers.items() if employer[0] == employer_id)
+        self.jobs.append([self._next_id(), phone, title, location, amount, payment_type, self._now()])
+        return []
+
+    @staticmethod
+    def _after(sql, params, rows, key):
+        # The keyset clause of services/pagination.py: (created, id) < or <= (%s, %s)
+        if '::timestamp' not in sql:
+            return rows
+        bound = (params[-2], params[-1])
+        if ') <= (' in sql:
+            return [row for row in rows if key(row) <= bound]
+        return [row for row in rows if key(row) < bound]
+
+    def _list_jobs(self, sql, params):
+        newest = sorted(self.jobs, key=lambda job: (job[6], job[0]), reverse=True)
+        rows = self._after(sql, params, newest, lambda job: (job[6].isoformat(), job[0]))
+        return [(job[0], job[2], job[3], job[4], job[5], self.employers[job[1]][1], job[6]) for job in rows[:3]]
+
+    def _employer_jobs(self, sql, params):
+        rows = [job for job in reversed(self.jobs) if job[1] == params[0]][:5]
+        return [(job[2], 'active', sum(1 for job_id, _ in self.applications if job_id == job[0])) for job in rows]
+
+    def _insert_application(self, sql, params):
+        job_id, phone = params
+        if phone not in self.users or (job_id, phone) in self.applications:
+            return []
+        self.applications[(job_id, phone)] = [self._next_id(), self._now()]
+        job = next((job for job in self.jobs if job[0] == job_id), None)
+        return [(self.applications[(job_id, phone)][0], job[1] if job else None)]
+
+    def _list_applications(self, sql, params):
+        jobs = {job[0]: job for job in self.jobs}
+        rows = sorted(((jobs[job_id], application) for (job_id, phone), application in self.applications.items()
+                       if phone == params[0] and job_id in jobs),
+                      key=lambda pair: (pair[1][1], pair[1][0]), reverse=True)
+        rows = self._after(sql, params, rows, lambda pair: (pair[1][1].isoformat(), pair[1][0]))
+        return [(job[2], self.employers[job[1]][1], 'pending', application[1], application[0])
+                for job, application in rows[:5]]
+
+    def _job_applications(self, sql, params):
+        jobs = {job[0]: job for job in self.jobs if job[1] == params[0]}
+        rows = [(self.users[phone][1], jobs[job_id][2], application[1], phone)
+                for (job_id, phone), application in self.applications.items() if job_id in jobs]
+        return sorted(rows, key=lambda row: row[2], reverse=True)[:5]
+
+    # Payments
+
+    def _insert_payment(self, sql, params):
+        session_id, phone, amount, purpose, _ = params
+        payment_id = self._next_id()
+        self.payments[session_id] = [payment_id, phone, amount, purpose, 'initiated', self._now()]
+        return [(payment_id,)]
+
+    def _queue_payment(self, sql, params):
+        payment = self.payments.get(params[1])
+        if not payment or payment[4] != 'initiated':
+            return []
+        payment[4] = 'queued'
+        return [(payment[0], payment[2], payment[3])]
+
+    def _cancel_payment(self, sql, params):
+        payment = self.payments.get(params[0])
+        if payment and payment[4] == 'initiated':
+            payment[4] = 'cancelled'
+        return []
+
+    def _upsert_payment_session(self, sql, params):
+        if len(params) == 5:
+            session_id, _, amount, provider, purpose = params
+            self.payment_sessions[session_id] = [amount, provider, purpose, 'pending']
+        else:
+            session_id, _, amount = params
+            self.payment_sessions[session_id] = [amount, None, 'Premium Job Posting', 'premium_job']
+        return []
+
+    def _pending_payment_session(self, sql, params):
+        session = self.payment_sessions.get(params[0])
+        return [tuple(session[:3])] if session and session[3] == 'pending' else []
+
+    def _payment_session_status(self, sql, params):
+        session = self.payment_sessions.get(params[0])
+        if session:
+            session[3] = sql.split("SET status = '", 1)[1].split("'", 1)[0]
+        return []
+
+    def _payment_history(self, sql, params):
+        rows = sorted((payment for payment in self.payments.values() if payment[1] == params[0]),
+                      key=lambda payment: (payment[5], payment[0]), reverse=True)
+        rows = self._after(sql, params, rows, lambda payment: (payment[5].isoformat(), payment[0]))
+        return [(payment[3], payment[2], payment[4], payment[5], None, payment[0]) for payment in rows[:5]]
+
+    # SMS and notifications
+
+    def _enqueue_sms(self, sql, params):
+        self.sms_outbox.append(tuple(params[:3]))
+        return []
+
+    def _notify(self, sql, params):
+        self.notifications.append(sql.split()[1])
+        return []
+
+    _HANDLERS = [
+        ('SELECT menu_level, data FROM ussd_sessions', _read_session),
+        ('ussd_sessions', _write_session),
+        ('SELECT id, full_name FROM users WHERE phone_number', _user_profile),
+        ('SELECT phone_number FROM users WHERE phone_number', _user_phone),
+        ('INSERT INTO users', _insert_user),
+        ('SELECT id, company_name FROM employers WHERE phone_number', _employer_profile),
+        ('INSERT INTO employers', _insert_employer),
+        ('INSERT INTO jobs', _insert_job),
+        ("FROM jobs j JOIN employers e ON j.employer_id = e.id WHERE j.status = 'active'", _list_jobs),
+        ('LEFT JOIN applications a ON j.id = a.job_id', _employer_jobs),
+        ('INSERT INTO applications', _insert_application),
+        ('WHERE a.user_id = (SELECT id FROM users', _list_applications),
+        ('JOIN users u ON a.user_id = u.id', _job_applications),
+        ('INSERT INTO payments', _insert_payment),
+        ("UPDATE payments SET status = 'queued'", _queue_payment),
+        ("UPDATE payments SET status = 'cancelled'", _cancel_payment),
+        ('INSERT INTO payment_sessions', _upsert_payment_session),
+        ('FROM payment_sessions WHERE session_id', _pending_payment_session),
+        ('UPDATE payment_sessions SET status', _payment_session_status),
+        ('FROM payments WHERE phone_number', _payment_history),
+        ('INSERT INTO sms_outbox', _enqueue_sms),
+        ('NOTIFY ', _notify),
+    ]
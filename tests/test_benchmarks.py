@@ -0,0 +1,46 @@
+import pytest
+
+import benchmark
+from services import microbench
+from services.db_pool import set_pool
+from services.session_store import set_session_store
+
+
+@pytest.fixture
+def bench_db():
+    db = benchmark.bench_database()
+    yield db
+    set_pool(None)
+    set_session_store(None)
+
+
+def test_no_case_sends_more_queries_than_its_baseline(bench_db):
+    baseline = microbench.load_baseline(benchmark.BASELINE)
+    results = microbench.run(benchmark.cases(bench_db), lambda: bench_db.statements, repeat=1, number=1)
+
+    assert {result.name for result in results} == set(baseline)
+    findings = microbench.compare(results, baseline, timings=False)
+    assert findings == [], microbench.format_findings(findings)
+
+
+def test_compare_flags_extra_queries_and_slowdowns():
+    baseline = {'hop': {'us_per_call': 100.0, 'queries': 2}, 'fmt': {'us_per_call': 1.0, 'queries': 0}}
+    results = [microbench.Result('hop', 140.0, 3), microbench.Result('fmt', 2.5, 0),
+               microbench.Result('fresh', 5.0, 1)]
+
+    findings = microbench.compare(results, baseline, tolerance=0.25, floor_us=2.0)
+
+    assert [(finding.name, finding.kind) for finding in findings] == [
+        ('hop', 'queries'), ('hop', 'time'), ('fresh', 'new')]
+    # 1.5us slower is 150%, but under the jitter floor
+    assert microbench.compare([microbench.Result('hop', 110.0, 2)], baseline) == []
+
+
+def test_measure_counts_queries_of_one_call():
+    statements = []
+    case = microbench.Case('two_queries', lambda: lambda: statements.extend(['SELECT 1', 'SELECT 2']))
+
+    result = microbench.measure(case, lambda: len(statements), repeat=2, number=3)
+
+    assert result.queries == 2
+    assert result.us_per_call > 0
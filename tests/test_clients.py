@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from services import clients
+from services.payment_providers import SimulatedProvider, get_provider, register_provider
+from services.sms_service import SMSService
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Cold `import app` in a fresh interpreter, best of three runs
+IMPORT_BUDGET_SECONDS = float(os.getenv('IMPORT_BUDGET_SECONDS', '0.5'))
+
+COLD_IMPORT = """
+import sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(elapsed, ','.join(name for name in ('africastalking', 'requests') if name in sys.modules), sep='|')
+"""
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Register clients into a copy of the process-wide registry, dropped after the test"""
+    monkeypatch.setattr(clients, '_factories', dict(clients._factories))
+    monkeypatch.setattr(clients, '_clients', dict(clients._clients))
+    return clients
+
+
+def test_importing_the_app_builds_no_clients_and_stays_in_budget():
+    timings = []
+    for _ in range(3):
+        result = subprocess.run([sys.executable, '-c', COLD_IMPORT], cwd=ROOT, capture_output=True, text=True,
+                                check=True)
+        seconds, loaded = result.stdout.strip().splitlines()[-1].split('|')
+        timings.append(float(seconds))
+        assert loaded == '', f"import app loaded {loaded}"
+
+    assert min(timings) < IMPORT_BUDGET_SECONDS, f"import app took {min(timings):.3f}s"
+
+
+def test_clients_are_built_once_per_process(monkeypatch, registry):
+    built = []
+    clients.register_client('test-client', lambda: built.append(object()) or built[-1])
+
+    first = clients.get_client('test-client')
+    assert clients.get_client('test-client') is first
+    assert len(built) == 1
+
+    # A forked child sees a different pid and builds its own
+    monkeypatch.setattr(clients, '_pid', -1)
+    assert clients.get_client('test-client') is not first
+    assert len(built) == 2
+
+
+def test_failed_factory_is_retried(registry):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError('no route to host')
+        return 'client'
+
+    clients.register_client('flaky', flaky)
+    try:
+        clients.get_client('flaky')
+    except ConnectionError:
+        pass
+    assert clients.get_client('flaky') == 'client'
+
+
+def test_sms_service_and_payment_providers_use_the_registry(registry):
+    service = SMSService()
+    assert service.sms is None and not service._init_attempted
+
+    fake_sms = object()
+    clients.register_client('sms', lambda: fake_sms)
+    assert service.initialize() and service.sms is fake_sms
+
+    assert isinstance(get_provider('zamtel-test'), SimulatedProvider)
+    provider = SimulatedProvider('mtn-test')
+    register_provider('mtn-test', provider)
+    assert get_provider('mtn-test') is provider
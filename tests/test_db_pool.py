@@ -0,0 +1,134 @@
+import threading
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from services.db_pool import ConnectionPool, PoolTimeout, get_pool_config
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        self.conn.queries.append(sql)
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        if self.broken:
+            raise psycopg2.OperationalError("connection lost")
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def connect():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    options = dict(min_size=0, max_size=2, timeout=0.05, ping_interval=30, max_lifetime=1800)
+    options.update(kwargs)
+    return ConnectionPool(connect=connect, **options), created
+
+
+def test_close_returns_connection_to_pool():
+    pool, created = make_pool()
+
+    conn = pool.getconn()
+    conn.close()
+    conn = pool.getconn()
+    conn.close()
+
+    assert len(created) == 1
+    stats = pool.stats()
+    assert stats['checkouts'] == 2
+    assert stats['idle'] == 1 and stats['in_use'] == 0
+
+
+def test_open_transaction_is_rolled_back_on_return():
+    pool, created = make_pool()
+
+    conn = pool.getconn()
+    conn.cursor().execute("UPDATE users SET full_name = 'x'")
+    conn.close()
+
+    assert created[0].rollbacks == 1
+    assert created[0].get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def test_broken_connection_is_recycled_on_checkout():
+    pool, created = make_pool(ping_interval=0)
+
+    pool.getconn().close()
+    created[0].broken = True
+
+    conn = pool.getconn()
+    assert conn.raw is created[1]
+    assert created[0].closed
+    assert pool.stats()['recycled'] == 1
+
+
+def test_exhausted_pool_times_out():
+    pool, _ = make_pool(max_size=1)
+
+    held = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    held.close()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(max_size=1, timeout=2)
+    held = pool.getconn()
+    result = []
+
+    worker = threading.Thread(target=lambda: result.append(pool.getconn()))
+    worker.start()
+    held.close()
+    worker.join(2)
+
+    assert result and result[0].raw is created[0]
+    assert pool.stats()['waits'] == 1
+
+
+def test_pool_size_is_split_across_gunicorn_workers(monkeypatch):
+    monkeypatch.setenv('DB_POOL_MAX', '20')
+    monkeypatch.setenv('DB_MAX_CONNECTIONS', '12')
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+
+    assert get_pool_config()['max_size'] == 3
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from benchmark import load_formatters, load_module
+from tests.test_unit_of_work import ScriptedConnection
+
+
+def test_job_applications_are_formatted_from_the_model_rows():
+    conn = ScriptedConnection({'FROM applications a': [
+        (4, 'Bricklayer', 'Mary Banda', '+260971234567', 'pending', datetime(2026, 1, 5, 9, 30)),
+    ]})
+    applicants = load_module('models', 'application').Application(conn).get_by_job_id(2)
+
+    text = load_formatters().format_job_applications(applicants)
+
+    assert conn.statements('JOIN jobs j ON a.job_id = j.id')
+    assert "Job: Bricklayer\nApplicant: Mary Banda\nPhone: +260971234567\nDate: 05/01/2026\n" in text
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import app as jowa
+from services.job_cache import JobChangeListener, JobListingCache, ListingPage
+from services.session_store import MemorySessionStore
+from tests.test_session_store import FakeClock
+from tests.test_unit_of_work import ScriptedConnection
+
+PHONE = '+260971234567'
+PAGE = ListingPage('Available Jobs:', ['2024-01-09T09:00:00', 9], ['2024-01-07T09:00:00', 7], ((9, 'Job 9'),))
+
+
+def test_cache_is_bypassed_until_listening():
+    cache = JobListingCache()
+    cache.put(None, PAGE, cache.generation)
+    assert cache.get(None) is None
+
+    cache.activate()
+    cache.put(None, PAGE, cache.generation)
+    assert cache.get(None) is PAGE
+
+
+def test_page_loaded_across_an_invalidation_is_not_stored():
+    cache = JobListingCache()
+    cache.activate()
+
+    generation = cache.generation
+    cache.invalidate()
+    cache.put(None, PAGE, generation)
+
+    assert cache.get(None) is None
+
+
+def test_pages_expire():
+    clock = FakeClock()
+    cache = JobListingCache(ttl=60, clock=clock)
+    cache.activate()
+    cache.put(None, PAGE, cache.generation)
+
+    clock.now += 61
+
+    assert cache.get(None) is None
+
+
+class NotifyingConnection:
+    def __init__(self, notifies):
+        self.notifies = notifies
+
+    def poll(self):
+        pass
+
+
+def test_notification_drops_cached_pages():
+    cache = JobListingCache()
+    cache.activate()
+    cache.put(None, PAGE, cache.generation)
+    listener = JobChangeListener(cache, connect=None)
+
+    assert listener.drain(NotifyingConnection(['jowa_jobs', 'jowa_jobs'])) == 2
+    assert cache.get(None) is None
+
+
+def test_cache_hit_skips_the_jobs_query(monkeypatch, job_cache):
+    job_cache.activate()
+    conn = ScriptedConnection({
+        'SELECT id, full_name FROM users': [(1, 'John Banda')],
+        'FROM jobs j': [(9, 'Job 9', 'Lusaka', 50, 'daily', 'BuildRight', datetime(2024, 1, 9, 9, 0))],
+    })
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', MemorySessionStore)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', True)
+
+    first = jowa.process_africas_talking_ussd('sess-1', PHONE, '1*1')
+    second = jowa.process_africas_talking_ussd('sess-2', PHONE, '1*1')
+
+    assert first == second
+    assert len(conn.statements('FROM jobs j')) == 1
+    assert job_cache.stats['hits'] == 1
+
+
+def test_posting_a_job_notifies_other_workers(monkeypatch):
+    conn = ScriptedConnection({'SELECT id, company_name FROM employers': [(3, 'BuildRight')]})
+    store = MemorySessionStore()
+    store.put('sess-1', PHONE, 'post_job', {
+        'step': 5, 'title': 'Bricklayer', 'description': 'Walls', 'location': 'Ndola', 'payment_amount': '80',
+    })
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', False)
+
+    response = jowa.process_africas_talking_ussd('sess-1', PHONE, '2*1*Bricklayer*Walls*Ndola*80*2')
+
+    assert response.startswith('END Job posted successfully!')
+    executed = [entry[1] for entry in conn.log if entry[0] == 'execute']
+    assert executed.index('NOTIFY jowa_jobs') > next(i for i, sql in enumerate(executed) if 'INSERT INTO jobs' in sql)
+    assert conn.count('commit') == 1
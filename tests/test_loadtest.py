@@ -0,0 +1,78 @@
+import psycopg2
+import pytest
+
+import app as jowa
+from services import loadtest
+from services.db_pool import ConnectionPool, set_pool
+from tests.stand_in_database import StandInDatabase
+
+
+@pytest.fixture
+def stand_in():
+    db = StandInDatabase()
+    set_pool(ConnectionPool(connect=db.connect, max_size=4))
+    yield db
+    set_pool(None)
+
+
+def test_scripts_are_reproducible_and_hops_match_each_endpoint():
+    sessions = loadtest.generate_sessions(50, seed=4)
+    assert sessions == loadtest.generate_sessions(50, seed=4)
+    assert {session['flow'] for session in sessions} <= set(loadtest.FLOWS)
+
+    session = dict(sessions[0], endpoint='/at-ussd', inputs=['', '1', '1', '2'])
+    assert [body['text'] for body in loadtest.hop_requests(session)] == ['', '1', '1*1', '1*1*2']
+    session['endpoint'] = '/ussd'
+    assert [body['text'] for body in loadtest.hop_requests(session)] == ['', '1', '1', '2']
+
+
+def test_stand_in_refuses_statements_it_does_not_know(stand_in):
+    cur = stand_in.connect().cursor()
+
+    with pytest.raises(psycopg2.ProgrammingError):
+        cur.execute("SELECT id, full_name FROM user WHERE phone_number = %s", ('+260971000001',))
+
+
+def test_every_flow_replays_without_errors(stand_in):
+    sessions = loadtest.generate_sessions(140, seed=1, mix={flow: 1 for flow in loadtest.FLOWS})
+    conn = stand_in.connect()
+    loadtest.seed(conn.cursor(), sessions)
+
+    results, elapsed = loadtest.replay(jowa.app, sessions, concurrency=8)
+    summary = loadtest.summarize(results, sessions, elapsed)
+
+    assert summary['overall']['hops'] == sum(len(session['inputs']) for session in sessions)
+    assert summary['overall']['errors'] == 0, loadtest.format_report(summary)
+    assert 'unknown' not in summary['menu_levels']
+    assert {'browse_jobs', 'post_job', 'payment_confirmation', 'job_seeker_registration'} <= set(
+        summary['menu_levels'])
+    assert set(summary['flows']) == set(loadtest.FLOWS)
+    # Registrations, applications, postings and payments all reached the database
+    assert stand_in.applications and stand_in.payments
+    assert any(session['flow'] == 'register_seeker' and stand_in.users[session['phone_number']][1]
+               for session in sessions)
+
+
+def test_failed_screens_count_as_errors():
+    def connect():
+        raise OSError("database is down")
+
+    set_pool(ConnectionPool(connect=connect, max_size=1, timeout=0.1))
+    try:
+        sessions = loadtest.generate_sessions(4, seed=2, mix={'browse_apply': 1}, endpoints=['/at-ussd'])
+        results, elapsed = loadtest.replay(jowa.app, sessions, concurrency=2)
+    finally:
+        set_pool(None)
+
+    summary = loadtest.summarize(results, sessions, elapsed)
+    assert summary['overall']['error_rate'] == 1.0
+    assert loadtest._failed(200, "CON Available Jobs:") is False
+    assert loadtest._failed(500, "") is True
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 101))
+    assert loadtest.percentile(values, 0.50) == 50
+    assert loadtest.percentile(values, 0.99) == 99
+    assert loadtest.percentile([7], 0.95) == 7
+    assert loadtest.percentile([], 0.5) == 0.0
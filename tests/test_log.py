@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import queue
+import re
+
+import app as jowa
+from services import log as structured_log
+from services.session_store import MemorySessionStore
+from tests.test_unit_of_work import ScriptedConnection
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_record(event, level=logging.INFO, **fields):
+    record = logging.LogRecord('jowa.services.payments', level, __file__, 1, event, None, None)
+    record.fields = fields
+    return record
+
+
+def test_records_are_one_json_line_with_fields():
+    structured_log.begin_request('/at-ussd', rates={})
+    try:
+        handler = structured_log._QueueHandler(queue.Queue())
+        record = make_record("payment_initiated", payment_id=7, amount=10)
+        assert handler.filter(record)
+    finally:
+        structured_log.end_request()
+
+    line = structured_log.JSONFormatter().format(record)
+    assert '\n' not in line
+    entry = json.loads(line)
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'services.payments'
+    assert entry['event'] == 'payment_initiated'
+    assert entry['route'] == '/at-ussd'
+    assert entry['payment_id'] == 7 and entry['amount'] == 10
+
+
+def test_phone_numbers_are_masked_in_fields():
+    entry = json.loads(structured_log.JSONFormatter().format(
+        make_record("sms_sent", phone_number='+260971234567', recipients='+260971234567, 0977000111')))
+
+    assert entry['phone_number'] == '+260******567'
+    assert entry['recipients'] == '+260******567, 0977***111'
+    assert structured_log.redact('transaction TX_1700000000123') == 'transaction TX_1700000000123'
+
+
+def test_sampled_out_requests_still_log_warnings():
+    handler = structured_log._QueueHandler(queue.Queue())
+
+    structured_log.begin_request('/at-ussd', rates={'/at-ussd': 0.1}, rand=lambda: 0.5)
+    try:
+        assert not handler.filter(make_record("ussd_hop"))
+        assert handler.filter(make_record("sms_rejected", level=logging.WARNING))
+    finally:
+        structured_log.end_request()
+
+    structured_log.begin_request('/at-ussd', rates={'/at-ussd': 0.1}, rand=lambda: 0.05)
+    try:
+        assert handler.filter(make_record("ussd_hop"))
+    finally:
+        structured_log.end_request()
+
+
+def test_app_samples_requests_by_route(monkeypatch):
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: ScriptedConnection({}))
+    monkeypatch.setattr(jowa, 'get_session_store', MemorySessionStore)
+    handler = structured_log._QueueHandler(queue.Queue())
+    root = logging.getLogger(structured_log.ROOT_LOGGER)
+    root.addHandler(handler)
+    client = jowa.app.test_client()
+    try:
+        monkeypatch.setattr(structured_log, 'LOG_SAMPLE_RATES', {'/at-ussd': 0.0})
+        client.post('/at-ussd', data={'sessionId': 'log-1', 'phoneNumber': '+260971234567', 'text': ''})
+        assert handler.queue.empty()
+
+        monkeypatch.setattr(structured_log, 'LOG_SAMPLE_RATES', {'/at-ussd': 1.0})
+        client.post('/at-ussd', data={'sessionId': 'log-2', 'phoneNumber': '+260971234567', 'text': ''})
+    finally:
+        root.removeHandler(handler)
+
+    records = [handler.queue.get_nowait() for _ in range(handler.queue.qsize())]
+    assert [record.route for record in records if record.getMessage() == 'ussd_hop'] == ['/at-ussd']
+
+
+def test_parse_sample_rates():
+    assert structured_log.parse_sample_rates('/at-ussd=0.1, /ussd = 2') == {'/at-ussd': 0.1, '/ussd': 1.0}
+    assert structured_log.parse_sample_rates('') == {}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = structured_log._QueueHandler(queue.Queue(maxsize=2))
+    for _ in range(5):
+        handler.emit(make_record("ussd_hop"))
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_no_prints_left_on_the_request_path():
+    offenders = []
+    paths = [os.path.join(ROOT, 'app.py')]
+    for package in ('services', 'models'):
+        directory = os.path.join(ROOT, package)
+        paths += [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.py')]
+
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if re.match(r'\s*print\(', line):
+                    offenders.append(f"{os.path.relpath(path, ROOT)}:{number}")
+
+    assert offenders == []
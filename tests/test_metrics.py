@@ -0,0 +1,149 @@
+import json
+import multiprocessing
+import os
+import threading
+
+import app as jowa
+from services import metrics
+from services.db_pool import ConnectionPool
+from services.session_store import MemorySessionStore
+from tests.test_unit_of_work import ScriptedConnection
+
+PHONE = '+260971234567'
+
+
+def value(name, **labels):
+    metric = metrics.collect(directory='').get(name)
+    if metric is None:
+        return 0
+    key = tuple(str(labels[label]) for label in metric['labels'])
+    return metric['samples'].get(key, 0)
+
+
+def observations(name, **labels):
+    """(count, sum) of a histogram"""
+    counts = value(name, **labels) or [0, 0]
+    return sum(counts[:-1]), counts[-1]
+
+
+def test_histograms_render_cumulative_buckets():
+    latency = metrics.histogram('test_render_seconds', "Test latency", ['route'], buckets=(0.1, 1))
+    for seconds in (0.05, 0.5, 0.5, 3):
+        latency.observe(seconds, route='/at-ussd')
+    metrics.counter('test_render_total', "Test count").inc(2)
+
+    text = metrics.render(metrics.collect(directory=''))
+
+    assert '# TYPE test_render_seconds histogram' in text
+    assert 'test_render_seconds_bucket{route="/at-ussd",le="0.1"} 1' in text
+    assert 'test_render_seconds_bucket{route="/at-ussd",le="1.0"} 3' in text
+    assert 'test_render_seconds_bucket{route="/at-ussd",le="+Inf"} 4' in text
+    assert 'test_render_seconds_sum{route="/at-ussd"} 4.05' in text
+    assert 'test_render_seconds_count{route="/at-ussd"} 4' in text
+    assert 'test_render_total 2' in text
+
+
+def _worker(directory, hops):
+    # A forked worker: counts its own hops and publishes them
+    metrics.begin_request('/at-ussd')
+    for _ in range(hops):
+        metrics.counter('test_worker_hops_total', "Hops per test worker").inc()
+    metrics.gauge('test_worker_busy', "Busy test workers").set(1)
+    metrics.write_snapshot(directory)
+
+
+def test_workers_are_added_up_and_dead_workers_keep_their_counts(tmp_path):
+    metrics.counter('test_worker_hops_total', "Hops per test worker").inc(100)
+    metrics._ensure_started()
+
+    fork = multiprocessing.get_context('fork')
+    children = [fork.Process(target=_worker, args=(str(tmp_path), hops)) for hops in (3, 4)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+        assert child.exitcode == 0
+
+    merged = metrics.collect(directory=str(tmp_path))
+    # The parent's 100 were not inherited by the forked workers
+    assert merged['test_worker_hops_total']['samples'][()] == 100 + 3 + 4
+    assert merged['test_worker_busy']['samples'][()] == 2
+
+    metrics.mark_process_dead(children[0].pid, directory=str(tmp_path))
+    merged = metrics.collect(directory=str(tmp_path))
+    assert merged['test_worker_hops_total']['samples'][()] == 107
+    assert merged['test_worker_busy']['samples'][()] == 1
+
+    with open(tmp_path / f"{children[0].pid}.json") as f:
+        assert 'test_worker_busy' not in json.load(f)['metrics']
+
+    metrics.clear_dir(str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_scrapes_and_the_flush_thread_can_write_at_once(tmp_path, monkeypatch):
+    metrics.counter('test_scrape_total', "Test scrapes").inc(5)
+    errors = []
+
+    def write_repeatedly():
+        try:
+            for _ in range(300):
+                metrics.write_snapshot(str(tmp_path))
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write_repeatedly) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(tmp_path) == [f"{os.getpid()}.json"]
+
+    # A scrape that can't publish still answers, with this process's numbers
+    def full_disk(directory, local):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(metrics, 'write_snapshot', full_disk)
+    metrics.counter('test_scrape_total', "Test scrapes").inc()
+    assert metrics.collect(directory=str(tmp_path))['test_scrape_total']['samples'][()] == 6
+
+
+def test_hops_are_timed_and_their_queries_counted_per_menu(monkeypatch):
+    conn = ScriptedConnection({'SELECT id, company_name FROM employers': [(3, 'BuildRight')],
+                               'FROM sms_outbox': [(5, 2, 30.0)]})
+    pool = ConnectionPool(connect=lambda: conn, min_size=0, max_size=1)
+    store = MemorySessionStore()
+    store.put('json-1', PHONE, 'main_menu', {})
+    monkeypatch.setattr(jowa, 'get_db_connection', pool.getconn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    client = jowa.app.test_client()
+
+    hops, _ = observations('jowa_ussd_hop_seconds', menu_level='main_menu')
+    _, hop_queries = observations('jowa_ussd_hop_db_queries', menu_level='main_menu')
+    requests = value('jowa_http_requests_total', route='/ussd', status=200)
+    queries = value('jowa_db_queries_total', route='/ussd')
+
+    response = client.post('/ussd', json={'sessionId': 'json-1', 'phoneNumber': PHONE, 'text': '2'})
+    assert response.status_code == 200
+
+    ran = len(conn.statements(''))
+    assert ran > 0
+    assert observations('jowa_ussd_hop_seconds', menu_level='main_menu')[0] == hops + 1
+    assert observations('jowa_ussd_hop_db_queries', menu_level='main_menu')[1] == hop_queries + ran
+    assert value('jowa_http_requests_total', route='/ussd', status=200) == requests + 1
+    assert value('jowa_db_queries_total', route='/ussd') == queries + ran
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'jowa_sms_outbox_pending 5' in text
+    assert 'jowa_ussd_hop_db_queries_bucket{menu_level="main_menu",le="+Inf"}' in text
+    assert 'jowa_db_pool_connections{state="in_use"} 0' in text
+
+
+def test_metrics_token_is_enforced(monkeypatch):
+    monkeypatch.setattr(jowa, 'METRICS_TOKEN', 'secret')
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: None)
+    client = jowa.app.test_client()
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
@@ -0,0 +1,89 @@
+import os
+import re
+
+import pytest
+
+from services.migrations import MIGRATIONS_DIR, MigrationError, load_migrations, migrate, status
+from tests.test_unit_of_work import ScriptedConnection, ScriptedCursor
+
+
+def write(directory, files):
+    for name, sql in files.items():
+        (directory / name).write_text(sql)
+    return load_migrations(str(directory))
+
+
+class FailingCursor(ScriptedCursor):
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        if 'BOOM' in sql:
+            raise RuntimeError('syntax error at or near "BOOM"')
+
+
+class FailingConnection(ScriptedConnection):
+    def cursor(self):
+        return FailingCursor(self)
+
+
+def test_migrations_are_ordered_by_version(tmp_path):
+    migrations = write(tmp_path, {
+        '0010_later.sql': 'SELECT 10', '0002_second.sql': 'SELECT 2', '0001_first.sql': 'SELECT 1', 'README.md': '',
+    })
+    assert [m.version for m in migrations] == [1, 2, 10]
+
+    (tmp_path / '0002_clash.sql').write_text('SELECT 2')
+    with pytest.raises(MigrationError):
+        load_migrations(str(tmp_path))
+
+
+def test_only_pending_migrations_run_each_in_its_own_transaction(tmp_path):
+    migrations = write(tmp_path, {
+        '0001_first.sql': 'CREATE TABLE a (id INT)', '0002_second.sql': 'CREATE TABLE b (id INT)',
+        '0003_third.sql': 'CREATE TABLE c (id INT)',
+    })
+    conn = ScriptedConnection({'FROM schema_version': [(1, migrations[0].checksum)]})
+
+    applied = migrate(conn, migrations, target=2)
+
+    assert [m.name for m in applied] == ['0002_second.sql']
+    assert conn.statements('CREATE TABLE a') == []
+    assert conn.statements('CREATE TABLE c') == []
+    assert conn.statements('INSERT INTO schema_version')[0][2][:2] == (2, '0002_second.sql')
+    assert conn.statements('pg_advisory_lock') and conn.statements('pg_advisory_unlock')
+
+
+def test_failed_migration_is_rolled_back_and_the_lock_released(tmp_path):
+    migrations = write(tmp_path, {'0001_first.sql': 'CREATE TABLE a (id INT)', '0002_bad.sql': 'BOOM'})
+    conn = FailingConnection()
+
+    with pytest.raises(RuntimeError):
+        migrate(conn, migrations)
+
+    assert [entry[2][0] for entry in conn.statements('INSERT INTO schema_version')] == [1]
+    assert conn.count('rollback') == 1
+    assert conn.statements('pg_advisory_unlock')
+
+
+def test_status_flags_edited_migrations(tmp_path):
+    migrations = write(tmp_path, {'0001_first.sql': 'SELECT 1', '0002_second.sql': 'SELECT 2'})
+    conn = ScriptedConnection({'FROM schema_version': [(1, 'not-the-checksum')]})
+
+    assert [state for _, state in status(conn, migrations)] == ['changed', 'pending']
+
+
+def test_shipped_migrations_create_everything_the_app_uses():
+    migrations = load_migrations()
+    assert [m.version for m in migrations] == list(range(1, len(migrations) + 1))
+
+    schema = ' '.join(m.sql for m in migrations)
+    for table in ('users', 'employers', 'jobs', 'applications', 'ussd_sessions', 'payments', 'payment_sessions',
+                  'payment_webhook_events', 'payment_daily_rollup', 'sms_outbox'):
+        assert f'CREATE TABLE IF NOT EXISTS {table} ' in schema
+    for index in ('idx_jobs_employer_created', 'idx_applications_job_applied', 'idx_payments_session',
+                  'idx_payments_transaction_id', 'idx_jobs_active_created'):
+        assert index in schema
+
+
+def test_app_no_longer_creates_tables_at_startup():
+    with open(os.path.join(os.path.dirname(MIGRATIONS_DIR), 'app.py'), encoding='utf-8') as f:
+        assert not re.search(r'CREATE (TABLE|INDEX)', f.read())
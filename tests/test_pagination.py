@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import app as jowa
+from services import pagination
+from services.session_store import MemorySessionStore
+from tests.test_unit_of_work import ScriptedConnection
+
+PHONE = '+260971234567'
+
+
+def job(job_id, day):
+    return (job_id, f'Job {job_id}', 'Lusaka', 50, 'daily', 'BuildRight', datetime(2024, 1, day, 9, 0))
+
+
+def test_pages_are_anchored_to_rows_already_shown():
+    page, bound = pagination.seek({}, pagination.FIRST)
+    assert (page, bound) == (0, None)
+
+    data = pagination.landed({}, 0, ['2024-01-09T09:00:00', 9], ['2024-01-07T09:00:00', 7])
+    assert pagination.seek(data, pagination.NEXT) == (1, ('<', ['2024-01-07T09:00:00', 7]))
+
+    data = pagination.landed(data, 1, ['2024-01-06T09:00:00', 6], ['2024-01-04T09:00:00', 4])
+    assert pagination.seek(data, pagination.PREVIOUS) == (0, ('<=', ['2024-01-09T09:00:00', 9]))
+    assert pagination.seek(data, pagination.CURRENT) == (1, ('<=', ['2024-01-06T09:00:00', 6]))
+
+
+def test_session_data_without_keys_starts_over():
+    assert pagination.seek({'page': 4}, pagination.NEXT) == (0, None)
+
+
+def test_keyset_clause():
+    assert pagination.keyset_clause('j.created_at', 'j.id', None) == ("", ())
+    clause, params = pagination.keyset_clause('j.created_at', 'j.id', ('<', ['2024-01-07T09:00:00', 7]))
+    assert clause == "AND (j.created_at, j.id) < (%s::timestamp, %s)"
+    assert params == ('2024-01-07T09:00:00', 7)
+
+
+def test_next_jobs_page_seeks_past_the_last_job_shown(monkeypatch):
+    conn = ScriptedConnection({
+        'SELECT id, full_name FROM users': [(1, 'John Banda')],
+        'FROM jobs j': [job(9, 9), job(8, 8), job(7, 7)],
+    })
+    store = MemorySessionStore()
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', True)
+
+    jowa.process_africas_talking_ussd('sess-1', PHONE, '1*1')
+    menu_level, data = store.get('sess-1')
+    assert menu_level == 'browse_jobs'
+    assert data['last'] == ['2024-01-07T09:00:00', 7]
+
+    conn.script['FROM jobs j'] = [job(6, 6), job(5, 5)]
+    response = jowa.process_africas_talking_ussd('sess-1', PHONE, '1*1*4')
+
+    assert response.startswith('CON Available Jobs:\n\n1. Job 6')
+    query = conn.statements('FROM jobs j')[-1]
+    assert 'OFFSET' not in query[1]
+    assert '(j.created_at, j.id) < (%s::timestamp, %s)' in query[1]
+    assert query[2] == ('2024-01-07T09:00:00', 7)
+    assert store.get('sess-1')[1]['page'] == 1
+
+
+def test_apply_uses_the_job_ids_shown(monkeypatch):
+    conn = ScriptedConnection({
+        'SELECT id, full_name FROM users': [(1, 'John Banda')],
+        'FROM jobs j': [job(9, 9), job(8, 8), job(7, 7)],
+        'INSERT INTO applications': [(41, '+260955000000')],
+    })
+    store = MemorySessionStore()
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', True)
+
+    jowa.process_africas_talking_ussd('sess-1', PHONE, '1*1')
+    # A job posted in between must not change what "2" means
+    conn.script['FROM jobs j'] = [job(10, 10), job(9, 9), job(8, 8)]
+    jobs_queries = len(conn.statements('FROM jobs j'))
+
+    response = jowa.process_africas_talking_ussd('sess-1', PHONE, '1*1*2')
+
+    assert response == 'END Application submitted for: Job 8\n\nEmployer will contact you soon!'
+    assert len(conn.statements('FROM jobs j')) == jobs_queries
+    inserts = conn.statements('INSERT INTO applications')
+    assert len(inserts) == 1
+    assert 'ON CONFLICT (job_id, user_id) DO NOTHING RETURNING id' in inserts[0][1]
+    assert inserts[0][2] == (8, PHONE)
@@ -0,0 +1,59 @@
+from datetime import date
+from decimal import Decimal
+
+import app as jowa
+from services.payment_rollup import rebuild_rollup, record_rollup
+from services.payments import complete_payment
+from tests.test_unit_of_work import ScriptedConnection
+
+DAY = date(2026, 10, 18)
+
+
+def test_finished_payments_are_folded_into_one_upsert():
+    conn = ScriptedConnection()
+    record_rollup(conn.cursor(), [
+        (DAY, 'mtn', 'Premium Job Posting', Decimal('10.00'), 'completed'),
+        (DAY, 'mtn', 'Premium Job Posting', Decimal('10.00'), 'completed'),
+        (DAY, 'mtn', 'Premium Job Posting', Decimal('10.00'), 'failed'),
+        (DAY, None, 'Premium Job Posting', Decimal('5.00'), 'completed'),
+    ])
+
+    upserts = conn.statements('INSERT INTO payment_daily_rollup')
+    assert len(upserts) == 1
+    assert upserts[0][2] == [DAY, '', 'Premium Job Posting', 1, Decimal('5.00'), 0,
+                             DAY, 'mtn', 'Premium Job Posting', 2, Decimal('20.00'), 1]
+
+
+def test_completion_updates_the_rollup_in_the_same_transaction():
+    conn = ScriptedConnection({
+        'RETURNING session_id': [('sess-1', '+260971234567', Decimal('10.00'), 'Premium Job Posting', 'MTN-1', 'mtn', DAY)],
+    })
+
+    assert complete_payment(conn.cursor(), 'completed', payment_id=7)
+
+    assert conn.statements('INSERT INTO payment_daily_rollup')[0][2] == [
+        DAY, 'mtn', 'Premium Job Posting', 1, Decimal('10.00'), 0]
+    assert conn.count('commit') == 0
+
+
+def test_dashboard_reads_only_the_rollup():
+    conn = ScriptedConnection({
+        'FROM payment_daily_rollup': [(Decimal('120.00'),)],
+    })
+    cur = conn.cursor()
+
+    assert jowa.get_total_revenue(cur) == Decimal('120.00')
+    jowa.get_daily_transactions(cur)
+
+    assert [entry for entry in conn.log if 'FROM payments' in entry[1]] == []
+    assert 'day = CURRENT_DATE' in conn.statements('payment_daily_rollup')[1][1]
+
+
+def test_rebuild_replaces_the_rollup_from_payments():
+    conn = ScriptedConnection()
+    rebuild_rollup(conn.cursor())
+
+    statements = [entry[1] for entry in conn.log]
+    assert statements[0].startswith('LOCK TABLE payment_daily_rollup')
+    assert statements[1] == 'DELETE FROM payment_daily_rollup'
+    assert 'GROUP BY 1, 2, 3' in statements[2]
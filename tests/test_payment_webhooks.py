@@ -0,0 +1,183 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import app as jowa
+from services.payment_webhooks import (APPLIED, DUPLICATE, REJECTED, UNKNOWN, WebhookEvent, WebhookIngestor,
+                                       _Pending, parse_webhook, plan_batch)
+from tests.test_unit_of_work import ScriptedConnection
+
+DAY = date(2026, 10, 18)
+
+
+def event(key, transaction_id, status):
+    return WebhookEvent(key, transaction_id, status, {})
+
+
+def test_parse_webhook_keys_by_header_event_id_or_report():
+    body = {'transactionId': 'MTN-1', 'status': 'SUCCESS'}
+    assert parse_webhook(body, {}).key == 'MTN-1:completed'
+    assert parse_webhook(dict(body, eventId='ev-9'), {}).key == 'ev-9'
+    assert parse_webhook(dict(body, eventId='ev-9'), {'Idempotency-Key': 'k-1'}).key == 'k-1'
+    assert parse_webhook({'transactionId': 'MTN-1', 'status': 'weird'}, {}) is None
+
+
+def test_plan_applies_in_arrival_order_and_rejects_going_backwards():
+    payments = {'MTN-1': (7, 'queued'), 'MTN-2': (8, 'completed')}
+    events = [
+        event('a', 'MTN-1', 'processing'),
+        event('b', 'MTN-1', 'completed'),
+        event('b', 'MTN-1', 'completed'),
+        event('c', 'MTN-1', 'processing'),
+        event('d', 'MTN-2', 'failed'),
+        event('e', 'MTN-3', 'completed'),
+        event('seen', 'MTN-2', 'completed'),
+    ]
+
+    outcomes, changes, records = plan_batch(events, payments, {'seen'})
+
+    assert outcomes == [APPLIED, APPLIED, DUPLICATE, REJECTED, REJECTED, UNKNOWN, DUPLICATE]
+    assert changes == {7: 'completed'}
+    assert [(e.key, outcome) for e, outcome in records] == [
+        ('a', APPLIED), ('b', APPLIED), ('c', REJECTED), ('d', REJECTED)]
+
+
+def test_batch_is_one_update_and_one_insert():
+    conn = ScriptedConnection({
+        'FROM payments': [('MTN-1', 7, 'processing'), ('MTN-2', 8, 'processing')],
+        'RETURNING p.session_id': [('s1', '+260971', 10, 'Premium', 'MTN-1', 'completed', 'mtn', DAY),
+                                   ('s2', '+260972', 10, 'Premium', 'MTN-2', 'failed', 'mtn', DAY)],
+    })
+    ingestor = WebhookIngestor(lambda: conn)
+
+    batch = [_Pending(event('a', 'MTN-1', 'completed')), _Pending(event('b', 'MTN-2', 'failed'))]
+    ingestor.flush(batch)
+
+    assert [pending.outcome for pending in batch] == [APPLIED, APPLIED]
+    assert len(conn.statements('UPDATE payments AS p')) == 1
+    assert len(conn.statements('INSERT INTO payment_webhook_events')) == 1
+    assert len(conn.statements('UPDATE payment_sessions')) == 2
+    assert conn.statements('INSERT INTO payment_daily_rollup')[0][2] == [DAY, 'mtn', 'Premium', 1, 10, 1]
+    assert conn.count('commit') == 1
+
+
+class FakePaymentsDB:
+    """Just enough of payments / payment_webhook_events to replay webhooks against"""
+
+    def __init__(self, payments):
+        self.payments = payments            # id -> dict
+        self.events = {}
+        self.sms = []
+        self.sessions = []
+        self.transaction_lock = threading.Lock()
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.locked = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def _begin(self):
+        # Stands in for the FOR UPDATE row locks: one batch at a time
+        if not self.locked:
+            self.db.transaction_lock.acquire()
+            self.locked = True
+
+    def commit(self):
+        self.rollback()
+
+    def rollback(self):
+        if self.locked:
+            self.locked = False
+            self.db.transaction_lock.release()
+
+    def close(self):
+        self.rollback()
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.db = conn.db
+        self.result = []
+
+    def execute(self, sql, params=None):
+        self.conn._begin()
+        self.result = []
+        if 'FOR UPDATE' in sql:
+            wanted = set(params[0])
+            self.result = sorted((p['transaction_id'], payment_id, p['status'])
+                                 for payment_id, p in self.db.payments.items() if p['transaction_id'] in wanted)
+        elif 'SELECT idempotency_key' in sql:
+            self.result = [(key,) for key in params[0] if key in self.db.events]
+        elif 'UPDATE payments AS p' in sql:
+            for payment_id, status in zip(params[::2], params[1::2]):
+                p = self.db.payments[payment_id]
+                p['status'] = status
+                self.result.append((p['session_id'], p['phone_number'], 10, 'Premium', p['transaction_id'], status,
+                                    'mtn', DAY))
+        elif 'INSERT INTO payment_webhook_events' in sql:
+            for i in range(0, len(params), 5):
+                self.db.events.setdefault(params[i], params[i + 3])
+        elif 'UPDATE payment_sessions' in sql:
+            self.db.sessions.append(params)
+        elif 'INSERT INTO sms_outbox' in sql:
+            self.db.sms.append(params)
+
+    def fetchall(self):
+        return list(self.result)
+
+    def close(self):
+        pass
+
+
+def test_replaying_thousands_of_webhooks(monkeypatch):
+    count = 200
+    # As many callbacks in flight as one gunicorn worker has threads (gunicorn.conf.py)
+    threads = int(os.getenv('GUNICORN_THREADS', '4'))
+    db = FakePaymentsDB({
+        n: {'transaction_id': f"MTN-{n}", 'status': 'processing', 'session_id': f"s{n}", 'phone_number': f"+26097{n:07d}"}
+        for n in range(count)
+    })
+    ingestor = WebhookIngestor(db.connect, window=0.005)
+    monkeypatch.setattr(jowa, 'get_webhook_ingestor', lambda: ingestor)
+    client = jowa.app.test_client()
+
+    def final(n):
+        return 'SUCCESS' if n % 3 else 'FAILED'
+
+    def replay(n):
+        transaction_id = f"MTN-{n}"
+        sent = [
+            ({'transactionId': transaction_id, 'status': 'PENDING'}, {}),
+            ({'transactionId': transaction_id, 'status': final(n)}, {}),
+            ({'transactionId': transaction_id, 'status': final(n)}, {}),  # provider retry
+            ({'transactionId': transaction_id, 'status': 'PENDING', 'eventId': f"late-{n}"}, {}),
+            ({'transactionId': f"AIRTEL-{n}", 'status': 'SUCCESS'}, {'Idempotency-Key': f"k-{n}"}),
+        ]
+        answers = []
+        for body, headers in sent:
+            response = client.post('/payment-webhook', json=body, headers=headers)
+            answers.append((response.status_code, response.get_json().get('outcome')))
+        return answers
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        answers = list(pool.map(replay, range(count)))
+
+    total = count * 5
+
+    assert all(a == [(200, DUPLICATE), (200, APPLIED), (200, DUPLICATE), (200, REJECTED), (404, None)]
+               for a in answers)
+    assert all(db.payments[n]['status'] == ('completed' if n % 3 else 'failed') for n in range(count))
+    assert len(db.sms) == count
+    assert len(db.sessions) == count
+    assert ingestor.stats['events'] == total
+    # Callbacks in flight together went out together
+    assert ingestor.stats['batches'] < total / 2
@@ -0,0 +1,153 @@
+from datetime import date, datetime
+
+import app as jowa
+from services.payment_providers import SimulatedProvider
+from services.payment_webhooks import WebhookIngestor
+from services.payments import PaymentWorker
+from services.session_store import MemorySessionStore
+from tests.test_unit_of_work import ScriptedConnection, ScriptedCursor
+
+PHONE = '+260971234567'
+COMPLETED = ('sess-1', PHONE, 10, 'Premium Job Posting', 'MTN-SIM-000001', 'mtn', date(2026, 10, 18))
+
+
+def worker_for(conn, client, **options):
+    return PaymentWorker(lambda: conn, 'mtn', client, **options)
+
+
+class FailingCursor(ScriptedCursor):
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        if self.conn.fail_on and self.conn.fail_on in sql:
+            self.conn.fail_on = None
+            raise ConnectionError('server closed the connection unexpectedly')
+
+
+def test_confirming_queues_the_payment_and_answers_at_once(monkeypatch):
+    conn = ScriptedConnection({
+        'FROM payment_sessions': [(10, 'mtn', 'Premium Job Posting')],
+        "status = 'queued'": [(7, 10, 'Premium Job Posting')],
+    })
+    store = MemorySessionStore()
+    store.put('sess-1', PHONE, 'payment_confirmation', {})
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', False)
+
+    response = jowa.process_africas_talking_ussd('sess-1', PHONE, '3*2*1*1')
+
+    assert response.startswith('END Payment pending')
+    queued = conn.statements("SET status = 'queued'")
+    assert queued[0][2] == ('mtn', 'sess-1')
+    assert conn.count('commit') == 1
+
+
+def test_history_shows_payments_in_flight_as_pending(monkeypatch):
+    created = datetime(2026, 10, 18, 9, 0)
+    conn = ScriptedConnection({'FROM payments WHERE phone_number': [
+        ('Premium Job Posting', 10, status, created, None, n) for n, status in
+        enumerate(('queued', 'submitting', 'processing', 'completed', 'failed'), 1)]})
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', MemorySessionStore)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', True)
+
+    response = jowa.process_africas_talking_ussd('sess-1', PHONE, '3*1')
+
+    icons = [line.split()[1] for line in response.splitlines() if line.startswith('   K10')]
+    assert icons == ['⏳', '⏳', '⏳', '✅', '❌']
+
+
+def test_worker_submits_queued_payments():
+    conn = ScriptedConnection({"SET status = 'submitting'": [(7, PHONE, 10, 'Premium Job Posting', 1)]})
+    client = SimulatedProvider('mtn', outcome=lambda payment: 'completed')
+
+    worker_for(conn, client).run_once()
+
+    submitted = conn.statements("SET status = 'processing'")
+    assert submitted[0][2][0] == 'MTN-SIM-000001'
+    assert client.payments['MTN-SIM-000001']['payment']['phone_number'] == PHONE
+    # Claimed, then the reference recorded, each in its own transaction
+    assert [entry[0] for entry in conn.log if entry[0] in ('execute', 'commit')][:4] == [
+        'execute', 'commit', 'execute', 'commit']
+
+
+def test_reference_lost_to_a_failed_commit_is_not_charged_again():
+    conn = ScriptedConnection({"SET status = 'submitting'": [(7, PHONE, 10, 'Premium Job Posting', 1)]})
+    conn.cursor = lambda: FailingCursor(conn)
+    conn.fail_on = "SET status = 'processing'"
+    client = SimulatedProvider('mtn', outcome=lambda payment: 'completed')
+    worker = worker_for(conn, client)
+
+    worker.run_once()
+    assert conn.count('rollback') == 1
+    assert not conn.statements("SET status = 'queued'")
+
+    # Claimed again once its lease runs out: same key, same reference, one charge
+    worker.run_once()
+    assert [entry[2][0] for entry in conn.statements("SET status = 'processing'")] == ['MTN-SIM-000001'] * 2
+    assert list(client.payments) == ['MTN-SIM-000001']
+    assert worker.stats['submitted'] == 1
+
+
+def test_failed_requests_are_retried_then_failed():
+    client = SimulatedProvider('mtn', fail_requests=2)
+    conn = ScriptedConnection({"SET status = 'submitting'": [(7, PHONE, 10, 'Premium Job Posting', 1)]})
+    worker_for(conn, client, max_attempts=2).run_once()
+    assert conn.statements("SET status = 'queued'")[0][2][1:] == (5, 7)
+
+    conn = ScriptedConnection({
+        'RETURNING session_id, phone_number': [COMPLETED],
+        "SET status = 'submitting'": [(7, PHONE, 10, 'Premium Job Posting', 2)],
+    })
+    worker = worker_for(conn, client, max_attempts=2)
+    worker.run_once()
+    assert conn.statements("RETURNING session_id")[0][2] == ('failed', 7)
+    assert worker.stats['failed'] == 1
+
+
+def test_polling_completes_the_payment_and_queues_the_sms():
+    client = SimulatedProvider('mtn', outcome=lambda payment: 'completed', pending_polls=1)
+    reference = client.request_payment({'id': 7, 'phone_number': PHONE, 'amount': 10, 'purpose': 'Premium'})
+    conn = ScriptedConnection({
+        'RETURNING session_id, phone_number': [COMPLETED],
+        "status = 'processing' AND next_poll_at": [(7, reference, False)],
+    })
+    worker = worker_for(conn, client)
+
+    worker.run_once()
+    assert conn.statements('RETURNING session_id') == []
+
+    worker.run_once()
+    assert conn.statements('RETURNING session_id')[0][2] == ('completed', 7)
+    assert 'completed successfully' in conn.statements('INSERT INTO sms_outbox')[0][2][1]
+
+
+def test_payment_still_pending_after_the_timeout_fails():
+    client = SimulatedProvider('mtn', pending_polls=100)
+    reference = client.request_payment({'id': 7, 'phone_number': PHONE, 'amount': 10, 'purpose': 'Premium'})
+    conn = ScriptedConnection({
+        'RETURNING session_id, phone_number': [COMPLETED],
+        "status = 'processing' AND next_poll_at": [(7, reference, True)],
+    })
+
+    worker_for(conn, client).run_once()
+
+    assert conn.statements('RETURNING session_id')[0][2] == ('failed', 7)
+
+
+def test_webhook_completes_the_payment(monkeypatch):
+    conn = ScriptedConnection({
+        'FROM payments': [('MTN-SIM-000001', 7, 'processing')],
+        'RETURNING p.session_id': [COMPLETED[:5] + ('completed',) + COMPLETED[5:]],
+    })
+    ingestor = WebhookIngestor(lambda: conn, window=0)
+    monkeypatch.setattr(jowa, 'get_webhook_ingestor', lambda: ingestor)
+
+    response = jowa.app.test_client().post('/payment-webhook', json={
+        'transactionId': 'MTN-SIM-000001', 'status': 'SUCCESS',
+    })
+
+    assert response.status_code == 200
+    assert conn.statements('UPDATE payments AS p')[0][2] == [7, 'completed']
+    assert 'completed successfully' in conn.statements('INSERT INTO sms_outbox')[0][2][1]
+    assert conn.count('commit') == 1
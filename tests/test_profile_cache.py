@@ -0,0 +1,68 @@
+import app as jowa
+from services.profile_cache import ProfileCache
+from services.repository import ProfileRow
+from services.session_store import MemorySessionStore
+from tests.test_metrics import value
+from tests.test_session_store import FakeClock
+from tests.test_unit_of_work import ScriptedConnection
+
+PHONE = '+260971234567'
+PROFILE = ProfileRow(1, 'John Banda')
+
+
+def test_profiles_expire_and_the_least_recently_used_go_first():
+    clock = FakeClock()
+    cache = ProfileCache(ttl=60, max_entries=2, clock=clock)
+    for phone in ('+260971000001', '+260971000002'):
+        cache.put(phone, 'seeker', PROFILE, cache.generation)
+    cache.get('+260971000001', 'seeker')
+    cache.put('+260971000003', 'seeker', PROFILE, cache.generation)
+
+    assert cache.get('+260971000002', 'seeker') is None
+    assert cache.get('+260971000001', 'seeker') is PROFILE
+
+    clock.now += 61
+    assert cache.get('+260971000001', 'seeker') is None
+
+
+def test_profile_loaded_across_an_invalidation_is_not_stored():
+    cache = ProfileCache()
+    generation = cache.generation
+    cache.invalidate(PHONE)
+    cache.put(PHONE, 'seeker', PROFILE, generation)
+
+    assert cache.get(PHONE, 'seeker') is None
+
+
+def test_later_hops_skip_the_profile_query(monkeypatch, profile_cache):
+    conn = ScriptedConnection({'SELECT id, full_name FROM users': [(1, 'John Banda')]})
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', MemorySessionStore)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', True)
+    hits = value('jowa_profile_cache_lookups_total', role='seeker', result='hit')
+
+    first = jowa.process_africas_talking_ussd('sess-1', PHONE, '1')
+    second = jowa.process_africas_talking_ussd('sess-2', PHONE, '1')
+
+    assert first == second and first.startswith('CON Welcome John Banda!')
+    assert len(conn.statements('FROM users')) == 1
+    assert profile_cache.stats['hits'] == 1
+    assert value('jowa_profile_cache_lookups_total', role='seeker', result='hit') == hits + 1
+
+
+def test_profile_update_drops_the_cached_profile_on_commit(monkeypatch, profile_cache):
+    conn = ScriptedConnection({'INSERT INTO users': [(1,)]})
+    store = MemorySessionStore()
+    store.put('sess-1', PHONE, 'job_seeker_registration', {'step': 3, 'full_name': 'John Phiri', 'skills': 'Farming'})
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', False)
+    profile_cache.put(PHONE, 'seeker', PROFILE, profile_cache.generation)
+
+    response = jowa.process_africas_talking_ussd('sess-1', PHONE, '1*3*John Phiri*Farming*Kitwe')
+
+    # The dashboard after the write shows the new name, without reading it back
+    assert response.startswith('CON Welcome John Phiri!')
+    assert not conn.statements('SELECT id, full_name')
+    assert conn.count('commit') == 1
+    assert profile_cache.get(PHONE, 'seeker') is None
@@ -0,0 +1,120 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+import pytest
+
+import app as jowa
+from services import profiler
+from services.db_pool import ConnectionPool, set_pool
+from tests.stand_in_database import StandInDatabase
+
+TOKEN = 'test-admin-token'
+AUTH = {'Authorization': f"Bearer {TOKEN}"}
+SEEKER = '+260971000001'
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(profiler, 'PROFILE_INTERVAL', 0.001)
+    monkeypatch.setattr(jowa, 'ADMIN_TOKEN', TOKEN)
+    profiler._forget_control()
+    yield tmp_path
+    profiler.stop()
+    profiler._forget_control()
+
+
+def test_control_needs_the_admin_token(monkeypatch):
+    client = jowa.app.test_client()
+    monkeypatch.setattr(jowa, 'ADMIN_TOKEN', '')
+    assert client.post('/admin/profile', headers=AUTH).status_code == 404
+
+    monkeypatch.setattr(jowa, 'ADMIN_TOKEN', TOKEN)
+    assert client.post('/admin/profile', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+
+def test_sampled_ussd_requests_come_back_as_collapsed_stacks(profile_dir, monkeypatch):
+    # No sampler thread: each hop takes one sample of itself, mid-request
+    hop = jowa.process_africas_talking_ussd
+
+    def sampled_hop(*args):
+        assert profiler.sample()
+        return hop(*args)
+
+    monkeypatch.setattr(profiler, '_ensure_sampler', lambda: None)
+    monkeypatch.setattr(jowa, 'process_africas_talking_ussd', sampled_hop)
+    db = StandInDatabase()
+    set_pool(ConnectionPool(connect=db.connect, max_size=2))
+    client = jowa.app.test_client()
+    try:
+        started = client.post('/admin/profile', json={'percent': 100, 'seconds': 30}, headers=AUTH)
+        assert started.status_code == 202
+        for _ in range(3):
+            client.post('/at-ussd', data={'sessionId': 'profile-1', 'phoneNumber': SEEKER, 'text': '1*1'})
+        assert client.delete('/admin/profile', headers=AUTH).status_code == 200
+    finally:
+        set_pool(None)
+
+    stacks = client.get('/admin/profile', headers=AUTH)
+    assert stacks.headers['X-Profile-Id'] == started.get_json()['id']
+    counts = profiler.parse(stacks.get_data(as_text=True))
+    assert sum(counts.values()) == 3
+    assert all('app.py:africas_talking_ussd;test_profiler.py:sampled_hop' in stack for stack in counts)
+
+
+def test_concurrent_flushes_each_write_a_whole_file(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiler, '_profile_id', 'concurrent')
+    monkeypatch.setattr(profiler, '_counts', Counter({'app.py:hop': 1}))
+    errors = []
+
+    def flush_repeatedly():
+        try:
+            for _ in range(300):
+                profiler.flush()
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=flush_repeatedly) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert os.listdir(profile_dir / 'concurrent') == [f"{os.getpid()}.collapsed"]
+
+
+def test_a_failing_sampler_lets_the_next_request_start_another(profile_dir, monkeypatch):
+    def broken():
+        raise OSError('profile dir went away')
+
+    monkeypatch.setattr(profiler, 'active_control', broken)
+    monkeypatch.setattr(profiler, '_sampler_pid', os.getpid())
+
+    profiler._sample_until_closed()
+
+    assert profiler._sampler_pid is None
+
+
+def test_only_ussd_routes_and_the_chosen_share_are_picked(profile_dir):
+    profiler.start(percent=10, seconds=30)
+    try:
+        assert not profiler.begin_request('/health', rand=lambda: 0.0)
+        assert not profiler.begin_request('/at-ussd', rand=lambda: 0.5)
+        assert profiler.begin_request('/ussd', rand=lambda: 0.05)
+    finally:
+        profiler.end_request()
+
+    profiler.stop()
+    assert not profiler.begin_request('/ussd', rand=lambda: 0.0)
+
+
+def test_collapse_runs_from_the_outermost_frame():
+    def inner():
+        return profiler.collapse(sys._getframe())
+
+    stack = inner()
+    assert stack.endswith('test_profiler.py:test_collapse_runs_from_the_outermost_frame;test_profiler.py:inner')
+    assert profiler.parse(profiler.render(profiler.parse("a;b 2\na;c 1\na;b 3\n"))) == {'a;b': 5, 'a;c': 1}
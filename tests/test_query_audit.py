@@ -0,0 +1,88 @@
+import pytest
+
+import app as jowa
+from services import loadtest, metrics, query_audit
+from services.db_pool import ConnectionPool, set_pool
+from services.session_store import DatabaseSessionStore, set_session_store
+from tests.stand_in_database import StandInDatabase
+
+SEEKER = '+260971000001'
+
+
+def record(statements, route='/at-ussd', menu_level='main_menu'):
+    statements = [metrics.Statement(sql, params, 0.0, 0.001, 1) for sql, params in statements]
+    return metrics.RequestRecord(route, 200, 0.01, len(statements), 0.0, menu_level, statements)
+
+
+@pytest.fixture
+def stand_in():
+    db = StandInDatabase()
+    set_pool(ConnectionPool(connect=db.connect, max_size=4))
+    set_session_store(DatabaseSessionStore())
+    yield db
+    set_pool(None)
+    set_session_store(None)
+
+
+def test_fingerprints_ignore_literals_and_layout():
+    assert query_audit.fingerprint("SELECT id FROM jobs\n   WHERE id = %s AND status = 'active' LIMIT 3") == \
+        "SELECT id FROM jobs WHERE id = ? AND status = ? LIMIT ?"
+    assert query_audit.fingerprint("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)") == \
+        query_audit.fingerprint("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y')")
+
+
+def test_audit_finds_duplicates_loops_and_blown_budgets():
+    lookup = "SELECT full_name FROM users WHERE phone_number = %s"
+    per_job = "SELECT COUNT(*) FROM applications WHERE job_id = %s"
+    statements = [(lookup, (SEEKER,)), (lookup, (SEEKER,))] + [(per_job, (n,)) for n in range(4)]
+    query_audit.set_budgets({'browse_jobs': 5}, {'/at-ussd': 10})
+    try:
+        findings = query_audit.audit(record(statements, menu_level='browse_jobs'))
+        assert query_audit.budget_for('/at-ussd', 'main_menu') == 10
+    finally:
+        query_audit.set_budgets(jowa.HOP_QUERY_BUDGETS, jowa.ROUTE_QUERY_BUDGETS)
+
+    assert [(finding.kind, finding.count) for finding in findings] == [
+        ('duplicate', 2), ('repeated', 4), ('over_budget', 6)]
+    assert findings[2].budget == 5
+    # Different parameters are different queries
+    assert query_audit.audit(record([(lookup, (SEEKER,)), (lookup, ('+260971000002',))])) == []
+
+
+def test_strict_mode_keeps_what_the_listener_finds():
+    lookup = "SELECT company_name FROM employers WHERE phone_number = %s"
+    metrics.begin_request('/at-ussd')
+    metrics.tag_request('employer_dashboard')
+    for _ in range(3):
+        metrics.record_query(0.001, metrics.Statement(lookup, (SEEKER,), 0.0, 0.001, 1))
+    metrics.end_request(200)
+
+    found = query_audit.violations()
+    query_audit.clear_violations()
+    assert [(finding.kind, finding.menu_level) for finding in found] == [
+        ('duplicate', 'employer_dashboard'), ('over_budget', 'employer_dashboard')]
+
+
+def test_dashboard_hop_looks_the_caller_up_once(stand_in):
+    loadtest.seed(stand_in.connect().cursor(), [{'phone_number': SEEKER, 'role': 'seeker'}])
+    client = jowa.app.test_client()
+    seen = []
+    metrics.add_request_listener(seen.append)
+    try:
+        client.post('/at-ussd', data={'sessionId': 'audit-1', 'phoneNumber': SEEKER, 'text': '1'})
+    finally:
+        metrics.remove_request_listener(seen.append)
+
+    lookups = [statement for statement in seen[0].statements if 'full_name' in statement.sql]
+    assert seen[0].menu_level == 'main_menu'
+    assert len(lookups) == 1
+
+
+def test_every_flow_stays_within_its_budgets(stand_in):
+    # The conftest fixture fails the test on any duplicate query or blown budget
+    sessions = loadtest.generate_sessions(140, seed=5, mix={flow: 1 for flow in loadtest.FLOWS})
+    loadtest.seed(stand_in.connect().cursor(), sessions)
+
+    results, elapsed = loadtest.replay(jowa.app, sessions, concurrency=4)
+
+    assert loadtest.summarize(results, sessions, elapsed)['overall']['errors'] == 0
@@ -0,0 +1,136 @@
+import psycopg2
+import pytest
+
+import app as jowa
+from services import loadtest, metrics, pagination, repository
+from services.db_pool import ConnectionPool, set_pool
+from services.session_store import DatabaseSessionStore, set_session_store
+from tests.stand_in_database import StandInDatabase
+from tests.test_unit_of_work import ScriptedConnection
+
+SEEKER = '+260971000001'
+
+
+@pytest.fixture
+def prepared_pool():
+    db = StandInDatabase()
+    loadtest.seed(db.connect().cursor(), [{'phone_number': SEEKER, 'role': 'seeker'},
+                                          {'phone_number': '+260961000001', 'role': 'employer'}])
+    connections = []
+
+    def connect():
+        connections.append(db.connect())
+        return connections[-1]
+
+    set_pool(ConnectionPool(connect=connect, max_size=1, prepared_statements=True))
+    set_session_store(DatabaseSessionStore())
+    yield connections
+    set_pool(None)
+    set_session_store(None)
+
+
+def test_prepared_queries_number_their_placeholders():
+    query = repository.Query('lookup', """
+        SELECT full_name FROM users
+        WHERE phone_number = %s AND id > %s
+    """, prepare=True)
+
+    assert query.sql == "SELECT full_name FROM users WHERE phone_number = %s AND id > %s"
+    assert query.prepare_sql == "PREPARE jowa_lookup AS SELECT full_name FROM users WHERE phone_number = $1 AND id > $2"
+    assert query.execute_sql == "EXECUTE jowa_lookup (%s, %s)"
+
+
+def test_pooled_connections_prepare_once_then_only_execute(prepared_pool):
+    seen = []
+
+    def listen(cursor, statement, error):
+        seen.append(statement.sql)
+
+    client = jowa.app.test_client()
+    metrics.add_query_listener(listen)
+    try:
+        first = client.post('/at-ussd', data={'sessionId': 'repo-1', 'phoneNumber': SEEKER, 'text': '1*1'})
+        prepared = dict(prepared_pool[0].prepared)
+        del seen[:]
+        second = client.post('/at-ussd', data={'sessionId': 'repo-2', 'phoneNumber': SEEKER, 'text': '1*1'})
+    finally:
+        metrics.remove_query_listener(listen)
+
+    assert first.get_data(as_text=True) == second.get_data(as_text=True)
+    assert 'jowa_jobs_page' in prepared and 'jowa_upsert_session' in prepared
+    # Nothing new to prepare, and the PREPAREs never reached the timed cursor
+    assert prepared_pool[0].prepared == prepared
+    assert any(sql.startswith('EXECUTE jowa_jobs_page') for sql in seen)
+    assert not any(sql.startswith('PREPARE') for sql in seen)
+
+
+def test_other_cursors_run_the_plain_sql():
+    conn = ScriptedConnection({'SELECT id, full_name FROM users': [(7, 'Mwila')]})
+
+    assert repository.user_profile(conn.cursor(), SEEKER) == (7, 'Mwila')
+    assert conn.statements('SELECT id, full_name FROM users WHERE phone_number = %s')
+    assert not conn.statements('PREPARE')
+
+
+@pytest.fixture
+def postgres_cursor(postgres_url):
+    """A prepared-statement pool cursor on the real database, in a transaction that is rolled back"""
+    pool = ConnectionPool(connect=lambda: psycopg2.connect(postgres_url), max_size=1, prepared_statements=True)
+    conn = pool.getconn()
+    cur = conn.cursor()
+    try:
+        yield cur
+    finally:
+        cur.close()
+        conn.rollback()
+        conn.close()
+        pool.closeall()
+
+
+def test_every_query_runs_on_postgresql(postgres_cursor):
+    cur = postgres_cursor
+    seeker, employer, session = '+260979990001', '+260969990001', 'repository-test'
+
+    # The first round PREPAREs, the second only EXECUTEs
+    for round_ in range(2):
+        repository.write_session(cur, session, seeker, 'main_menu', '{"page": 0}')
+        repository.write_session(cur, session, None, 'browse_jobs', '{"page": 1}')
+        repository.write_sessions(cur, [(session, seeker, 'browse_jobs', '{"page": 2}')])
+        assert repository.read_session(cur, session).menu_level == 'browse_jobs'
+
+        repository.create_user(cur, seeker)
+        user_id = repository.save_seeker(cur, seeker, 'Mary Banda', 'Farming', 'Lusaka')
+        employer_id = repository.save_employer(cur, employer, 'BuildRight Ltd', 'Construction')
+        assert repository.user_exists(cur, seeker)
+        assert repository.user_profile(cur, seeker) == (user_id, 'Mary Banda')
+        assert repository.employer_profile(cur, employer) == (employer_id, 'BuildRight Ltd')
+
+        repository.insert_job(cur, employer_id, f"Bricklayer {round_}", "Repository test", 'Lusaka', 50, 'daily')
+        jobs = repository.jobs_page(cur, None)
+        job = jobs[0]
+        assert job.title == f"Bricklayer {round_}"
+        for operator in ('<', '<='):
+            repository.jobs_page(cur, (operator, pagination.row_key(job.created_at, job.id)))
+
+        applied = repository.apply(cur, job.id, seeker)
+        assert applied.employer_phone == employer
+        assert repository.apply(cur, job.id, seeker) is None
+        applications = repository.applications_page(cur, seeker, None)
+        last = applications[-1]
+        repository.applications_page(cur, seeker, ('<', pagination.row_key(last.applied_at, last.id)))
+        assert repository.employer_jobs(cur, employer)[0].application_count == 1
+        assert repository.employer_applications(cur, employer)[0].applicant_phone == seeker
+
+        payment_id = repository.create_payment(cur, session, seeker, 10, 'Premium Job Posting', "Repository test")
+        repository.save_premium_session(cur, session, seeker, 10)
+        repository.save_payment_session(cur, session, seeker, 10, 'mtn', 'Premium Job Posting')
+        assert repository.pending_payment_session(cur, session).provider == 'mtn'
+        repository.cancel_payment(cur, session)
+        assert repository.payment_by_transaction(cur, f"REPOSITORY-TEST-{payment_id}") is None
+        payments = repository.payments_page(cur, seeker, None)
+        assert payments[0].status == 'cancelled'
+        repository.payments_page(cur, seeker, ('<', pagination.row_key(payments[0].created_at, payments[0].id)))
+        repository.total_revenue(cur)
+        repository.daily_transactions(cur)
+
+    assert {'jowa_read_session', 'jowa_jobs_page_after', 'jowa_jobs_page_from'} <= cur.prepared
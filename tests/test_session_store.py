@@ -0,0 +1,106 @@
+import pytest
+
+import app as jowa
+from services.session_store import MemorySessionStore, RedisSessionStore, SessionStore, SessionWriteBehind
+from tests.test_unit_of_work import ScriptedConnection
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Local stand-in for a Redis server: get/set(ex=)/delete only"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode('utf-8')
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def test_incomplete_store_fails_when_created():
+    class NoDelete(SessionStore):
+        def get(self, session_id, cur=None):
+            return None
+
+        def put(self, session_id, phone_number, menu_level, data, cur=None):
+            pass
+
+    with pytest.raises(TypeError):
+        NoDelete()
+
+
+def test_memory_store_expires_sessions():
+    clock = FakeClock()
+    store = MemorySessionStore(ttl=120, clock=clock)
+
+    store.put('sess-1', '+260971234567', 'browse_jobs', {'page': 2})
+    assert store.get('sess-1') == ('browse_jobs', {'page': 2})
+
+    clock.now += 121
+    assert store.get('sess-1') is None
+
+
+def test_memory_store_returns_copies():
+    store = MemorySessionStore()
+    store.put('sess-1', '+260971234567', 'post_job', {'step': 1})
+
+    _, data = store.get('sess-1')
+    data['step'] = 5
+
+    assert store.get('sess-1') == ('post_job', {'step': 1})
+
+
+def test_redis_store_round_trip():
+    client = FakeRedis()
+    store = RedisSessionStore(client, ttl=120)
+
+    store.put('sess-1', '+260971234567', 'employer_registration', {'step': 2})
+
+    assert 'jowa:ussd:sess-1' in client.values
+    assert store.get('sess-1') == ('employer_registration', {'step': 2})
+
+
+def test_write_behind_keeps_last_state_per_session():
+    conn = ScriptedConnection()
+    batches = []
+    write_behind = SessionWriteBehind(lambda: conn)
+    conn.cursor = lambda: type('Cursor', (), {
+        'executemany': lambda self, sql, rows: batches.append(list(rows)),
+        'close': lambda self: None,
+    })()
+
+    write_behind._queue.put(('sess-1', '+260971234567', 'main_menu', '{}'))
+    write_behind._queue.put(('sess-1', '+260971234567', 'browse_jobs', '{}'))
+    write_behind._queue.put(('sess-2', '+260972345678', 'main_menu', '{}'))
+    write_behind.flush()
+
+    assert len(batches) == 1
+    assert [row[2] for row in batches[0]] == ['browse_jobs', 'main_menu']
+    assert conn.count('commit') == 1
+
+
+def test_memory_backed_hops_skip_session_sql(monkeypatch):
+    conn = ScriptedConnection({'SELECT id, company_name FROM employers': [(3, 'BuildRight')]})
+    store = MemorySessionStore()
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', False)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+
+    jowa.process_africas_talking_ussd('sess-1', '+260974567890', '')
+    response = jowa.process_africas_talking_ussd('sess-1', '+260974567890', '2')
+
+    assert response.startswith('CON Welcome BuildRight!')
+    assert conn.statements('ussd_sessions') == []
+    assert store.get('sess-1') == ('employer_dashboard', {})
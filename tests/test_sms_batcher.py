@@ -0,0 +1,79 @@
+from services.sms_batcher import DIGEST_MAX_CHARS, SMSBatcher, build_digest
+from services.sms_outbox import SMSOutboxWorker
+from services.sms_service import SMSService
+from tests.fake_sms_api import FakeSMSAPI
+from tests.test_metrics import value
+from tests.test_unit_of_work import ScriptedConnection
+
+EMPLOYER = '+260955000000'
+
+
+class RecordingSMS:
+    def __init__(self):
+        self.calls = []
+
+    def deliver(self, recipients, message):
+        self.calls.append((list(recipients), message))
+        return {}
+
+
+def test_identical_texts_share_one_call():
+    sms = RecordingSMS()
+    batcher = SMSBatcher(sms)
+    sent = value('jowa_sms_sent_total')
+    saved = value('jowa_sms_saved_total', kind='sms'), value('jowa_sms_saved_total', kind='api_calls')
+
+    outcomes = batcher.send([
+        (1, '+260971111111', 'Payment received', None),
+        (2, '+260972222222', 'Payment received', None),
+        (3, '+260971111111', 'Payment received', None),
+        (4, '+260973333333', 'Something else', None),
+    ])
+
+    assert sms.calls == [
+        (['+260971111111', '+260972222222'], 'Payment received'),
+        (['+260973333333'], 'Something else'),
+    ]
+    assert outcomes == {1: None, 2: None, 3: None, 4: None}
+    assert batcher.stats['saved_sms'] == 1
+    assert batcher.stats['saved_calls'] == 1
+    # The same numbers, for /metrics
+    assert value('jowa_sms_sent_total') == sent + 3
+    assert value('jowa_sms_saved_total', kind='sms') == saved[0] + 1
+    assert value('jowa_sms_saved_total', kind='api_calls') == saved[1] + 1
+
+
+def test_digest_rows_become_one_sms_per_phone():
+    sms = RecordingSMS()
+    batcher = SMSBatcher(sms)
+
+    batcher.send([(i, EMPLOYER, f"Applicant {i}", 'applications') for i in range(1, 4)])
+
+    assert len(sms.calls) == 1
+    assert sms.calls[0][1] == "JOWA: 3 new job applications\n- Applicant 1\n- Applicant 2\n- Applicant 3"
+    assert batcher.stats['saved_sms'] == 2
+
+
+def test_long_digest_is_cut_to_three_segments():
+    digest = build_digest('applications', ["x" * 100] * 40)
+
+    assert len(digest) <= DIGEST_MAX_CHARS
+    assert digest.endswith("more")
+
+
+def test_worker_sweeps_pending_rows_into_a_due_digest():
+    conn = ScriptedConnection({
+        'digest_key = ANY': [(2, EMPLOYER, 'Applicant 2', 0, 'applications'), (3, '+260970000000', 'x', 0, 'applications')],
+        'FROM sms_outbox': [(1, EMPLOYER, 'Applicant 1', 0, 'applications')],
+    })
+    with FakeSMSAPI() as api:
+        worker = SMSOutboxWorker(lambda: conn, SMSService(api_url=api.url))
+        worker.run_once()
+
+    assert [(r['to'], r['message']) for r in api.requests] == [
+        (EMPLOYER, "JOWA: 2 new job applications\n- Applicant 1\n- Applicant 2"),
+    ]
+    assert len(conn.statements("status = 'sent'")) == 2
+    assert worker.batcher.stats == {
+        'messages': 2, 'deliveries': 1, 'api_calls': 1, 'sms_sent': 1, 'saved_sms': 1, 'saved_calls': 0,
+    }
@@ -0,0 +1,81 @@
+import pytest
+
+import app as jowa
+from services.sms_outbox import SMSOutboxWorker, backoff_delay
+from services.sms_service import SMSService
+from tests.fake_sms_api import FakeSMSAPI
+from tests.test_unit_of_work import ScriptedConnection
+
+PHONE = '+260971234567'
+
+
+@pytest.fixture
+def sms_api():
+    with FakeSMSAPI() as api:
+        yield api
+
+
+def run_worker(sms_api, rows, **options):
+    conn = ScriptedConnection({'FROM sms_outbox': rows})
+    worker = SMSOutboxWorker(lambda: conn, SMSService(api_url=sms_api.url), jitter=0, **options)
+    claimed = worker.run_once()
+    return conn, worker, claimed
+
+
+def updates(conn):
+    return [entry for entry in conn.log if entry[0] == 'execute' and entry[1].startswith('UPDATE sms_outbox')]
+
+
+def test_due_messages_are_sent_and_marked(sms_api):
+    conn, worker, claimed = run_worker(sms_api, [(1, PHONE, 'Hello', 0, None), (2, '+260977000000', 'Hi', 0, None)])
+
+    assert claimed == 2
+    assert [(r['to'], r['message']) for r in sms_api.requests] == [(PHONE, 'Hello'), ('+260977000000', 'Hi')]
+    assert 'FOR UPDATE SKIP LOCKED' in conn.statements('FROM sms_outbox')[0][1]
+    assert all("status = 'sent'" in update[1] for update in updates(conn))
+    assert conn.count('commit') == 1
+    assert worker.stats['sent'] == 2
+
+
+def test_provider_outage_is_retried_with_backoff(sms_api):
+    sms_api.outage = 1
+
+    conn, worker, claimed = run_worker(sms_api, [(1, PHONE, 'Hello', 2, None)], base_delay=30)
+
+    update = updates(conn)[0]
+    assert 'next_attempt_at' in update[1]
+    assert update[2][0] == 3
+    assert update[2][2] == 120
+    assert worker.stats['retried'] == 1
+
+
+def test_messages_are_dead_lettered(sms_api):
+    sms_api.rejected['+260970000000'] = 403
+    sms_api.outage = 1
+
+    conn, worker, claimed = run_worker(
+        sms_api, [(1, PHONE, 'Hello', 4, None), (2, '+260970000000', 'Hi', 0, None)], max_attempts=5)
+
+    assert all("status = 'dead'" in update[1] for update in updates(conn))
+    assert worker.stats['dead'] == 2
+
+
+def test_backoff_is_capped():
+    assert [backoff_delay(n, base=30, cap=600, jitter=0) for n in (1, 2, 3, 6)] == [30, 60, 120, 600]
+
+
+def test_hop_queues_the_sms_in_its_transaction(monkeypatch, sms_api):
+    monkeypatch.setenv('SMS_API_URL', sms_api.url)
+    conn = ScriptedConnection({'INSERT INTO applications': [(41, '+260955000000')]})
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    hop = jowa.Hop(jowa.USSD_MENU, 'sess-1', PHONE, conn.cursor(), jowa.UnitOfWork(conn, 'sess-1', PHONE),
+                   'browse_jobs', {'jobs': [[8, 'Job 8']]})
+
+    jowa.apply_for_job(hop, '1')
+
+    queued = conn.statements('INSERT INTO sms_outbox')
+    assert len(queued) == 1
+    assert queued[0][2][0] == '+260955000000'
+    assert queued[0][2][2] == 'applications'
+    assert conn.count('commit') == 0
+    assert sms_api.requests == []
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import app as jowa
+from services import loadtest, metrics, tracing
+from services.db_pool import ConnectionPool, set_pool
+from tests.stand_in_database import StandInDatabase
+from tests.test_unit_of_work import ScriptedConnection, ScriptedCursor
+
+SEEKER = '+260971000001'
+
+
+class ExplainingConnection(ScriptedConnection):
+    """A ScriptedConnection whose cursors know their connection, like psycopg2's"""
+
+    def cursor(self):
+        cur = ScriptedCursor(self)
+        cur.connection = self
+        return cur
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def warning(self, event, **fields):
+        self.events.append((event, fields))
+
+
+def attributes(span):
+    return {item['key']: next(iter(item['value'].values())) for item in span['attributes']}
+
+
+@pytest.fixture
+def trace_file(tmp_path, monkeypatch):
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(path))
+    db = StandInDatabase()
+    set_pool(ConnectionPool(connect=db.connect, max_size=2))
+    loadtest.seed(db.connect().cursor(), [{'phone_number': SEEKER, 'role': 'seeker'},
+                                          {'phone_number': '+260961000001', 'role': 'employer'}])
+    yield path
+    set_pool(None)
+
+
+def test_each_request_is_one_trace_with_a_span_per_query(trace_file):
+    client = jowa.app.test_client()
+    client.post('/at-ussd', data={'sessionId': 'trace-1', 'phoneNumber': SEEKER, 'text': '1*1'})
+    client.get('/test-payment')
+    tracing.flush()
+
+    hop, plain = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    spans = hop['resourceSpans'][0]['scopeSpans'][0]['spans']
+    root, queries = spans[0], spans[1:]
+
+    assert root['name'] == 'POST /at-ussd' and 'parentSpanId' not in root
+    assert attributes(root)['jowa.menu_level'] == 'job_seeker_dashboard'
+    assert int(attributes(root)['db.query_count']) == len(queries) > 0
+    for span in queries:
+        assert span['traceId'] == root['traceId'] and span['parentSpanId'] == root['spanId']
+        assert root['startTimeUnixNano'] <= span['startTimeUnixNano'] <= root['endTimeUnixNano']
+        assert SEEKER not in attributes(span)['db.statement']
+    assert any(attributes(span)['db.statement'].startswith('SELECT j.id') and attributes(span)['db.rowcount'] == '2'
+               for span in queries)
+    assert len(plain['resourceSpans'][0]['scopeSpans'][0]['spans']) == 1
+
+
+def test_nothing_is_traced_without_a_trace_file():
+    tracing.begin_request('GET /health')
+    assert tracing.current_trace_id() is None
+
+
+def test_slow_queries_are_logged_with_their_plan(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(tracing, 'log', recorder)
+    monkeypatch.setattr(tracing, 'SLOW_QUERY_MS', 0.000001)
+    monkeypatch.setattr(tracing, '_explained', {})
+    conn = ExplainingConnection({'EXPLAIN': [('Seq Scan on users  (cost=0.00..1.05 rows=1 width=32)',),
+                                             ("  Filter: (phone_number = '+260971000001')",)]})
+    cur = metrics.TimedCursor(conn.cursor())
+
+    for _ in range(2):
+        cur.execute("SELECT full_name FROM users WHERE phone_number = %s", (SEEKER,))
+
+    first, second = [fields for event, fields in recorder.events if event == 'slow_query']
+    assert first['sql'] == 'SELECT full_name FROM users WHERE phone_number = ?'
+    assert first['plan'].startswith('Seq Scan on users')
+    # One EXPLAIN per query shape per interval, inside a savepoint
+    assert second['plan'] is None
+    assert len(conn.statements('EXPLAIN SELECT full_name')) == 1
+    assert conn.statements('RELEASE SAVEPOINT jowa_explain')
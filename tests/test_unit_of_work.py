@@ -0,0 +1,104 @@
+import app as jowa
+from services.session_store import DatabaseSessionStore
+from services.unit_of_work import UnitOfWork
+
+
+class ScriptedCursor:
+    """Answers fetchone/fetchall from the first script entry whose key is in the SQL"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = None
+        self.rowcount = -1
+
+    def execute(self, sql, params=None):
+        self.conn.log.append(('execute', ' '.join(sql.split()), params))
+        self.result = None
+        for key, rows in self.conn.script.items():
+            if key in sql:
+                self.result = rows
+                break
+        self.rowcount = len(self.result or [])
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return list(self.result or [])
+
+    def close(self):
+        pass
+
+
+class ScriptedConnection:
+    def __init__(self, script=None):
+        self.script = script or {}
+        self.log = []
+
+    def cursor(self):
+        return ScriptedCursor(self)
+
+    def commit(self):
+        self.log.append(('commit',))
+
+    def rollback(self):
+        self.log.append(('rollback',))
+
+    def close(self):
+        self.log.append(('close',))
+
+    def count(self, kind):
+        return sum(1 for entry in self.log if entry[0] == kind)
+
+    def statements(self, fragment):
+        return [entry for entry in self.log if entry[0] == 'execute' and fragment in entry[1]]
+
+
+def test_session_is_written_once_and_side_effects_wait_for_commit():
+    conn = ScriptedConnection()
+    uow = UnitOfWork(conn, 'sess-1', '+260971234567')
+    sent = []
+
+    uow.set_session('sess-1', 'browse_jobs', {'page': 0})
+    uow.set_session('sess-1', 'browse_jobs', {'page': 1})
+    uow.after_commit(sent.append, 'sms')
+    assert sent == []
+
+    uow.commit()
+
+    writes = conn.statements('ussd_sessions')
+    assert len(writes) == 1
+    assert '"page": 1' in writes[0][2][3]
+    assert conn.count('commit') == 1
+    assert sent == ['sms']
+
+
+def test_rollback_drops_staged_state_and_side_effects():
+    conn = ScriptedConnection()
+    uow = UnitOfWork(conn, 'sess-1', '+260971234567')
+    sent = []
+
+    uow.set_session('sess-1', 'main_menu', {})
+    uow.after_commit(sent.append, 'sms')
+    uow.rollback()
+    uow.commit()
+
+    assert conn.statements('ussd_sessions') == []
+    assert sent == []
+
+
+def test_at_hop_commits_once(monkeypatch):
+    conn = ScriptedConnection({
+        'FROM ussd_sessions': [('main_menu', {})],
+        'SELECT id, full_name FROM users': [(1, 'John Banda')],
+    })
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', False)
+    monkeypatch.setattr(jowa, 'get_session_store', DatabaseSessionStore)
+
+    response = jowa.process_africas_talking_ussd('sess-1', '+260971234567', '1')
+
+    assert response.startswith('CON Welcome John Banda!')
+    assert conn.count('commit') == 1
+    assert len(conn.statements('INSERT INTO ussd_sessions')) == 1
+    assert conn.log[-1] == ('close',)
@@ -0,0 +1,45 @@
+import pytest
+
+import app as jowa
+from services.session_store import MemorySessionStore
+from services.ussd_menu import AT_RESPONSE, JSON_RESPONSE, Menu, State, con, end
+from tests.test_unit_of_work import ScriptedConnection
+
+PHONE = '+260971234567'
+
+
+def test_unknown_target_is_rejected_at_compile_time():
+    with pytest.raises(ValueError):
+        Menu({'main_menu': State(screen=lambda hop: con('Hi'), options={'1': 'nowhere'})},
+             is_registered=None)
+
+
+def test_adapters_render_the_same_screen():
+    assert AT_RESPONSE.render(con('Pick one'), 'sess-1') == 'CON Pick one'
+    assert AT_RESPONSE.render(end('Bye'), 'sess-1') == 'END Bye'
+    assert JSON_RESPONSE.render(end('Bye'), 'sess-1') == {'sessionId': 'sess-1', 'message': 'Bye', 'type': '1'}
+
+
+def test_both_endpoints_share_the_menu(monkeypatch):
+    conn = ScriptedConnection({'SELECT id, company_name FROM employers': [(3, 'BuildRight')]})
+    store = MemorySessionStore()
+    store.put('json-1', PHONE, 'main_menu', {})
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', True)
+
+    at = jowa.process_africas_talking_ussd('at-1', PHONE, '2*1')
+    body = jowa.process_input('json-1', PHONE, '2')
+
+    assert at == "CON Let's post a new job!\n\nEnter job title:"
+    assert body['type'] == '2' and body['message'].startswith('Welcome BuildRight!')
+    assert store.get('json-1') == ('employer_dashboard', {})
+
+
+def test_json_hop_without_session_expires(monkeypatch):
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: ScriptedConnection())
+    monkeypatch.setattr(jowa, 'get_session_store', MemorySessionStore)
+
+    body = jowa.process_input('gone', PHONE, '1')
+
+    assert body == {'sessionId': 'gone', 'message': 'Session expired. Please dial again.', 'type': '1'}
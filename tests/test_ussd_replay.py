@@ -0,0 +1,78 @@
+import app as jowa
+from services.session_store import MemorySessionStore
+from services.ussd_replay import split_text
+from tests.test_unit_of_work import ScriptedConnection
+
+PHONE = '+260971234567'
+
+
+def replay_history(history, is_registered):
+    return jowa.USSD_MENU.replay(history, is_registered)
+
+
+def registered(role):
+    return True
+
+
+def test_split_text():
+    assert split_text('') == []
+    assert split_text('1*2*John Banda') == ['1', '2', 'John Banda']
+
+
+def test_navigation_history_replays():
+    assert replay_history([], registered) == 'main_menu'
+    assert replay_history(['1'], registered) == 'job_seeker_dashboard'
+    assert replay_history(['2', '4', '3'], registered) == 'payment_menu'
+    assert replay_history(['9', '1'], registered) == 'job_seeker_dashboard'
+
+
+def test_free_text_and_paged_screens_are_ambiguous():
+    assert replay_history(['1'], lambda role: False) is None
+    assert replay_history(['1', '3'], registered) is None
+    assert replay_history(['1', '1'], registered) is None
+    assert replay_history(['3', '2'], registered) is None
+
+
+def test_registration_lookup_only_when_needed():
+    calls = []
+
+    def is_registered(role):
+        calls.append(role)
+        return True
+
+    replay_history(['3', '1'], is_registered)
+    assert calls == []
+    replay_history(['2'], is_registered)
+    assert calls == ['employer']
+
+
+def run_hop(monkeypatch, conn, store, text):
+    monkeypatch.setattr(jowa, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(jowa, 'get_session_store', lambda: store)
+    monkeypatch.setattr(jowa, 'AT_TEXT_REPLAY', True)
+    return jowa.process_africas_talking_ussd('sess-1', PHONE, text)
+
+
+def test_navigation_hops_never_touch_the_session_store(monkeypatch):
+    conn = ScriptedConnection({'SELECT id, full_name FROM users': [(1, 'John Banda')]})
+    store = MemorySessionStore()
+
+    assert run_hop(monkeypatch, conn, store, '').startswith('CON Welcome to JOWA')
+    assert run_hop(monkeypatch, conn, store, '1').startswith('CON Welcome John Banda!')
+    assert run_hop(monkeypatch, conn, store, '1*4').startswith('CON Welcome to JOWA')
+
+    assert len(store) == 0
+    assert conn.statements('ussd_sessions') == []
+
+
+def test_free_text_flow_falls_back_to_stored_state(monkeypatch):
+    conn = ScriptedConnection({'SELECT id, full_name FROM users': [(1, 'John Banda')]})
+    store = MemorySessionStore()
+
+    run_hop(monkeypatch, conn, store, '1*3')
+    assert store.get('sess-1') == ('job_seeker_registration', {'step': 1})
+
+    response = run_hop(monkeypatch, conn, store, '1*3*Mary Phiri')
+
+    assert response.startswith('CON Enter your skills')
+    assert store.get('sess-1') == ('job_seeker_registration', {'step': 2, 'full_name': 'Mary Phiri'})
@@ -2,12 +2,15 @@ import json
 from datetime import datetime
 
 def update_session(cursor, conn, session_id, menu_level, data):
+    # Never commits: the hop's UnitOfWork (or the caller) commits once at the end
+    if hasattr(conn, 'set_session'):
+        conn.set_session(session_id, menu_level, data)
+        return
     cursor.execute("""
         UPDATE ussd_sessions 
         SET menu_level = %s, data = %s, updated_at = CURRENT_TIMESTAMP
         WHERE session_id = %s
     """, (menu_level, json.dumps(data), session_id))
-    conn.commit()
 
 def get_session_data(cursor, session_id):
     cursor.execute("SELECT menu_level, data FROM ussd_sessions WHERE session_id = %s", (session_id,))
@@ -15,7 +18,10 @@ def get_session_data(cursor, session_id):
     
     if session_data:
         menu_level, data_json = session_data
-        data = json.loads(data_json) if data_json else {}
+        if isinstance(data_json, dict):
+            data = data_json
+        else:
+            data = json.loads(data_json) if data_json else {}
         return menu_level, data
     return None, {}
 